@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class PerfConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "tutorial.apps.perf"
+
+    def ready(self):
+        from . import queryhooks  # noqa: F401
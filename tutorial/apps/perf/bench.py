@@ -0,0 +1,270 @@
+"""
+Shared helpers for the benchmark management commands.
+
+Benchmarks run against a throwaway test database, so they never touch
+`db.sqlite3` and need no external services.
+"""
+import asyncio
+import io
+import os
+import random
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import (
+    override_settings, setup_test_environment, teardown_test_environment)
+from django.urls import resolve
+
+from tutorial.apps.snippets.models import Snippet, UserProfile
+from tutorial.async_views import api_request
+
+SAMPLE_CODE = {
+    "python": 'def greet(name):\n    return f"Hello {name}"\n',
+    "javascript": "function greet(name) {\n  return `Hello ${name}`;\n}\n",
+    "c": '#include <stdio.h>\nint main(void) { puts("Hello"); }\n',
+    "sql": "SELECT id, title FROM snippets_snippet WHERE id = 1;\n",
+    "html": "<p class=\"greeting\">Hello <b>World</b></p>\n",
+}
+
+
+@contextmanager
+def scratch_database(on_disk=False, throttle=False):
+    """
+    Create an isolated test database (and test environment) for the
+    duration of the block. SQLite test databases live in memory unless
+    `on_disk` is set, which concurrent-write benchmarks need.
+
+    Throttling is disabled unless `throttle` is set, by swapping the
+    throttle cache for a dummy one that always reports a full bucket.
+    Highlight files go to a temporary directory.
+    """
+    highlight_files = tempfile.TemporaryDirectory()
+    settings_override = {
+        "HIGHLIGHT_FILES": {
+            **settings.HIGHLIGHT_FILES, "ROOT": highlight_files.name},
+    }
+    if not throttle:
+        settings_override["CACHES"] = {
+            **settings.CACHES,
+            "throttle": {
+                "BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+        }
+    overrides = override_settings(**settings_override)
+    overrides.enable()
+    setup_test_environment()
+    test_settings = connection.settings_dict["TEST"]
+    old_test_name = test_settings["NAME"]
+    if on_disk and connection.vendor == "sqlite":
+        handle, test_settings["NAME"] = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(handle)
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings["NAME"] = old_test_name
+        teardown_test_environment()
+        overrides.disable()
+        highlight_files.cleanup()
+
+
+def seed_users(count, prefix="bench"):
+    users = User.objects.bulk_create(
+        User(username=f"{prefix}{i}", email=f"{prefix}{i}@example.com")
+        for i in range(count))
+    return list(User.objects.filter(
+        username__in=[user.username for user in users]))
+
+
+def seed_groups(count, members, prefix="bench"):
+    """
+    Create `count` groups and spread `members` over them.
+    """
+    groups = Group.objects.bulk_create(
+        Group(name=f"{prefix}-group{i}") for i in range(count))
+    groups = list(Group.objects.filter(
+        name__in=[group.name for group in groups]))
+    if groups:
+        Membership = User.groups.through
+        Membership.objects.bulk_create(
+            Membership(user=user, group=groups[i % len(groups)])
+            for i, user in enumerate(members))
+    return groups
+
+
+def seed_snippets(count, owners, max_lines=40, seed=0):
+    """
+    Create `count` snippets with mixed languages and code sizes, spread
+    over `owners`. Rows are bulk inserted, so seeding stays fast, and
+    highlighted up front.
+    """
+    rng = random.Random(seed)
+    languages = sorted(SAMPLE_CODE)
+    snippets = []
+    for i in range(count):
+        language = languages[i % len(languages)]
+        code = SAMPLE_CODE[language] * rng.randint(1, max_lines)
+        snippet = Snippet(
+            title=f"Snippet {i}",
+            code=code,
+            language=language,
+            linenos=bool(i % 2),
+            owner=owners[i % len(owners)])
+        snippets.append(snippet)
+    snippets = Snippet.objects.bulk_create(snippets)
+    for snippet in snippets:
+        snippet.store_highlight()
+    UserProfile.objects.rebuild(owners)
+    return snippets
+
+
+def summarize(latencies, elapsed):
+    """
+    Reduce a list of per-request latencies (in seconds) to a JSON
+    friendly summary in milliseconds.
+    """
+    if not latencies:
+        return {"requests": 0}
+    ordered = sorted(latencies)
+    cuts = ordered * 99
+    if len(ordered) > 1:
+        cuts = statistics.quantiles(ordered, n=100, method="inclusive")
+    return {
+        "requests": len(ordered),
+        "throughput_rps": round(len(ordered) / elapsed, 2),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def drf_request(path):
+    """
+    A resolved and versioned DRF GET request for `path`, to serialize
+    outside a view exactly as the view would.
+    """
+    request = RequestFactory().get(path)
+    request.resolver_match = resolve(request.path)
+    return api_request(request, **request.resolver_match.kwargs)
+
+
+def wsgi_environ(
+        url, method="GET", body=b"", content_type=None, headers=None):
+    parts = urlsplit(url)
+    environ = {
+        "REQUEST_METHOD": method,
+        "PATH_INFO": parts.path,
+        "QUERY_STRING": parts.query,
+        "SCRIPT_NAME": "",
+        "SERVER_NAME": "testserver",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_HOST": "testserver",
+        "REMOTE_ADDR": "127.0.0.1",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": io.StringIO(),
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    if body:
+        environ["CONTENT_LENGTH"] = str(len(body))
+        environ["CONTENT_TYPE"] = content_type or "application/json"
+    for name, value in (headers or {}).items():
+        environ["HTTP_" + name.upper().replace("-", "_")] = value
+    return environ
+
+
+def call_wsgi(application, url, client_delay=0.0, **kwargs):
+    """
+    Drive one request through a WSGI callable. `client_delay` simulates a
+    slow client: the worker is held while the request trickles in and the
+    response drains out, as it would be behind a non-buffering server.
+    """
+    status = []
+
+    def start_response(value, headers, exc_info=None):
+        status.append(value)
+
+    if client_delay:
+        time.sleep(client_delay / 2)
+    response = application(wsgi_environ(url, **kwargs), start_response)
+    try:
+        for _chunk in response:
+            pass
+    finally:
+        if hasattr(response, "close"):
+            response.close()
+    if client_delay:
+        time.sleep(client_delay / 2)
+    return int(status[0].split()[0])
+
+
+async def call_asgi(application, url, client_delay=0.0):
+    """
+    Drive one request through an ASGI callable with the same slow-client
+    model as `call_wsgi`, except that waiting on the client only suspends
+    a coroutine instead of holding a thread.
+    """
+    parts = urlsplit(url)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": parts.path,
+        "raw_path": parts.path.encode(),
+        "query_string": parts.query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"testserver")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+    status = []
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            if client_delay:
+                await asyncio.sleep(client_delay / 2)
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Never disconnect: Django stops listening once the response ends.
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+        elif not message.get("more_body") and client_delay:
+            await asyncio.sleep(client_delay / 2)
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+class QueryCounter:
+    """
+    `connection.execute_wrapper` hook counting executed queries, cheaper
+    than capturing them with a debug cursor.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
@@ -0,0 +1,49 @@
+"""
+Child process for `manage.py bench_cold_start`: loads the WSGI application
+in a fresh interpreter, optionally warms it up, and times the first and
+second request to each URL.
+
+    python -m tutorial.apps.perf.coldstart {cold,warm} '[[name, first, second], ...]'
+
+Run by the command against a scratch database given in DATABASE_URL.
+Prints the timings as JSON.
+"""
+import json
+import sys
+import time
+
+
+def main(mode, urls):
+    start = time.perf_counter()
+    from tutorial.wsgi import application
+    startup = time.perf_counter() - start
+
+    from django.test.utils import setup_test_environment
+
+    from tutorial import warmup
+    from tutorial.apps.perf import bench
+
+    setup_test_environment()
+    warmup_seconds = 0.0
+    if mode == "warm":
+        start = time.perf_counter()
+        warmup.prepare()
+        warmup_seconds = time.perf_counter() - start
+
+    results = {
+        "startup_ms": startup * 1000,
+        "warmup_ms": warmup_seconds * 1000,
+    }
+    for name, *requests in urls:
+        for label, url in zip(("first_ms", "second_ms"), requests):
+            start = time.perf_counter()
+            status = bench.call_wsgi(application, url)
+            elapsed = time.perf_counter() - start
+            if status != 200:
+                raise SystemExit(f"GET {url} returned {status}.")
+            results[f"{name}.{label}"] = elapsed * 1000
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(main(sys.argv[1], json.loads(sys.argv[2]))))
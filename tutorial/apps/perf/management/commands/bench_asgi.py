@@ -0,0 +1,91 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+
+from tutorial.apps.perf import bench
+
+ENDPOINTS = {
+    "list": ("/snippets-api/snippets/", "/snippets-api/async/snippets/"),
+    "retrieve": (
+        "/snippets-api/snippets/{pk}/",
+        "/snippets-api/async/snippets/{pk}/"),
+    "highlight": (
+        "/snippets-api/snippets/{pk}/highlight/",
+        "/snippets-api/async/snippets/{pk}/highlight/"),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare WSGI and ASGI throughput for the snippet read endpoints "
+        "under many concurrent slow clients.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--snippets", type=int, default=200)
+        parser.add_argument("--requests", type=int, default=400)
+        parser.add_argument(
+            "--clients", type=int, default=100,
+            help="Concurrent clients driving the ASGI application.")
+        parser.add_argument(
+            "--threads", type=int, default=8,
+            help="Worker threads serving the WSGI application.")
+        parser.add_argument(
+            "--delay", type=float, default=0.05,
+            help="Seconds each simulated client takes to send and read.")
+
+    def handle(self, *args, **options):
+        with bench.scratch_database():
+            owners = bench.seed_users(10)
+            snippets = bench.seed_snippets(options["snippets"], owners)
+            pks = [snippet.pk for snippet in snippets]
+            results = {}
+            for name, (sync_url, async_url) in ENDPOINTS.items():
+                urls = [
+                    sync_url.format(pk=pks[i % len(pks)])
+                    for i in range(options["requests"])]
+                async_urls = [
+                    async_url.format(pk=pks[i % len(pks)])
+                    for i in range(options["requests"])]
+                results[name] = {
+                    "wsgi": self.run_wsgi(urls, options),
+                    "asgi_sync_view": self.run_asgi(urls, options),
+                    "asgi_async_view": self.run_asgi(async_urls, options),
+                }
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def run_wsgi(self, urls, options):
+        application = get_wsgi_application()
+        latencies = []
+
+        def one(url):
+            start = time.perf_counter()
+            bench.call_wsgi(application, url, options["delay"])
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options["threads"]) as pool:
+            list(pool.map(one, urls))
+        return bench.summarize(latencies, time.perf_counter() - start)
+
+    def run_asgi(self, urls, options):
+        application = get_asgi_application()
+        latencies = []
+
+        async def one(url, semaphore):
+            async with semaphore:
+                start = time.perf_counter()
+                await bench.call_asgi(application, url, options["delay"])
+                latencies.append(time.perf_counter() - start)
+
+        async def main():
+            semaphore = asyncio.Semaphore(options["clients"])
+            await asyncio.gather(*(one(url, semaphore) for url in urls))
+
+        start = time.perf_counter()
+        asyncio.run(main())
+        return bench.summarize(latencies, time.perf_counter() - start)
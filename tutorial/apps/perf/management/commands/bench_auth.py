@@ -0,0 +1,159 @@
+import json
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import authentication as drf_authentication
+from rest_framework.authtoken.models import Token
+from rest_framework.views import APIView
+
+from tutorial import authentication
+from tutorial.apps.perf import bench
+
+SESSION_ENGINES = {
+    False: "django.contrib.sessions.backends.db",
+    True: "django.contrib.sessions.backends.cached_db",
+}
+BACKENDS = {
+    False: "django.contrib.auth.backends.ModelBackend",
+    True: "tutorial.authentication.CachedModelBackend",
+}
+TOKEN_CLASSES = {
+    False: drf_authentication.TokenAuthentication,
+    True: authentication.CachedTokenAuthentication,
+}
+
+MODES = {
+    "session": ("session", False),
+    "session_cached": ("session", True),
+    "token": ("token", False),
+    "token_cached": ("token", True),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare queries and response times of authenticated requests "
+        "with session and token authentication, with and without the "
+        "cached session, user and token lookups.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+
+    def handle(self, *args, **options):
+        with bench.scratch_database():
+            owners = bench.seed_users(5)
+            bench.seed_groups(3, owners)
+            snippet = bench.seed_snippets(10, owners)[0]
+            user = snippet.owner
+            user.set_password("bench-password")
+            user.save()
+            urls = {
+                "snippet_detail": f"/snippets-api/snippets/{snippet.pk}/",
+                "user_list": "/snippets-api/users/",
+                "group_list": "/quickstart-api/groups/",
+            }
+            self.check_invalidation(user)
+            results = {}
+            for name, url in urls.items():
+                results[name] = {
+                    mode: self.run(
+                        user, url, kind, cached, options["requests"])
+                    for mode, (kind, cached) in MODES.items()}
+        self.stdout.write(json.dumps(results, indent=2))
+
+    @contextmanager
+    def mode(self, kind, cached):
+        """
+        Authenticate with sessions or tokens (`kind`), with or without the
+        caches, for the duration of the block.
+        """
+        authentication.users.clear()
+        authentication.tokens.clear()
+        if kind == "session":
+            classes = [drf_authentication.SessionAuthentication]
+        else:
+            classes = [TOKEN_CLASSES[cached]]
+        with override_settings(
+                SESSION_ENGINE=SESSION_ENGINES[cached],
+                AUTHENTICATION_BACKENDS=[BACKENDS[cached]]), \
+                mock.patch.object(APIView, "authentication_classes", classes):
+            yield
+
+    def client(self, user, kind):
+        if kind == "session":
+            client = Client()
+            client.force_login(user)
+            return client
+        token, _ = Token.objects.get_or_create(user=user)
+        return Client(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+    def request(self, client, url):
+        response = client.get(url, HTTP_ACCEPT="application/json")
+        if response.status_code != 200:
+            raise CommandError(f"GET {url}: {response.status_code}")
+        return response
+
+    def run(self, user, url, kind, cached, requests):
+        with self.mode(kind, cached):
+            client = self.client(user, kind)
+            # Warm up the middleware and the caches.
+            self.request(client, url)
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                for _ in range(requests):
+                    self.request(client, url)
+                elapsed = time.perf_counter() - start
+        return {
+            "ms": round(elapsed / requests * 1000, 2),
+            "queries": round(len(queries) / requests, 2),
+        }
+
+    def check_invalidation(self, user):
+        """
+        Check that cached users and tokens stop authenticating once the
+        password changes, the user logs out or is deactivated, or the
+        token is deleted.
+        """
+        def authenticated(client):
+            response = client.get(
+                "/snippets-api/snippets/", HTTP_ACCEPT="application/json")
+            # DRF sets the user it authenticated on the Django request.
+            return (
+                response.status_code != 401
+                and response.wsgi_request.user.is_authenticated)
+
+        def expect(client, expected, event):
+            # Twice, so the second response comes from the caches.
+            for _ in range(2):
+                if authenticated(client) != expected:
+                    raise CommandError(
+                        f"Still authenticated after {event}." if not expected
+                        else f"Not authenticated before {event}.")
+
+        with self.mode("session", True):
+            client = self.client(user, "session")
+            expect(client, True, "the password change")
+            user.set_password("changed-password")
+            user.save()
+            expect(client, False, "the password change")
+            client = self.client(user, "session")
+            expect(client, True, "logout")
+            client.logout()
+            expect(client, False, "logout")
+
+        with self.mode("token", True):
+            client = self.client(user, "token")
+            expect(client, True, "deactivation")
+            user.is_active = False
+            user.save()
+            expect(client, False, "deactivation")
+            user.is_active = True
+            user.save()
+            expect(client, True, "the token deletion")
+            Token.objects.filter(user=user).delete()
+            expect(client, False, "the token deletion")
@@ -0,0 +1,74 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from tutorial.apps.perf import bench
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare fetching many snippets and users with one detail request "
+        "each against a single batch request.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ids", type=int, default=50)
+        parser.add_argument("--repeat", type=int, default=10)
+
+    def handle(self, *args, **options):
+        with bench.scratch_database():
+            owners = bench.seed_users(options["ids"])
+            snippets = bench.seed_snippets(options["ids"], owners)
+            client = Client()
+            client.force_login(owners[0])
+            # Reversed, so the batch has to restore the request order.
+            endpoints = {
+                "snippets": (
+                    "/snippets-api/snippets/",
+                    [snippet.pk for snippet in reversed(snippets)]),
+                "users": (
+                    "/quickstart-api/users/",
+                    [owner.pk for owner in reversed(owners)]),
+            }
+            results = {}
+            for name, (url, ids) in endpoints.items():
+                self.check_output(client, url, ids)
+                results[name] = {
+                    "ids": len(ids),
+                    "detail": self.run(
+                        client, [f"{url}{pk}/" for pk in ids],
+                        options["repeat"]),
+                    "batch": self.run(
+                        client,
+                        [f"{url}batch/?ids={','.join(map(str, ids))}"],
+                        options["repeat"]),
+                }
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def get(self, client, url):
+        response = client.get(url, HTTP_ACCEPT="application/json")
+        if response.status_code != 200:
+            raise CommandError(f"GET {url}: {response.status_code}")
+        return response.json()
+
+    def check_output(self, client, url, ids):
+        expected = [self.get(client, f"{url}{pk}/") for pk in ids]
+        batch = self.get(client, f"{url}batch/?ids={','.join(map(str, ids))}")
+        if batch["results"] != expected or batch["missing"]:
+            raise CommandError(f"Batch {url} output differs.")
+
+    def run(self, client, urls, repeat):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for url in urls:
+                    self.get(client, url)
+            elapsed = time.perf_counter() - start
+        return {
+            "requests": len(urls),
+            "ms": round(elapsed / repeat * 1000, 2),
+            "queries": round(len(queries) / repeat, 2),
+        }
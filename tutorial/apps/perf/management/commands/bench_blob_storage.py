@@ -0,0 +1,62 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.db.models.functions import Length
+
+from tutorial.apps.perf import bench
+from tutorial.apps.snippets.models import CodeBlob, HighlightBlob, Snippet
+
+
+class Command(BaseCommand):
+    help = (
+        "Save snippets where a share of the code is copied from earlier "
+        "ones, and compare the code and HTML stored in blobs with what "
+        "per-row copies would take.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--snippets", type=int, default=1000)
+        parser.add_argument(
+            "--duplicates", type=float, default=0.5,
+            help="Share of snippets copying an earlier snippet's code.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        with bench.scratch_database():
+            owners = bench.seed_users(10)
+            sources = []
+            start = time.perf_counter()
+            for i in range(options["snippets"]):
+                if sources and rng.random() < options["duplicates"]:
+                    code, language = rng.choice(sources)
+                else:
+                    language = rng.choice(sorted(bench.SAMPLE_CODE))
+                    code = (
+                        bench.SAMPLE_CODE[language] * rng.randint(1, 40)
+                        + f"\n{i}\n")
+                    sources.append((code, language))
+                Snippet(
+                    title=f"Snippet {i}", code=code, language=language,
+                    owner=owners[i % len(owners)]).save()
+            elapsed = time.perf_counter() - start
+
+            per_row = sum(
+                len(snippet.code) + len(snippet.highlighted)
+                for snippet in Snippet.objects.select_related(
+                    "code_blob", "highlight_blob"))
+            stored = (
+                CodeBlob.objects.aggregate(size=Sum(Length("code")))["size"]
+                + HighlightBlob.objects.aggregate(
+                    size=Sum(Length("html")))["size"])
+            results = {
+                "snippets": options["snippets"],
+                "code_blobs": CodeBlob.objects.count(),
+                "highlight_blobs": HighlightBlob.objects.count(),
+                "saves_per_s": round(options["snippets"] / elapsed, 1),
+                "per_row_chars": per_row,
+                "stored_chars": stored,
+                "ratio": round(stored / per_row, 3),
+            }
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,112 @@
+import json
+import re
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from rest_framework import metadata, renderers
+
+from tutorial import browsable
+from tutorial.apps.perf import bench
+
+CSRF_TOKEN = re.compile(
+    rb'(csrfmiddlewaretoken" value="|csrfToken: ")[^"]*')
+
+MODES = ("drf", "cached", "lite")
+
+
+def uncached():
+    """
+    Patches restoring DRF's form rendering and metadata.
+    """
+    return [
+        mock.patch.object(
+            browsable.BrowsableAPIRenderer, "form_renderer_class",
+            renderers.HTMLFormRenderer),
+        mock.patch.object(
+            browsable.CachedMetadata, "get_serializer_info",
+            metadata.SimpleMetadata.get_serializer_info),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare browsable API page and OPTIONS response times and sizes "
+        "for snippet endpoints with DRF's rendering, the cached form "
+        "fields and metadata, and lite mode.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50)
+
+    def handle(self, *args, **options):
+        with bench.scratch_database():
+            owners = bench.seed_users(5)
+            snippet = bench.seed_snippets(10, owners)[0]
+            client = Client()
+            client.force_login(snippet.owner)
+            urls = {
+                "snippet_list": "/snippets-api/snippets/",
+                "snippet_detail": f"/snippets-api/snippets/{snippet.pk}/",
+            }
+            self.check_output(client, urls)
+            results = {}
+            for name, url in urls.items():
+                results[name] = {
+                    mode: self.run(client, url, mode, options["requests"])
+                    for mode in MODES}
+        results["caches"] = {
+            cache: cache_object.stats()
+            for cache, cache_object in browsable.CACHES.items()}
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def request(self, client, method, url):
+        response = getattr(client, method)(
+            url,
+            HTTP_ACCEPT="text/html" if method == "get"
+            else "application/json")
+        if response.status_code != 200:
+            raise CommandError(
+                f"{method.upper()} {url}: {response.status_code}")
+        return CSRF_TOKEN.sub(rb"\1", response.content)
+
+    def check_output(self, client, urls):
+        for url in urls.values():
+            for method in ("get", "options"):
+                # Twice, so the second response comes from the caches.
+                cached = [self.request(client, method, url) for _ in range(2)]
+                patches = uncached()
+                for patch in patches:
+                    patch.start()
+                try:
+                    expected = self.request(client, method, url)
+                finally:
+                    for patch in patches:
+                        patch.stop()
+                if cached != [expected, expected]:
+                    raise CommandError(
+                        f"Cached {method.upper()} {url} output differs.")
+
+    def run(self, client, url, mode, requests):
+        patches = uncached() if mode == "drf" else []
+        patches.append(mock.patch.dict(
+            settings.BROWSABLE_API, LITE=mode == "lite"))
+        for patch in patches:
+            patch.start()
+        try:
+            result = {}
+            for method in ("get", "options"):
+                content = self.request(client, method, url)
+                start = time.perf_counter()
+                for _ in range(requests):
+                    self.request(client, method, url)
+                elapsed = time.perf_counter() - start
+                result[method] = {
+                    "ms": round(elapsed / requests * 1000, 2),
+                    "bytes": len(content),
+                }
+            return result
+        finally:
+            for patch in patches:
+                patch.stop()
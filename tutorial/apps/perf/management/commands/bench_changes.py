@@ -0,0 +1,164 @@
+import json
+import random
+import threading
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from tutorial.apps.perf import bench
+from tutorial.apps.snippets.models import Snippet
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare a mirror re-crawling the paginated snippet list against "
+        "one following the change feed and fetching changed snippets in "
+        "batches, after a few edits to a large table, and measure "
+        "snippet writes from concurrent writers, which commit one at a "
+        "time to keep the change feed in order.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--snippets", type=int, default=2000)
+        parser.add_argument("--changes", type=int, default=20)
+        parser.add_argument(
+            "--writers", type=int, nargs="+", default=[1, 4, 16],
+            help="Numbers of concurrent writers to compare.")
+        parser.add_argument(
+            "--writes", type=int, default=200,
+            help="Snippets saved in each concurrent-writer run.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        with bench.scratch_database(on_disk=True):
+            owners = bench.seed_users(10)
+            snippets = bench.seed_snippets(options["snippets"], owners)
+            client = Client()
+            client.force_login(owners[0])
+            # The initial sync, from cursor 0, lists every snippet.
+            mirror, cursor = self.sync(client, {}, 0)
+            if mirror != self.crawl(client):
+                raise CommandError("Initial sync differs from the list.")
+
+            changed = rng.sample(
+                snippets, min(options["changes"], len(snippets)))
+            for snippet in changed[::2]:
+                snippet = Snippet.objects.get(pk=snippet.pk)
+                snippet.title += " (edited)"
+                snippet.save()
+            for snippet in changed[1::2]:
+                snippet.delete()
+            for i in range(options["changes"] // 2):
+                Snippet(
+                    title=f"New {i}", code=f"x = {i}\n",
+                    owner=owners[0]).save()
+
+            results = {"snippets": options["snippets"]}
+            states = {}
+            for name, sync in (
+                    ("crawl", lambda: self.crawl(client)),
+                    ("changes", lambda: self.sync(client, mirror, cursor)[0])):
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    states[name] = sync()
+                    elapsed = time.perf_counter() - start
+                results[name] = {
+                    "ms": round(elapsed * 1000, 1),
+                    "queries": len(queries),
+                    "requests": self.requests,
+                }
+            if states["changes"] != states["crawl"]:
+                raise CommandError("Synced mirror differs from the list.")
+            results["writes"] = {"database": connection.vendor}
+            for writers in options["writers"]:
+                results["writes"][f"writers={writers}"] = self.write(
+                    owners, writers, options["writes"])
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def write(self, owners, writers, writes):
+        """
+        Save `writes` snippets from `writers` threads at once. Each write
+        holds the change log lock from its last statement until it
+        commits. SQLite only runs one write transaction at a time and fails
+        the others at once, so they are retried (and counted); run with
+        `DATABASE_URL` set to a server database to see how much of a write
+        the lock serializes.
+        """
+        latencies = []
+        retries = Counter()
+
+        def writer(index):
+            try:
+                for i in range(index, writes, writers):
+                    start = time.perf_counter()
+                    while True:
+                        try:
+                            Snippet(
+                                title=f"Written {writers}-{i}",
+                                code=f"y = {i}\n",
+                                owner=owners[i % len(owners)]).save()
+                        except OperationalError as error:
+                            retries[str(error)] += 1
+                            continue
+                        break
+                    latencies.append(time.perf_counter() - start)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=writer, args=(index,))
+            for index in range(writers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        summary = bench.summarize(latencies, time.perf_counter() - start)
+        summary["retries"] = dict(retries)
+        return summary
+
+    def get(self, client, url):
+        self.requests += 1
+        response = client.get(url, HTTP_ACCEPT="application/json")
+        if response.status_code != 200:
+            raise CommandError(f"GET {url}: {response.status_code}")
+        return response.json()
+
+    def crawl(self, client):
+        """
+        Every snippet, by id, from the paginated list.
+        """
+        self.requests = 0
+        state = {}
+        url = "/snippets-api/snippets/"
+        while url:
+            page = self.get(client, url)
+            state.update((item["id"], item) for item in page["results"])
+            url = page["next"]
+        return state
+
+    def sync(self, client, state, cursor):
+        """
+        Apply the changes after `cursor` to `state`.
+        """
+        self.requests = 0
+        more = True
+        while more:
+            changes = self.get(
+                client, f"/snippets-api/snippets/changes/?cursor={cursor}")
+            cursor, more = changes["cursor"], changes["more"]
+            for pk in changes["deleted"]:
+                state.pop(pk, None)
+            ids = changes["created"] + changes["updated"]
+            url = "/snippets-api/snippets/batch/"
+            for start in range(0, len(ids), 100):
+                batch = ids[start:start + 100]
+                page = self.get(
+                    client, f"{url}?ids={','.join(map(str, batch))}")
+                state.update((item["id"], item) for item in page["results"])
+                for pk in page["missing"]:
+                    state.pop(pk, None)
+        return state, cursor
@@ -0,0 +1,76 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from tutorial.apps.perf import bench
+from tutorial.apps.snippets.models import Snippet
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure first-request latency in fresh processes, with and "
+        "without tutorial.warmup, on an on-disk scratch database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+
+    def handle(self, *args, **options):
+        with bench.scratch_database(on_disk=True):
+            owners = bench.seed_users(10)
+            snippets = bench.seed_snippets(20, owners)
+            results = self.run(options["runs"], owners, snippets[0])
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def run(self, runs, owners, snippet):
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{connection.settings_dict['NAME']}",
+            "WARMUP_LANGUAGES": ",".join(settings.WARMUP_LANGUAGES),
+        }
+        samples = {"cold": [], "warm": []}
+        for run in range(runs):
+            for mode, mode_samples in samples.items():
+                # Snippets with new code and no stored HTML, so that
+                # highlighting them runs the lexer in the child.
+                unhighlighted = Snippet.objects.bulk_create(
+                    Snippet(
+                        code=bench.SAMPLE_CODE["python"]
+                        + f"# {mode} {run} {i}\n",
+                        language="python",
+                        owner=owners[0])
+                    for i in range(2))
+                urls = [
+                    ["snippet_list"] + ["/snippets-api/snippets/"] * 2,
+                    ["snippet_detail"]
+                    + [f"/snippets-api/snippets/{snippet.pk}/"] * 2,
+                    ["user_list"] + ["/snippets-api/users/"] * 2,
+                    ["highlight"] + [
+                        f"/snippets-api/async/snippets/{new.pk}/highlight/"
+                        for new in unhighlighted],
+                ]
+                mode_samples.append(self.run_child(mode, urls, env))
+
+        return {
+            mode: {
+                key: round(statistics.median(
+                    sample[key] for sample in mode_samples), 2)
+                for key in mode_samples[0]
+            }
+            for mode, mode_samples in samples.items()
+        }
+
+    def run_child(self, mode, urls, env):
+        process = subprocess.run(
+            [sys.executable, "-m", "tutorial.apps.perf.coldstart",
+             mode, json.dumps(urls)],
+            env=env, capture_output=True, text=True,
+            cwd=settings.BASE_DIR)
+        if process.returncode:
+            raise CommandError(process.stderr.strip())
+        return json.loads(process.stdout)
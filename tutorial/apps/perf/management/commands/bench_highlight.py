@@ -0,0 +1,90 @@
+import itertools
+import json
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from pygments import highlight
+from pygments.formatters.html import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+
+from tutorial.apps.perf import bench
+from tutorial.apps.snippets import highlighting
+from tutorial.apps.snippets.models import Snippet
+
+STYLES = ["friendly", "monokai", "default"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure Snippet.save() throughput on small snippets, where lexer "
+        "and formatter setup dominates, with and without the pools.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--saves", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        variants = list(itertools.product(
+            bench.SAMPLE_CODE.items(), STYLES, [False, True]))
+        self.check_output(variants)
+        with bench.scratch_database():
+            owner = bench.seed_users(1)[0]
+            results = {}
+            for mode in ("unpooled", "pooled"):
+                results[mode] = self.run(mode, variants, owner, options)
+        results["speedup"] = {
+            key: round(
+                results["pooled"][key] / results["unpooled"][key], 2)
+            for key in ("saves_per_s", "renders_per_s")}
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def check_output(self, variants):
+        for (language, code), style, linenos in variants:
+            expected = highlight(
+                code,
+                get_lexer_by_name(language),
+                HtmlFormatter(
+                    style=style, linenos="table" if linenos else False,
+                    full=True, title="Title"))
+            # Twice, so the second render uses pooled instances.
+            for _ in range(2):
+                html = highlighting.render(
+                    code, language, style, linenos, "Title")
+                if html != expected:
+                    raise CommandError(
+                        f"Pooled output differs for {language}/{style}.")
+
+    def run(self, mode, variants, owner, options):
+        for pool in highlighting.POOLS.values():
+            pool.clear()
+        # Without idle instances, every checkout builds a new one, as
+        # `save()` used to.
+        max_idle = 0 if mode == "unpooled" else highlighting.lexers.max_idle
+        with mock.patch.object(highlighting.lexers, "max_idle", max_idle), \
+                mock.patch.object(
+                    highlighting.formatters, "max_idle", max_idle):
+            cycle = itertools.cycle(variants)
+            start = time.perf_counter()
+            for i in range(options["saves"]):
+                (language, code), style, linenos = next(cycle)
+                # Distinct code, so that no save reuses a stored highlight.
+                Snippet(
+                    title=f"Snippet {i}", code=f"{code}\n# {mode} {i}\n",
+                    language=language, style=style, linenos=linenos,
+                    owner=owner).save()
+            elapsed = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for i in range(options["saves"]):
+                (language, code), style, linenos = next(cycle)
+                highlighting.render(
+                    code, language, style, linenos, f"Snippet {i}")
+            render_elapsed = time.perf_counter() - start
+        return {
+            "saves": options["saves"],
+            "saves_per_s": round(options["saves"] / elapsed, 1),
+            "renders_per_s": round(options["saves"] / render_elapsed, 1),
+            "pools": {
+                name: pool.stats()
+                for name, pool in highlighting.POOLS.items()},
+        }
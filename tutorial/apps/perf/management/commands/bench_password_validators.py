@@ -0,0 +1,119 @@
+import json
+import time
+import tracemalloc
+
+from django.contrib.auth import password_validation as django_validation
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from rest_framework import exceptions
+
+from tutorial import password_validation
+from tutorial.serializers import UserCreateSerializer
+
+PASSWORDS = {
+    "short": "abc",
+    "numeric": "8203948571",
+    "common": "password123",
+    "strong": "correct horse battery staple",
+}
+
+DJANGO_VALIDATORS = [
+    {"NAME": "django.contrib.auth.password_validation."
+             "UserAttributeSimilarityValidator"},
+    {"NAME": "django.contrib.auth.password_validation."
+             "MinimumLengthValidator"},
+    {"NAME": "django.contrib.auth.password_validation."
+             "CommonPasswordValidator"},
+    {"NAME": "django.contrib.auth.password_validation."
+             "NumericPasswordValidator"},
+]
+
+
+def _time_call(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        try:
+            function()
+        except (ValidationError, exceptions.ValidationError):
+            pass
+    return round((time.perf_counter() - start) / repeat * 1e6, 3)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time each password validator, their start-up cost and the whole "
+        "Register validation path.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+        results = {
+            "startup": self.startup(),
+            "per_validator_us": {},
+            "validate_password_us": {},
+            "register_password_field_us": {},
+        }
+        # Unsaved, so the similarity validator has attributes to compare.
+        user = User(username="bench", email="bench@example.com")
+
+        validators = django_validation.get_default_password_validators()
+        for validator in validators:
+            name = type(validator).__module__ + "." + type(validator).__name__
+            results["per_validator_us"][name] = {
+                label: _time_call(
+                    lambda: validator.validate(password, user), repeat)
+                for label, password in PASSWORDS.items()}
+
+        reference = django_validation.get_password_validators(
+            DJANGO_VALIDATORS)
+        for label, password in PASSWORDS.items():
+            results["validate_password_us"][label] = {
+                "django": _time_call(
+                    lambda: django_validation.validate_password(
+                        password, user, password_validators=reference),
+                    repeat),
+                "short_circuit": _time_call(
+                    lambda: password_validation.validate_password(
+                        password, user),
+                    repeat),
+            }
+            # The username and email checks hit the database, so only
+            # the password field of the Register serializer is timed.
+            field = UserCreateSerializer().fields["password"]
+            results["register_password_field_us"][label] = _time_call(
+                lambda: field.run_validation(password), repeat)
+
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def startup(self):
+        """
+        Load time and retained memory of the common-password list.
+        """
+        loaders = {
+            "django_set": lambda: (
+                django_validation.CommonPasswordValidator().passwords),
+            "compact_digests": lambda: (
+                password_validation.CommonPasswordValidator().passwords),
+        }
+        results = {}
+        for name, load in loaders.items():
+            password_validation.load_password_list.cache_clear()
+            start = time.perf_counter()
+            load()
+            elapsed = time.perf_counter() - start
+
+            password_validation.load_password_list.cache_clear()
+            tracemalloc.start()
+            passwords = load()
+            retained, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results[name] = {
+                "entries": len(passwords),
+                "load_ms": round(elapsed * 1000, 3),
+                "retained_kib": round(retained / 1024, 1),
+                "peak_kib": round(peak / 1024, 1),
+            }
+        return results
@@ -0,0 +1,87 @@
+import json
+import marshal
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+
+from tutorial.apps.perf import bench, profiling
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the overhead of the profiling middleware when disabled, "
+        "when enabled but not sampling, and when profiling a request.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+
+    def handle(self, *args, **options):
+        with bench.scratch_database(), \
+                tempfile.TemporaryDirectory() as directory:
+            owners = bench.seed_users(1)
+            snippet = bench.seed_snippets(1, owners)[0]
+            url = f"/snippets-api/snippets/{snippet.pk}/highlight/"
+            modes = {
+                "disabled": ({"SAMPLE_RATE": 0, "TOKEN": ""}, {}),
+                "idle": ({"SAMPLE_RATE": 0, "TOKEN": "secret"}, {}),
+                "profiled": (
+                    {"SAMPLE_RATE": 0, "TOKEN": "secret"},
+                    {"HTTP_X_PROFILE": "secret"}),
+            }
+            results = {}
+            for name, (profiling_options, headers) in modes.items():
+                with override_settings(PROFILING={
+                        **settings.PROFILING, **profiling_options,
+                        "ROOT": directory}):
+                    # A new client loads the middleware with the settings.
+                    client = Client(**headers)
+                    results[name] = self.run(
+                        client, url, options["requests"])
+            self.check_output(owners[0], directory, options["requests"])
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def run(self, client, url, count):
+        client.get(url)
+        start = time.perf_counter()
+        for _ in range(count):
+            response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f"GET {url}: {response.status_code}")
+        elapsed = time.perf_counter() - start
+        return {
+            "ms": round(elapsed / count * 1000, 3),
+            "profile_id": response.get("X-Profile-Id"),
+        }
+
+    def check_output(self, user, directory, count):
+        with override_settings(PROFILING={
+                **settings.PROFILING, "ROOT": directory}):
+            profiles = profiling.walk()
+            # The warm-up request of the profiled mode is saved too.
+            expected = min(count + 1, settings.PROFILING["MAX_FILES"])
+            if len(profiles) != expected:
+                raise CommandError(f"{len(profiles)} profiles saved.")
+            if profiles[0]["view"] != "SnippetViewSet.highlight":
+                raise CommandError(f"Profiled {profiles[0]['view']}.")
+            client = Client()
+            if client.get("/profiles/").status_code != 403:
+                raise CommandError("Profiles listed anonymously.")
+            user.is_staff = True
+            user.save()
+            client.force_login(user)
+            listed = client.get("/profiles/").json()["profiles"]
+            if listed != profiles:
+                raise CommandError("Listed profiles differ.")
+            text = client.get(f"/profiles/{listed[0]['name']}?text")
+            if b"cumulative" not in text.content:
+                raise CommandError("Profile summary is missing.")
+            download = client.get(f"/profiles/{listed[0]['name']}")
+            stats = marshal.loads(b"".join(download.streaming_content))
+            if not isinstance(stats, dict):
+                raise CommandError("Downloaded profile is not pstats.")
+            if client.get("/profiles/x.prof").status_code != 404:
+                raise CommandError("Served a file that is not a profile.")
@@ -0,0 +1,115 @@
+import io
+import json
+import time
+
+from django.contrib.auth.models import Group, User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework import parsers, renderers as drf_renderers
+
+from tutorial import renderers
+from tutorial.apps.perf import bench
+from tutorial.apps.quickstart import serializers as quickstart_serializers
+from tutorial.apps.snippets import serializers as snippet_serializers
+from tutorial.apps.snippets.models import Snippet
+
+BACKENDS = {
+    "drf": (drf_renderers.JSONRenderer, parsers.JSONParser),
+    "orjson": (renderers.ORJSONRenderer, renderers.ORJSONParser),
+    "msgspec": (renderers.MsgspecJSONRenderer, renderers.MsgspecJSONParser),
+    "msgpack": (renderers.MessagePackRenderer, renderers.MessagePackParser),
+    "cbor": (renderers.CBORRenderer, renderers.CBORParser),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare payload size and encode/decode throughput of the installed "
+        "JSON backends and binary formats on snippet, user and group list "
+        "pages.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=200)
+
+    def handle(self, *args, **options):
+        with bench.scratch_database():
+            owners = bench.seed_users(options["rows"])
+            bench.seed_groups(options["rows"], owners)
+            bench.seed_snippets(options["rows"], owners)
+            pages = self.pages(options["rows"])
+        backends = {}
+        for name, (renderer_class, parser_class) in BACKENDS.items():
+            try:
+                backends[name] = (renderer_class(), parser_class())
+            except ImproperlyConfigured:
+                self.stderr.write(f"Skipping {name}: not installed.")
+        self.stdout.write(json.dumps(
+            self.run(pages, backends, options["repeat"]), indent=2))
+
+    def pages(self, rows):
+        """
+        Serialized list pages, shaped like the paginated responses.
+        """
+        endpoints = {
+            "snippets": (
+                "/snippets-api/snippets/",
+                snippet_serializers.SnippetSerializer,
+                Snippet.objects.select_related("owner", "code_blob")),
+            "users": (
+                "/snippets-api/users/",
+                snippet_serializers.UserSerializer,
+                User.objects.select_related("profile")),
+            "groups": (
+                "/quickstart-api/groups/",
+                quickstart_serializers.GroupSerializer,
+                Group.objects.all()),
+        }
+        pages = {}
+        for name, (path, serializer_class, queryset) in endpoints.items():
+            serializer = serializer_class(
+                queryset[:rows], many=True,
+                context={"request": bench.drf_request(path)})
+            pages[name] = {
+                "count": rows,
+                "next": None,
+                "previous": None,
+                "results": serializer.data,
+            }
+        return pages
+
+    def run(self, pages, backends, repeat):
+        results = {}
+        for page_name, page in pages.items():
+            expected = drf_renderers.JSONRenderer().render(page)
+            expected_data = json.loads(expected)
+            results[page_name] = {}
+            for name, (renderer, parser) in backends.items():
+                content = renderer.render(page)
+                if renderer.format == "json":
+                    same = content == expected
+                else:
+                    same = parser.parse(io.BytesIO(content)) == expected_data
+                if not same:
+                    raise CommandError(
+                        f"{name} renders {page_name} differently from DRF.")
+
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    renderer.render(page)
+                encode = (time.perf_counter() - start) / repeat
+
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    parser.parse(io.BytesIO(content))
+                decode = (time.perf_counter() - start) / repeat
+
+                results[page_name][name] = {
+                    "bytes": len(content),
+                    "size_vs_json": round(len(content) / len(expected), 3),
+                    "encode_ms": round(encode * 1000, 3),
+                    "decode_ms": round(decode * 1000, 3),
+                    "encode_pages_per_s": round(1 / encode),
+                    "encode_mb_per_s": round(len(content) / encode / 1e6, 1),
+                }
+        return results
@@ -0,0 +1,83 @@
+import json
+import time
+from unittest import mock
+
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+
+from tutorial import relations
+from tutorial.apps.perf import bench
+from tutorial.apps.quickstart import serializers as quickstart_serializers
+from tutorial.apps.snippets import serializers as snippet_serializers
+from tutorial.apps.snippets.models import Snippet
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare serializing list pages with per-row reverse() against "
+        "per-request URL templates, and check that both give the same "
+        "output.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=50)
+
+    def handle(self, *args, **options):
+        with bench.scratch_database():
+            owners = bench.seed_users(options["rows"])
+            bench.seed_groups(10, owners)
+            bench.seed_snippets(options["rows"], owners)
+            results = self.run(options)
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def run(self, options):
+        rows = options["rows"]
+        candidates = {
+            "snippets": (
+                "/snippets-api/snippets/",
+                snippet_serializers.SnippetSerializer,
+                Snippet.objects.select_related("owner", "code_blob")),
+            "snippet_users": (
+                "/snippets-api/users/?expand=snippets",
+                snippet_serializers.UserSerializer,
+                User.objects.select_related("profile").prefetch_related(
+                    "snippets")),
+            "quickstart_users": (
+                "/quickstart-api/users/",
+                quickstart_serializers.UserSerializer,
+                User.objects.prefetch_related("groups")),
+            "quickstart_groups": (
+                "/quickstart-api/groups/",
+                quickstart_serializers.GroupSerializer,
+                Group.objects.all()),
+        }
+        results = {}
+        for name, (path, serializer_class, queryset) in candidates.items():
+            instances = list(queryset[:rows])
+
+            def serialize():
+                # A fresh request each time, as the templates live on it.
+                request = bench.drf_request(path)
+                return serializer_class(
+                    instances, many=True, context={"request": request}).data
+
+            with mock.patch.object(
+                    relations, "get_url_template", return_value=None):
+                expected = serialize()
+                reverse_ms = self.time(serialize, options["repeat"])
+            if serialize() != expected:
+                raise CommandError(f"{name}: templated URLs differ.")
+            template_ms = self.time(serialize, options["repeat"])
+            results[name] = {
+                "rows": len(instances),
+                "reverse_ms_per_page": reverse_ms,
+                "template_ms_per_page": template_ms,
+                "speedup": round(reverse_ms / template_ms, 2),
+            }
+        return results
+
+    def time(self, function, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        return round((time.perf_counter() - start) / repeat * 1000, 3)
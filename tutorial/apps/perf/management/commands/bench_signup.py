@@ -0,0 +1,76 @@
+import json
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+
+from tutorial import hashing
+from tutorial.apps.perf import bench
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure registration throughput with password hashing inline and "
+        "in the bounded process pool.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--signups", type=int, default=64)
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument(
+            "--workers", type=int, nargs="+", default=[0, 2, 4],
+            help="Pool sizes to compare; 0 hashes on the request thread.")
+        parser.add_argument("--queue", type=int, default=8)
+        parser.add_argument(
+            "--profile", default=None,
+            help="Hasher profile (pbkdf2, scrypt, argon2) to benchmark.")
+
+    def handle(self, *args, **options):
+        overrides = {}
+        if options["profile"]:
+            from django.conf import settings
+            preferred = settings.PASSWORD_HASHER_PROFILES[options["profile"]]
+            overrides["PASSWORD_HASHERS"] = [preferred] + [
+                hasher for hasher in settings.PASSWORD_HASHERS
+                if hasher != preferred]
+
+        results = {}
+        with bench.scratch_database(on_disk=True):
+            for workers in options["workers"]:
+                pool = {
+                    "WORKERS": workers,
+                    "QUEUE": options["queue"],
+                    "TIMEOUT": 0.5,
+                    "RETRY_AFTER": 1,
+                }
+                with override_settings(PASSWORD_HASHING=pool, **overrides):
+                    results[f"workers={workers}"] = self.run(
+                        workers, options)
+                hashing.shutdown()
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def run(self, workers, options):
+        application = get_wsgi_application()
+        latencies = []
+        statuses = Counter()
+
+        def one(i):
+            body = json.dumps({
+                "username": f"signup-{workers}-{i}",
+                "email": f"signup-{workers}-{i}@example.com",
+                "password": f"correct horse battery {i}",
+            }).encode()
+            start = time.perf_counter()
+            status = bench.call_wsgi(
+                application, "/register/", method="POST", body=body)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options["threads"]) as pool:
+            list(pool.map(one, range(options["signups"])))
+        summary = bench.summarize(latencies, time.perf_counter() - start)
+        summary["statuses"] = dict(statuses)
+        return summary
@@ -0,0 +1,81 @@
+import json
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from rest_framework import throttling as drf_throttling
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+
+from tutorial import throttling
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the per-request overhead of the throttles, against DRF's "
+        "sliding-log throttle, on the configured throttle cache.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--checks", type=int, default=20000)
+        parser.add_argument(
+            "--rate", default="100000/hour",
+            help="Rate for every throttle, high enough to never reject.")
+        parser.add_argument(
+            "--cache-url", default=None,
+            help="Cache URL for the throttle store, e.g. redis://...")
+
+    def handle(self, *args, **options):
+        caches_override = {}
+        if options["cache_url"]:
+            import environ
+            from django.conf import settings
+            caches_override["CACHES"] = {
+                **settings.CACHES,
+                "throttle": environ.Env.cache_url_config(
+                    options["cache_url"]),
+            }
+        with override_settings(**caches_override):
+            caches["throttle"].clear()
+            results = self.run(options)
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def run(self, options):
+        factory = RequestFactory()
+        get = Request(factory.get("/snippets-api/snippets/?page=25"))
+        post = Request(
+            factory.post(
+                "/snippets-api/snippets/",
+                {"code": "print(1)\n" * 1000},
+                content_type="application/json"),
+            parsers=[JSONParser()])
+        for request in (get, post):
+            request.user = AnonymousUser()
+        post.data  # Parse up front; the view would do it anyway.
+
+        class SlidingLog(drf_throttling.AnonRateThrottle):
+            cache = caches["throttle"]
+
+        candidates = {
+            "drf_sliding_log": (SlidingLog, get),
+            "token_bucket_anon": (throttling.AnonThrottle, get),
+            "deep_pagination": (throttling.DeepPaginationThrottle, get),
+            "snippet_write": (throttling.SnippetWriteThrottle, post),
+        }
+        results = {}
+        for name, (throttle_class, request) in candidates.items():
+            throttle = throttle_class()
+            throttle.rate = options["rate"]
+            throttle.num_requests, throttle.duration = throttle.parse_rate(
+                throttle.rate)
+            start = time.perf_counter()
+            for _ in range(options["checks"]):
+                throttle.allow_request(request, None)
+            elapsed = time.perf_counter() - start
+            results[name] = {
+                "checks": options["checks"],
+                "us_per_check": round(elapsed / options["checks"] * 1e6, 3),
+            }
+        return results
@@ -0,0 +1,204 @@
+import itertools
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+
+from tutorial.apps.perf import bench
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database and benchmark the API endpoints "
+        "in-process, reporting latency percentiles, throughput, query "
+        "counts and peak memory as JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--groups", type=int, default=5)
+        parser.add_argument("--snippets", type=int, default=1000)
+        parser.add_argument(
+            "--max-lines", type=int, default=40,
+            help="Upper bound on repeated sample blocks per snippet.")
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument(
+            "--register-requests", type=int, default=10,
+            help="Registrations are dominated by password hashing, so "
+                 "they get their own, smaller, request count.")
+        parser.add_argument(
+            "--only", nargs="+", default=None,
+            help="Run only the named scenarios.")
+        parser.add_argument("--output", help="Also write the JSON here.")
+        parser.add_argument(
+            "--compare", help="Previous JSON report to compare against.")
+
+    def handle(self, *args, **options):
+        with bench.scratch_database():
+            self.seed(options)
+            scenarios = self.scenarios(options)
+            if options["only"]:
+                scenarios = {
+                    name: scenario for name, scenario in scenarios.items()
+                    if name in options["only"]}
+            results = {
+                name: self.run(*scenario)
+                for name, scenario in scenarios.items()}
+
+        report = {
+            "meta": self.meta(options),
+            "results": results,
+        }
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                report["comparison"] = self.compare(json.load(f), results)
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output)
+        self.stdout.write(output)
+
+    def seed(self, options):
+        self.users = bench.seed_users(options["users"])
+        bench.seed_groups(options["groups"], self.users)
+        self.snippets = bench.seed_snippets(
+            options["snippets"], self.users, max_lines=options["max_lines"])
+        self.owner = self.users[0]
+        self.owned = [
+            snippet for snippet in self.snippets
+            if snippet.owner_id == self.owner.pk]
+
+    def scenarios(self, options):
+        """
+        Map scenario names to `(client, request maker, count)`. Request
+        makers take the iteration number and return `(method, url, data)`.
+        """
+        anonymous = Client()
+        member = Client()
+        member.force_login(self.owner)
+        pages = max(1, len(self.snippets) // settings.REST_FRAMEWORK[
+            "PAGE_SIZE"])
+        snippet_ids = itertools.cycle(s.pk for s in self.snippets)
+        owned_ids = itertools.cycle(s.pk for s in self.owned)
+        count = options["requests"]
+
+        def snippet_url(pk, suffix=""):
+            return f"/snippets-api/snippets/{pk}/{suffix}"
+
+        return {
+            "snippet-list": (anonymous, lambda i: (
+                "get", f"/snippets-api/snippets/?page={i % pages + 1}",
+                None), count),
+            "snippet-retrieve": (anonymous, lambda i: (
+                "get", snippet_url(next(snippet_ids)), None), count),
+            "snippet-highlight": (anonymous, lambda i: (
+                "get", snippet_url(next(snippet_ids), "highlight/"),
+                None), count),
+            "snippet-create": (member, lambda i: (
+                "post", "/snippets-api/snippets/", {
+                    "title": f"Created {i}",
+                    "code": bench.SAMPLE_CODE["python"] * (i % 20 + 1),
+                    "language": "python",
+                }), count),
+            "snippet-patch": (member, lambda i: (
+                "patch", snippet_url(next(owned_ids)),
+                {"code": bench.SAMPLE_CODE["python"] * (i % 20 + 1)}),
+                count),
+            "snippets-user-list": (anonymous, lambda i: (
+                "get", "/snippets-api/users/", None), count),
+            "quickstart-user-list": (member, lambda i: (
+                "get", "/quickstart-api/users/", None), count),
+            "quickstart-group-list": (member, lambda i: (
+                "get", "/quickstart-api/groups/", None), count),
+            "register": (anonymous, lambda i: (
+                "post", "/register/", {
+                    "username": f"registered{i}",
+                    "email": f"registered{i}@example.com",
+                    "password": f"correct horse battery {i}",
+                }), options["register_requests"]),
+        }
+
+    def send(self, client, method, url, data):
+        kwargs = {"HTTP_ACCEPT": "application/json"}
+        if url.endswith("highlight/"):
+            kwargs = {}
+        if data is not None:
+            kwargs["content_type"] = "application/json"
+            return getattr(client, method)(url, data, **kwargs)
+        return getattr(client, method)(url, **kwargs)
+
+    def run(self, client, make_request, count):
+        latencies = []
+        queries = []
+        statuses = {}
+        counter = bench.QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            for i in range(count):
+                before = counter.count
+                request_start = time.perf_counter()
+                response = self.send(client, *make_request(i))
+                latencies.append(time.perf_counter() - request_start)
+                queries.append(counter.count - before)
+                statuses[response.status_code] = statuses.get(
+                    response.status_code, 0) + 1
+        summary = bench.summarize(latencies, time.perf_counter() - start)
+        summary["queries_per_request"] = {
+            "min": min(queries, default=0),
+            "max": max(queries, default=0),
+            "mean": round(sum(queries) / max(len(queries), 1), 2),
+        }
+        summary["statuses"] = statuses
+
+        # Measured separately, since tracing allocations skews latency.
+        tracemalloc.start()
+        self.send(client, *make_request(count))
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        summary["peak_memory_kib"] = round(peak / 1024, 1)
+        return summary
+
+    def meta(self, options):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True, text=True, cwd=settings.BASE_DIR,
+            ).stdout.strip() or None
+        except OSError:
+            commit = None
+        return {
+            "commit": commit,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "options": {
+                key: options[key] for key in (
+                    "users", "groups", "snippets", "max_lines", "requests",
+                    "register_requests")},
+        }
+
+    def compare(self, previous, results):
+        """
+        Relative change of the main metrics against a previous report;
+        negative latencies and positive throughput are improvements.
+        Scenarios where no request completed this time are flagged.
+        """
+        comparison = {}
+        for name, current in results.items():
+            before = previous.get("results", {}).get(name)
+            if not before or not before.get("requests"):
+                continue
+            if not current.get("requests"):
+                comparison[name] = "no requests completed"
+                continue
+            comparison[name] = {
+                metric: f"{(current[metric] / before[metric] - 1) * 100:+.1f}%"
+                for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps")
+                if before.get(metric) and metric in current}
+        return comparison
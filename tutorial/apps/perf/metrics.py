@@ -0,0 +1,160 @@
+"""
+In-process histograms, exposed in the Prometheus text format.
+
+Each process keeps its own counts; with several workers, scrape each one
+(or aggregate them upstream).
+"""
+import bisect
+import threading
+
+from tutorial import authentication, browsable
+from tutorial.apps.snippets import highlighting
+
+DURATION_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    """
+    Cumulative histogram with a single `view` label.
+    """
+
+    def __init__(self, name, documentation, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, view, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(view)
+            if series is None:
+                series = self._series[view] = [
+                    [0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series = sorted(
+                (view, list(counts), total, count)
+                for view, (counts, total, count) in self._series.items())
+        for view, counts, total, count in series:
+            label = 'view="%s"' % _escape(view)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(
+                    f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label}}} {total}")
+            lines.append(f"{self.name}_count{{{label}}} {count}")
+        return "\n".join(lines)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace(
+        "\n", "\\n")
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Total time spent handling requests.")
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "SQL queries executed per request.",
+    buckets=COUNT_BUCKETS)
+
+# One histogram per component recorded in `tutorial.timing.RequestTimings`.
+COMPONENT_DURATIONS = {
+    component: Histogram(
+        f"http_request_{component}_seconds",
+        f"Time spent in {description} per request.")
+    for component, description in (
+        ("db", "SQL queries"),
+        ("highlight", "Pygments highlighting"),
+        ("serialize", "serializer to_representation"),
+        ("render", "response rendering"),
+    )
+}
+
+
+def observe(view, total, timings):
+    REQUEST_DURATION.observe(view, total)
+    REQUEST_QUERIES.observe(view, timings.queries)
+    for component, histogram in COMPONENT_DURATIONS.items():
+        histogram.observe(view, timings.durations.get(component, 0.0))
+
+
+def render_pools():
+    """
+    Counters of the highlighting lexer and formatter pools.
+    """
+    stats = {
+        pool: pool_object.stats()
+        for pool, pool_object in highlighting.POOLS.items()}
+    lines = []
+    for stat, documentation in (
+            ("hits", "Checkouts served by an idle instance."),
+            ("misses", "Checkouts that built a new instance."),
+            ("evictions", "Keys dropped as least recently used.")):
+        name = f"highlight_pool_{stat}_total"
+        lines += [f"# HELP {name} {documentation}", f"# TYPE {name} counter"]
+        lines += [
+            f'{name}{{pool="{pool}"}} {values[stat]}'
+            for pool, values in stats.items()]
+    return "\n".join(lines)
+
+
+def _render_cache_counters(prefix, caches, miss_documentation):
+    stats = {
+        cache: cache_object.stats()
+        for cache, cache_object in caches.items()}
+    lines = []
+    for stat, documentation in (
+            ("hits", "Lookups served from the cache."),
+            ("misses", miss_documentation)):
+        name = f"{prefix}_{stat}_total"
+        lines += [f"# HELP {name} {documentation}", f"# TYPE {name} counter"]
+        lines += [
+            f'{name}{{cache="{cache}"}} {values[stat]}'
+            for cache, values in stats.items()]
+    return "\n".join(lines)
+
+
+def render_browsable_caches():
+    """
+    Counters of the browsable API form field and metadata caches.
+    """
+    return _render_cache_counters(
+        "browsable_cache", browsable.CACHES,
+        "Lookups that rendered the value.")
+
+
+def render_auth_caches():
+    """
+    Counters of the authenticated user and token caches.
+    """
+    return _render_cache_counters(
+        "auth_cache", authentication.CACHES,
+        "Lookups that queried the database.")
+
+
+def render():
+    histograms = [
+        REQUEST_DURATION, REQUEST_QUERIES, *COMPONENT_DURATIONS.values()]
+    sections = [histogram.render() for histogram in histograms]
+    sections.append(render_pools())
+    sections.append(render_browsable_caches())
+    sections.append(render_auth_caches())
+    return "\n".join(sections) + "\n"
@@ -0,0 +1,111 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from tutorial import timing
+
+from . import metrics, queryhooks
+
+
+def view_name(request):
+    """
+    Stable, low-cardinality name for the view that handled `request`: the
+    class name for DRF views, followed by the action for viewsets
+    (`SnippetViewSet.list`), or "unresolved".
+    """
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unresolved"
+    view_func = match.func
+    cls = getattr(view_func, "cls", None)
+    name = cls.__name__ if cls is not None else view_func.__name__
+    actions = getattr(view_func, "actions", None)
+    if actions:
+        action = actions.get(request.method.lower())
+        if action:
+            name = f"{name}.{action}"
+    return name
+
+
+class PerformanceMiddleware:
+    """
+    Record SQL, highlighting, serialization and rendering time for every
+    request, aggregated per view into the histograms served at
+    `/metrics/` and, if `PERF["SERVER_TIMING"]` is set, sent back in a
+    `Server-Timing` header.
+
+    Place it first in `MIDDLEWARE` so it covers the whole stack. It runs
+    natively in both the sync and async chains, so async views are not
+    pushed onto a thread under ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = settings.PERF["SERVER_TIMING"]
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # Django calls a sync hook in an async chain through a thread.
+            self.process_template_response = (
+                self.aprocess_template_response)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = timing.RequestTimings()
+        token = timing.activate(timings)
+        start = time.perf_counter()
+        try:
+            with queryhooks.installed(timings.record_query):
+                response = self.get_response(request)
+        finally:
+            timing.deactivate(token)
+        return self.finish(request, response, timings, start)
+
+    async def __acall__(self, request):
+        timings = timing.RequestTimings()
+        token = timing.activate(timings)
+        start = time.perf_counter()
+        try:
+            with queryhooks.installed(timings.record_query):
+                response = await self.get_response(request)
+        finally:
+            timing.deactivate(token)
+        return self.finish(request, response, timings, start)
+
+    def finish(self, request, response, timings, start):
+        total = time.perf_counter() - start
+        metrics.observe(view_name(request), total, timings)
+        if self.server_timing:
+            response["Server-Timing"] = self.format_server_timing(
+                total, timings)
+        return response
+
+    def process_template_response(self, request, response):
+        return self.time_rendering(response)
+
+    async def aprocess_template_response(self, request, response):
+        return self.time_rendering(response)
+
+    def time_rendering(self, response):
+        # Rendering happens right after the template response hooks
+        # return; the callback runs once it is done.
+        timings = timing.current()
+        if timings is not None:
+            start = time.perf_counter()
+            response.add_post_render_callback(
+                lambda response: timings.add(
+                    "render", time.perf_counter() - start))
+        return response
+
+    def format_server_timing(self, total, timings):
+        entries = [
+            f'db;dur={timings.durations.get("db", 0.0) * 1000:.2f};'
+            f'desc="{timings.queries} queries"']
+        for name, seconds in timings.durations.items():
+            if name != "db":
+                entries.append(f"{name};dur={seconds * 1000:.2f}")
+        entries.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(entries)
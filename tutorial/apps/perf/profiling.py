@@ -0,0 +1,220 @@
+"""
+On-demand cProfile profiles of live requests.
+
+`ProfilingMiddleware` profiles a random `PROFILING["SAMPLE_RATE"]` share
+of requests, plus any request whose `X-Profile` header carries
+`PROFILING["TOKEN"]`:
+
+    curl -H "X-Profile: $PROFILING_TOKEN" .../snippets/1/highlight/
+
+Each profile is dumped in the `pstats` format to a file under
+`PROFILING["ROOT"]`, named after the time, view, method, status and
+duration of the request, and its name is sent back in an `X-Profile-Id`
+header (a profile that cannot be saved is only logged). Only the newest
+`MAX_FILES` are kept. Staff list them at `/profiles/` and download them
+at `/profiles/<name>` (add `?text` for a summary sorted by cumulative
+time), to open with `python -m pstats` or snakeviz.
+
+With no sample rate and no token, the middleware raises
+`MiddlewareNotUsed` and drops out of the stack entirely. Otherwise the
+cost of a request that is not profiled is one random number and one
+header lookup.
+
+cProfile only sees the thread it runs in, and Python 3.12 allows a
+single active profiler per process, so one request is profiled at a time
+per process; requests sampled meanwhile run unprofiled.
+
+The middleware also runs natively under ASGI, where the profile covers
+the event loop thread while the request is in flight: the async view's
+own code, but also any other request's coroutines that the loop runs
+meanwhile. Work handed to threads (sync views, the async ORM's queries)
+only shows up as time spent awaiting, so profile sync views through a
+WSGI worker.
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import secrets
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from asgiref.sync import (
+    iscoroutinefunction, markcoroutinefunction, sync_to_async)
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .middleware import view_name
+
+logger = logging.getLogger("tutorial.perf")
+
+HEADER = "HTTP_X_PROFILE"
+
+# 20261019T033750.123456Z-SnippetViewSet.highlight-GET-200-153ms.prof
+_NAME = re.compile(
+    r"^(?P<at>\d{8}T\d{6}\.\d{6}Z)-(?P<view>[\w.]+)-(?P<method>[A-Z]+)-"
+    r"(?P<status>\d{3})-(?P<ms>\d+)ms\.prof$")
+_UNSAFE = re.compile(r"[^\w.]+")
+
+_lock = threading.Lock()
+
+
+def root():
+    return Path(settings.PROFILING["ROOT"])
+
+
+def file_name(view, method, status, seconds):
+    at = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.%fZ")
+    view = _UNSAFE.sub("_", view) or "unresolved"
+    return f"{at}-{view}-{method}-{status}-{round(seconds * 1000)}ms.prof"
+
+
+def save(profiler, name):
+    """
+    Dump `profiler` to `name` under the root, atomically, and prune the
+    oldest profiles beyond `MAX_FILES`.
+    """
+    directory = root()
+    directory.mkdir(parents=True, exist_ok=True)
+    handle, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(handle)
+    try:
+        profiler.dump_stats(temporary)
+        os.replace(temporary, directory / name)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    names = sorted(entry["name"] for entry in walk())
+    for old in names[:-settings.PROFILING["MAX_FILES"]]:
+        try:
+            (directory / old).unlink()
+        except FileNotFoundError:
+            pass
+
+
+def walk():
+    """
+    The saved profiles, newest first, with the request details their
+    names record.
+    """
+    try:
+        entries = list(os.scandir(root()))
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for entry in entries:
+        match = _NAME.match(entry.name)
+        if match is None or not entry.is_file():
+            continue
+        profiles.append({
+            "name": entry.name,
+            "at": datetime.strptime(
+                match["at"], "%Y%m%dT%H%M%S.%fZ").replace(
+                    tzinfo=timezone.utc).isoformat(),
+            "view": match["view"],
+            "method": match["method"],
+            "status": int(match["status"]),
+            "ms": int(match["ms"]),
+            "size": entry.stat().st_size,
+        })
+    profiles.sort(key=lambda profile: profile["name"], reverse=True)
+    return profiles
+
+
+def path(name):
+    """
+    Path of the profile called `name`, or None for anything that is not
+    a profile name (including attempts to leave the root).
+    """
+    if _NAME.match(name) is None:
+        return None
+    return root() / name
+
+
+def summary(name, limit=50):
+    """
+    The `limit` functions with the most cumulative time, as text.
+    """
+    stream = io.StringIO()
+    stats = pstats.Stats(str(path(name)), stream=stream)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+    return stream.getvalue()
+
+
+class ProfilingMiddleware:
+    """
+    Profile sampled or explicitly requested requests with cProfile (see
+    the module docstring). Place it right after `PerformanceMiddleware`,
+    so it covers the rest of the stack.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        options = settings.PROFILING
+        self.sample_rate = options["SAMPLE_RATE"]
+        self.token = options["TOKEN"]
+        if not self.sample_rate and not self.token:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.wanted(request) or not _lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            return self.finish(request, response, profiler, start)
+        finally:
+            _lock.release()
+
+    async def __acall__(self, request):
+        if not self.wanted(request) or not _lock.acquire(blocking=False):
+            return await self.get_response(request)
+        try:
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                response = await self.get_response(request)
+            finally:
+                profiler.disable()
+            return await sync_to_async(
+                self.finish, thread_sensitive=False)(
+                    request, response, profiler, start)
+        finally:
+            _lock.release()
+
+    def finish(self, request, response, profiler, start):
+        name = file_name(
+            view_name(request), request.method, response.status_code,
+            time.perf_counter() - start)
+        try:
+            save(profiler, name)
+        except OSError:
+            logger.exception("Could not save profile %s", name)
+        else:
+            response["X-Profile-Id"] = name
+        return response
+
+    def wanted(self, request):
+        header = request.META.get(HEADER)
+        if header is not None and self.token:
+            return secrets.compare_digest(
+                header.encode(), self.token.encode())
+        return random.random() < self.sample_rate
@@ -0,0 +1,52 @@
+"""
+Per-request query hooks that follow the request across threads.
+
+`connection.execute_wrapper` only applies to the connection of the
+thread that installs it, and database connections are thread-local. Under
+ASGI, middleware runs on the event loop while the async ORM runs its
+queries in a worker thread, on another connection, so wrappers installed
+by async middleware never see them.
+
+Instead, every connection gets one dispatching wrapper when it connects,
+and `installed()` adds hooks to a context variable. The context is copied
+into `sync_to_async` threads, so the hooks apply to the request's queries
+whichever thread runs them.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_hooks = ContextVar("perf_query_hooks", default=())
+
+
+def dispatch(execute, sql, params, many, context):
+    """
+    `connection.execute_wrapper` hook running the query through the
+    current hooks, the first installed outermost.
+    """
+    for hook in reversed(_hooks.get()):
+        execute = partial(hook, execute)
+    return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_dispatch(sender, connection, **kwargs):
+    # Connection wrappers are reused across reconnections.
+    if dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(dispatch)
+
+
+@contextmanager
+def installed(hook):
+    """
+    Run every query of the current context through `hook`, an
+    `execute_wrapper` style callable, for the duration of the block.
+    """
+    token = _hooks.set(_hooks.get() + (hook,))
+    try:
+        yield hook
+    finally:
+        _hooks.reset(token)
@@ -0,0 +1,191 @@
+"""
+Detection of repeated (N+1) and slow SQL queries.
+
+Queries are grouped by fingerprint, i.e. their SQL with parameter lists
+collapsed, so `SELECT ... WHERE id = %s` run once per row shows up as a
+single shape executed N times. What happens when a shape repeats more
+than `PERF["REPEATED_QUERY_THRESHOLD"]` times is set by
+`PERF["QUERY_ENFORCEMENT"]`:
+
+- "off": nothing;
+- "log": log a warning on the "tutorial.perf" logger;
+- "warn": issue an `NPlusOneWarning`;
+- "raise": raise `NPlusOneError`, so the test suite fails on regressions.
+
+Queries slower than `PERF["SLOW_QUERY_MS"]` are logged with their query
+plan.
+"""
+import logging
+import re
+import time
+import warnings
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import (
+    iscoroutinefunction, markcoroutinefunction, sync_to_async)
+from django.conf import settings
+from django.db import connections
+
+from . import queryhooks
+from .middleware import view_name
+
+logger = logging.getLogger("tutorial.perf")
+
+ENFORCEMENT_CHOICES = ("off", "log", "warn", "raise")
+
+_IN_LIST = re.compile(r"\bIN \((?:%s, )*%s\)", re.IGNORECASE)
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+class NPlusOneWarning(RuntimeWarning):
+    pass
+
+
+def fingerprint(sql):
+    """
+    Reduce SQL to its shape: literals and placeholder lists collapsed.
+    """
+    sql = _IN_LIST.sub("IN (...)", sql)
+    sql = _LITERAL.sub("?", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+class QueryInspector:
+    """
+    `connection.execute_wrapper` hook collecting query shapes and slow
+    queries for one unit of work (usually a request).
+    """
+
+    def __init__(self, threshold=None, slow_query_ms=None):
+        options = settings.PERF
+        self.threshold = (
+            options["REPEATED_QUERY_THRESHOLD"]
+            if threshold is None else threshold)
+        self.slow_query_ms = (
+            options["SLOW_QUERY_MS"]
+            if slow_query_ms is None else slow_query_ms)
+        self.shapes = Counter()
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.shapes[fingerprint(sql)] += 1
+            if elapsed_ms >= self.slow_query_ms and not many:
+                self.slow.append(
+                    (context["connection"].alias, sql, params, elapsed_ms))
+
+    def repeated(self):
+        """
+        Query shapes executed more than `threshold` times, most first.
+        """
+        return [
+            (shape, count) for shape, count in self.shapes.most_common()
+            if count > self.threshold]
+
+    def explain(self, alias, sql, params):
+        connection = connections[alias]
+        if not sql.lstrip().upper().startswith("SELECT"):
+            return None
+        prefix = connection.ops.explain_query_prefix()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"{prefix} {sql}", params)
+                return "\n".join(
+                    " ".join(str(column) for column in row)
+                    for row in cursor.fetchall())
+        except Exception as exc:
+            return f"(no plan: {exc})"
+
+    def report(self, label, enforcement):
+        """
+        Log slow queries and apply `enforcement` to repeated shapes.
+        """
+        for alias, sql, params, elapsed_ms in self.slow:
+            logger.warning(
+                "Slow query (%.1f ms) in %s: %s\nPlan:\n%s",
+                elapsed_ms, label, sql, self.explain(alias, sql, params))
+
+        repeated = self.repeated()
+        if not repeated or enforcement == "off":
+            return
+        message = f"Repeated queries in {label}: " + "; ".join(
+            f"{count}x {shape}" for shape, count in repeated)
+        if enforcement == "raise":
+            raise NPlusOneError(message)
+        if enforcement == "warn":
+            warnings.warn(message, NPlusOneWarning, stacklevel=2)
+        else:
+            logger.warning(message)
+
+
+def installed(inspector):
+    """
+    Route the queries of the current context, whichever thread and
+    connection run them, through `inspector`.
+    """
+    return queryhooks.installed(inspector)
+
+
+@contextmanager
+def inspect_queries(label="block", enforcement="raise", **kwargs):
+    """
+    Inspect the queries run inside the block, e.g. to assert in a test
+    that an endpoint is free of N+1 queries.
+    """
+    inspector = QueryInspector(**kwargs)
+    with installed(inspector):
+        yield inspector
+    inspector.report(label, enforcement)
+
+
+class QueryInspectionMiddleware:
+    """
+    Run every request under a `QueryInspector`, as configured by the
+    `PERF` setting. Runs natively in async chains too; only explaining
+    a slow query, which needs the database, goes through a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enforcement = settings.PERF["QUERY_ENFORCEMENT"]
+        if self.enforcement not in ENFORCEMENT_CHOICES:
+            raise ValueError(
+                f"PERF['QUERY_ENFORCEMENT'] must be one of "
+                f"{ENFORCEMENT_CHOICES}, not {self.enforcement!r}")
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        inspector = QueryInspector()
+        with installed(inspector):
+            response = self.get_response(request)
+        inspector.report(self.label(request), self.enforcement)
+        return response
+
+    async def __acall__(self, request):
+        inspector = QueryInspector()
+        with installed(inspector):
+            response = await self.get_response(request)
+        if inspector.slow:
+            await sync_to_async(inspector.report)(
+                self.label(request), self.enforcement)
+        else:
+            inspector.report(self.label(request), self.enforcement)
+        return response
+
+    def label(self, request):
+        return f"{view_name(request)} ({request.path})"
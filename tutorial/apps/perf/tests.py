@@ -0,0 +1,186 @@
+import pstats
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed
+from django.test import TestCase, override_settings
+
+from tutorial.apps.perf import middleware, profiling, querywatch
+from tutorial.apps.perf.management.commands import benchmark
+
+
+def perf_settings(**options):
+    return override_settings(PERF={**settings.PERF, **options})
+
+
+class MetricsViewTests(TestCase):
+    def test_local_anonymous_client_is_refused(self):
+        # Behind a local reverse proxy every client comes from 127.0.0.1.
+        response = self.client.get("/metrics/", REMOTE_ADDR="127.0.0.1")
+        self.assertEqual(response.status_code, 403)
+
+    def test_bearer_token(self):
+        with perf_settings(METRICS_TOKEN="scrape"):
+            response = self.client.get(
+                "/metrics/", HTTP_AUTHORIZATION="Bearer scrape")
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b"http_request_duration_seconds", response.content)
+            response = self.client.get(
+                "/metrics/", HTTP_AUTHORIZATION="Bearer wrong")
+            self.assertEqual(response.status_code, 403)
+
+    def test_empty_token_does_not_match(self):
+        with perf_settings(METRICS_TOKEN=""):
+            response = self.client.get(
+                "/metrics/", HTTP_AUTHORIZATION="Bearer ")
+        self.assertEqual(response.status_code, 403)
+
+    def test_staff(self):
+        user = User.objects.create_user("staff", is_staff=True)
+        self.client.force_login(user)
+        self.assertEqual(self.client.get("/metrics/").status_code, 200)
+
+
+class ServerTimingTests(TestCase):
+    def test_off_by_default(self):
+        response = self.client.get("/snippets-api/snippets/")
+        self.assertNotIn("Server-Timing", response)
+
+    def test_opt_in(self):
+        with perf_settings(SERVER_TIMING=True):
+            response = self.client.get("/snippets-api/snippets/")
+        self.assertIn("total;dur=", response["Server-Timing"])
+        self.assertRegex(response["Server-Timing"], r'desc="\d+ queries"')
+
+    async def test_async_view(self):
+        # The async ORM runs queries on a thread; they are still counted.
+        with perf_settings(SERVER_TIMING=True):
+            response = await self.async_client.get(
+                "/snippets-api/async/snippets/")
+        self.assertIn('desc="2 queries"', response["Server-Timing"])
+
+
+class QueryInspectionTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user("owner")
+        self.client.force_login(owner)
+        for i in range(3):
+            self.client.post(
+                "/snippets-api/snippets/", {"code": f"x = {i}"})
+
+    def test_repeated_queries_raise(self):
+        # Fetching each listed snippet separately is the N+1 shape.
+        pks = [item["id"] for item in self.client.get(
+            "/snippets-api/snippets/").json()["results"]]
+        with self.assertRaises(querywatch.NPlusOneError):
+            with querywatch.inspect_queries(threshold=2):
+                for pk in pks:
+                    self.client.get(f"/snippets-api/snippets/{pk}/")
+
+    async def test_async_view(self):
+        # The queries run on a worker thread, and are still inspected.
+        with perf_settings(
+                QUERY_ENFORCEMENT="raise", REPEATED_QUERY_THRESHOLD=0):
+            with self.assertRaisesMessage(
+                    querywatch.NPlusOneError,
+                    "snippet_list_async (/snippets-api/async/snippets/)"):
+                await self.async_client.get("/snippets-api/async/snippets/")
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = override_settings(PROFILING={
+            **settings.PROFILING, "SAMPLE_RATE": 0, "TOKEN": "secret",
+            "ROOT": directory.name})
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def stats(self, name):
+        return pstats.Stats(str(profiling.path(name))).stats
+
+    def test_disabled_middleware_is_not_used(self):
+        with override_settings(PROFILING={
+                **settings.PROFILING, "SAMPLE_RATE": 0, "TOKEN": ""}):
+            with self.assertRaises(MiddlewareNotUsed):
+                profiling.ProfilingMiddleware(lambda request: None)
+
+    def test_profile_requested_with_token(self):
+        response = self.client.get(
+            "/snippets-api/snippets/", HTTP_X_PROFILE="secret")
+        name = response["X-Profile-Id"]
+        self.assertEqual(
+            [profile["name"] for profile in profiling.walk()], [name])
+        self.assertIn("-SnippetViewSet.list-GET-200-", name)
+        self.assertTrue(any(
+            function == "list" for _, _, function in self.stats(name)))
+
+    def test_wrong_token_is_not_profiled(self):
+        response = self.client.get(
+            "/snippets-api/snippets/", HTTP_X_PROFILE="guess")
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(profiling.walk(), [])
+
+    async def test_async_view(self):
+        response = await self.async_client.get(
+            "/snippets-api/async/snippets/", headers={"X-Profile": "secret"})
+        name = response["X-Profile-Id"]
+        self.assertTrue(any(
+            function == "snippet_list_async"
+            for _, _, function in self.stats(name)))
+
+    def test_staff_only_listing_and_download(self):
+        name = self.client.get(
+            "/snippets-api/snippets/", HTTP_X_PROFILE="secret")[
+                "X-Profile-Id"]
+        self.assertEqual(self.client.get("/profiles/").status_code, 403)
+        self.assertEqual(
+            self.client.get(f"/profiles/{name}").status_code, 403)
+        self.client.force_login(
+            User.objects.create_user("staff", is_staff=True))
+        listed = self.client.get("/profiles/").json()["profiles"]
+        self.assertEqual([profile["name"] for profile in listed], [name])
+        response = self.client.get(f"/profiles/{name}")
+        self.assertEqual(response["Content-Type"], "application/octet-stream")
+        self.assertIn(
+            b"cumulative", self.client.get(f"/profiles/{name}?text").content)
+        self.assertEqual(
+            self.client.get("/profiles/settings.py").status_code, 404)
+
+
+class ViewNameTests(TestCase):
+    def test_viewset_action(self):
+        response = self.client.get("/snippets-api/snippets/")
+        self.assertEqual(
+            middleware.view_name(response.wsgi_request),
+            "SnippetViewSet.list")
+
+    def test_unresolved(self):
+        response = self.client.get("/no-such-page/")
+        self.assertEqual(
+            middleware.view_name(response.wsgi_request), "unresolved")
+
+
+class BenchmarkCompareTests(TestCase):
+    def test_compare(self):
+        previous = {"results": {
+            "list": {"requests": 10, "p50_ms": 10, "p95_ms": 20,
+                     "p99_ms": 40, "throughput_rps": 100},
+            "failed": {"requests": 10, "p50_ms": 10},
+            "new_before": {"requests": 0},
+        }}
+        results = {
+            "list": {"requests": 10, "p50_ms": 5, "p95_ms": 20,
+                     "p99_ms": 50, "throughput_rps": 150},
+            "failed": {"requests": 0},
+            "new_before": {"requests": 10, "p50_ms": 1},
+            "added": {"requests": 10, "p50_ms": 1},
+        }
+        self.assertEqual(benchmark.Command().compare(previous, results), {
+            "list": {
+                "p50_ms": "-50.0%", "p95_ms": "+0.0%", "p99_ms": "+25.0%",
+                "throughput_rps": "+50.0%"},
+            "failed": "no requests completed",
+        })
@@ -0,0 +1,13 @@
+"""
+URL configuration for perf app.
+"""
+from django.urls import path
+
+from . import views
+
+app_name = "perf"
+urlpatterns = [
+    path("metrics/", views.metrics_view, name="metrics"),
+    path("profiles/", views.profiles_view, name="profiles"),
+    path("profiles/<str:name>", views.profile_view, name="profile"),
+]
@@ -0,0 +1,48 @@
+import secrets
+
+from django.conf import settings
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseForbidden, JsonResponse)
+
+from . import metrics, profiling
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint, for staff and for scrapers sending
+    `PERF["METRICS_TOKEN"]` as a bearer token.
+    """
+    token = settings.PERF["METRICS_TOKEN"]
+    scraper = bool(token) and secrets.compare_digest(
+        request.META.get("HTTP_AUTHORIZATION", "").encode(),
+        f"Bearer {token}".encode())
+    if not (scraper or request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.render(), content_type="text/plain; version=0.0.4")
+
+
+def profiles_view(request):
+    """
+    The saved request profiles, newest first. Staff only.
+    """
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    return JsonResponse({"profiles": profiling.walk()})
+
+
+def profile_view(request, name):
+    """
+    Download a saved profile, or `?text` for a summary. Staff only.
+    """
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    path = profiling.path(name)
+    if path is None or not path.is_file():
+        raise Http404
+    if "text" in request.GET:
+        return HttpResponse(
+            profiling.summary(name), content_type="text/plain; charset=utf-8")
+    return FileResponse(
+        path.open("rb"), as_attachment=True, filename=name,
+        content_type="application/octet-stream")
@@ -0,0 +1,41 @@
+"""
+Unique index on `auth_user.email`.
+
+`auth.User` belongs to another app: operations like `AddConstraint` (even
+as the state half of `SeparateDatabaseAndState`) only reach models of the
+migration's own app, and `auth`'s migrations cannot be edited. So the
+index is created through the schema editor, and migration state does not
+know about it; `makemigrations` will never add or drop it, and a
+`squashmigrations` must keep this `RunPython`.
+"""
+from django.db import migrations, models
+
+
+def email_constraint():
+    # Blank emails are allowed by `auth.User`, so they are left out.
+    return models.UniqueConstraint(
+        fields=["email"],
+        condition=~models.Q(email=""),
+        name="auth_user_email_unique")
+
+
+def add_constraint(apps, schema_editor):
+    User = apps.get_model("auth", "User")
+    schema_editor.add_constraint(User, email_constraint())
+
+
+def remove_constraint(apps, schema_editor):
+    User = apps.get_model("auth", "User")
+    schema_editor.remove_constraint(User, email_constraint())
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+    ]
+
+    operations = [
+        migrations.RunPython(add_constraint, remove_constraint),
+    ]
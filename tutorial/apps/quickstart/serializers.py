@@ -1,14 +1,23 @@
 from django.contrib.auth.models import Group, User
 from rest_framework import serializers
 
+from tutorial import relations
+from tutorial.timing import TimedRepresentationMixin
 
-class UserSerializer(serializers.HyperlinkedModelSerializer):
+
+class UserSerializer(
+        TimedRepresentationMixin,
+        relations.URLTemplateSerializerMixin,
+        serializers.HyperlinkedModelSerializer):
     class Meta:
         model = User
         fields = ["url", "username", "groups"]
 
 
-class GroupSerializer(serializers.HyperlinkedModelSerializer):
+class GroupSerializer(
+        TimedRepresentationMixin,
+        relations.URLTemplateSerializerMixin,
+        serializers.HyperlinkedModelSerializer):
     class Meta:
         model = Group
         fields = ["url", "name"]
@@ -1,3 +1,304 @@
-from django.test import TestCase
+import os
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth import password_validation as django_validation
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+
+from tutorial import authentication, hashing, password_validation
+from tutorial.serializers import UserCreateSerializer
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("reader")
+        User.objects.create_user("other")
+
+    async def test_anonymous_is_refused(self):
+        response = await self.async_client.get("/quickstart-api/async/users/")
+        self.assertEqual(response.status_code, 403)
+
+    async def test_list_matches_sync_view(self):
+        await sync_to_async(self.async_client.force_login)(self.user)
+        sync = await self.async_client.get("/quickstart-api/users/")
+        response = await self.async_client.get("/quickstart-api/async/users/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), sync.json())
+
+    async def test_token_authentication_matches_sync_view(self):
+        token = await Token.objects.acreate(user=self.user)
+        headers = {"authorization": f"Token {token.key}"}
+        for path in ("users/", f"users/{self.user.pk}/", "groups/"):
+            with self.subTest(path):
+                sync = await self.async_client.get(
+                    f"/quickstart-api/{path}", headers=headers)
+                response = await self.async_client.get(
+                    f"/quickstart-api/async/{path}", headers=headers)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), sync.json())
+
+    async def test_failed_authentication_matches_sync_view(self):
+        headers = {"authorization": "Basic cmVhZGVyOndyb25n"}
+        sync = await self.async_client.get(
+            "/quickstart-api/users/", headers=headers)
+        response = await self.async_client.get(
+            "/quickstart-api/async/users/", headers=headers)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json(), sync.json())
+        self.assertEqual(
+            response.json(), {"detail": "Invalid username/password."})
+
+
+class BatchRetrieveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f"user{i}") for i in range(2)]
+
+    def test_post_still_requires_authentication(self):
+        ids = [user.pk for user in self.users]
+        response = self.client.post(
+            "/quickstart-api/users/batch/", {"ids": ids},
+            content_type="application/json")
+        self.assertEqual(response.status_code, 403)
+        self.client.force_login(self.users[0])
+        response = self.client.post(
+            "/quickstart-api/users/batch/", {"ids": ids[::-1]},
+            content_type="application/json")
+        self.assertEqual(
+            [user["username"] for user in response.json()["results"]],
+            ["user1", "user0"])
+
+
+class PasswordValidationTests(TestCase):
+    def test_common_password_is_rejected(self):
+        validator = password_validation.CommonPasswordValidator()
+        with self.assertRaises(DjangoValidationError):
+            validator.validate("password")
+        validator.validate("a long enough passphrase")
+
+    def test_compact_list_matches_django(self):
+        compact = password_validation.CommonPasswordValidator().passwords
+        passwords = django_validation.CommonPasswordValidator().passwords
+        self.assertEqual(len(compact), len(passwords))
+        sample = sorted(passwords)[::97]
+        for password in [
+                *sample, *(password + "!" for password in sample)]:
+            self.assertEqual(
+                password in compact, password in passwords, password)
+
+    def test_stops_at_first_failure(self):
+        failing = mock.Mock()
+        failing.validate.side_effect = DjangoValidationError("Too short.")
+        skipped = mock.Mock()
+        with self.assertRaises(DjangoValidationError):
+            password_validation.validate_password(
+                "x", password_validators=[failing, skipped])
+        failing.validate.assert_called_once_with("x", None)
+        skipped.validate.assert_not_called()
+
+
+class BrokenExecutor:
+    def submit(self, *args):
+        raise BrokenProcessPool("A worker died.")
+
+    def shutdown(self, **kwargs):
+        pass
+
+
+@override_settings(PASSWORD_HASHING={
+    **settings.PASSWORD_HASHING, "WORKERS": 1})
+class HashingPoolTests(TestCase):
+    def setUp(self):
+        hashing.shutdown()
+        self.addCleanup(hashing.shutdown)
+
+    def test_dead_worker_is_replaced(self):
+        executor, _ = hashing._get_executor()
+        # A worker exiting abruptly breaks the whole pool.
+        with self.assertRaises(BrokenProcessPool):
+            executor.submit(os._exit, 1).result()
+        with self.assertLogs("tutorial.hashing", "WARNING"):
+            encoded = hashing.make_password("correct horse")
+        self.assertTrue(check_password("correct horse", encoded))
+        self.assertIsNot(hashing._get_executor()[0], executor)
+        encoded = hashing.make_password("battery staple")
+        self.assertTrue(check_password("battery staple", encoded))
+
+    def test_hashes_inline_when_pools_keep_breaking(self):
+        with mock.patch.object(
+                hashing, "ProcessPoolExecutor",
+                lambda **kwargs: BrokenExecutor()):
+            with self.assertLogs("tutorial.hashing", "WARNING") as logs:
+                encoded = hashing.make_password("correct horse")
+        self.assertEqual(len(logs.records), 2)
+        self.assertTrue(check_password("correct horse", encoded))
+        # The slot was given back.
+        slots = hashing._get_executor()[1]
+        self.assertEqual(slots._value, 1 + settings.PASSWORD_HASHING["QUEUE"])
+
+
+@override_settings(PASSWORD_HASHING={
+    **settings.PASSWORD_HASHING, "WORKERS": 0})
+class RegistrationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user("taken", email="taken@example.com")
+
+    def setUp(self):
+        caches["throttle"].clear()
+
+    def register(self, username, email):
+        return self.client.post("/register/", {
+            "username": username,
+            "email": email,
+            "password": "a long enough passphrase"})
+
+    def test_register(self):
+        response = self.register("new", "new@example.com")
+        self.assertEqual(response.status_code, 201)
+        user = User.objects.get(username="new")
+        self.assertTrue(user.check_password("a long enough passphrase"))
+
+    def test_taken_fields(self):
+        for username, email, fields in (
+                ("taken", "new@example.com", {"username"}),
+                ("new", "taken@example.com", {"email"}),
+                ("taken", "taken@example.com", {"username", "email"})):
+            with self.subTest(username=username, email=email):
+                response = self.register(username, email)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(set(response.json()), fields)
+
+    def test_lost_race_is_reported_on_the_clashing_field(self):
+        # As if the other user registered between `validate` and `create`.
+        serializer = UserCreateSerializer()
+        with self.assertRaises(ValidationError) as raised:
+            serializer.create({
+                "username": "new",
+                "email": "taken@example.com",
+                "password": "a long enough passphrase"})
+        self.assertEqual(set(raised.exception.detail), {"email"})
+
+    def test_unrelated_integrity_error_is_not_mapped(self):
+        # The message mentions a field, but nothing clashes with it.
+        error = IntegrityError("CHECK constraint failed: email_lowercase")
+        serializer = UserCreateSerializer()
+        with mock.patch.object(User.objects, "create", side_effect=error):
+            with self.assertRaises(IntegrityError):
+                serializer.create({
+                    "username": "new",
+                    "email": "new@example.com",
+                    "password": "a long enough passphrase"})
+
+
+class AuthCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("reader")
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        authentication.users.clear()
+        authentication.tokens.clear()
+
+    def authenticate(self):
+        return authentication.CachedTokenAuthentication(
+            ).authenticate_credentials(self.token.key)
+
+    def test_cached_token_is_the_saved_token(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+        self.assertEqual(user, self.user)
+        self.assertEqual(token.pk, self.token.key)
+        self.assertEqual(token.created, self.token.created)
+        self.assertFalse(token._state.adding)
+        self.assertIs(token.user, user)
+        self.assertIsNot(self.authenticate()[1], token)
+
+    def test_token_is_refused_once_its_user_changes(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_token_is_refused_once_deleted(self):
+        self.authenticate()
+        self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_token_is_refused_once_its_user_is_deleted(self):
+        self.authenticate()
+        self.user.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    async def test_async_views_use_the_cached_token(self):
+        headers = {"authorization": f"Token {self.token.key}"}
+        response = await self.async_client.get(
+            "/quickstart-api/async/users/", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(authentication.tokens.get(self.token.key))
+        # Served from the cache, without reading the token again.
+        with mock.patch.object(
+                authentication.authentication.TokenAuthentication,
+                "authenticate_credentials",
+                side_effect=AssertionError("token read")):
+            for path in ("users/", f"users/{self.user.pk}/", "groups/"):
+                with self.subTest(path):
+                    response = await self.async_client.get(
+                        f"/quickstart-api/async/{path}", headers=headers)
+                    self.assertEqual(response.status_code, 200)
+
+    def test_session_ends_with_password_change(self):
+        self.client.force_login(self.user)
+        self.client.get("/quickstart-api/users/")
+        self.assertIsNotNone(authentication.users.get(self.user.pk))
+        self.user.set_password("a new passphrase")
+        self.user.save()
+        response = self.client.get("/quickstart-api/users/")
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    def test_logout_drops_the_user(self):
+        self.client.force_login(self.user)
+        self.client.get("/quickstart-api/users/")
+        self.client.logout()
+        self.assertIsNone(authentication.users.get(self.user.pk))
+
+
+class TokenAuthThrottleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user("reader", password="correct horse")
+
+    def setUp(self):
+        caches["throttle"].clear()
+
+    def obtain(self, username, address):
+        return self.client.post(
+            "/api-token-auth/",
+            {"username": username, "password": "guess"},
+            REMOTE_ADDR=address)
+
+    def test_guesses_from_many_addresses_are_throttled(self):
+        rate = settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"][
+            "token-auth-username"]
+        attempts = int(rate.split("/")[0])
+        for i in range(attempts):
+            response = self.obtain("reader", f"10.0.0.{i}")
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.obtain("reader", "10.0.1.1").status_code, 429)
+        # Other accounts are unaffected.
+        self.assertEqual(self.obtain("other", "10.0.1.1").status_code, 400)
@@ -13,4 +13,16 @@ router.register("groups", views.GroupViewSet)
 app_name = "quickstart"
 urlpatterns = [
     path("", include(router.urls)),
+    path(
+        "async/users/",
+        views.user_list_async,
+        name="user-list-async"),
+    path(
+        "async/users/<int:pk>/",
+        views.user_detail_async,
+        name="user-detail-async"),
+    path(
+        "async/groups/",
+        views.group_list_async,
+        name="group-list-async"),
 ]
@@ -1,14 +1,18 @@
 from django.contrib.auth.models import Group, User
 from rest_framework import permissions, viewsets
 
+from tutorial import async_views, mixins
+
 from . import serializers
 
 
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
+class UserViewSet(
+        mixins.BatchRetrieveMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint that allows users to be viewed or edited.
     """
-    queryset = User.objects.all().order_by("-date_joined")
+    queryset = User.objects.order_by("-date_joined").prefetch_related(
+        "groups")
     serializer_class = serializers.UserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -20,3 +24,45 @@ class GroupViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Group.objects.all()
     serializer_class = serializers.GroupSerializer
     permission_classes = [permissions.IsAuthenticated]
+
+
+# Async-native read paths: under ASGI they run on the event loop, and
+# only their queries (and the viewsets' authentication and throttle
+# checks) go through a worker thread.
+
+
+@async_views.api_view(
+    permission_classes=UserViewSet.permission_classes,
+    throttle_classes=UserViewSet.throttle_classes)
+async def user_list_async(request, format=None):
+    queryset = User.objects.order_by("-date_joined").prefetch_related(
+        "groups")
+    data = await async_views.paginate(
+        request, queryset, serializers.UserSerializer)
+    if data is None:
+        return async_views.not_found("Invalid page.")
+    return async_views.json_response(data)
+
+
+@async_views.api_view(
+    permission_classes=UserViewSet.permission_classes,
+    throttle_classes=UserViewSet.throttle_classes)
+async def user_detail_async(request, pk, format=None):
+    try:
+        user = await User.objects.prefetch_related("groups").aget(pk=pk)
+    except User.DoesNotExist:
+        return async_views.not_found()
+    serializer = serializers.UserSerializer(
+        user, context={"request": request})
+    return async_views.json_response(serializer.data)
+
+
+@async_views.api_view(
+    permission_classes=GroupViewSet.permission_classes,
+    throttle_classes=GroupViewSet.throttle_classes)
+async def group_list_async(request, format=None):
+    data = await async_views.paginate(
+        request, Group.objects.order_by("pk"), serializers.GroupSerializer)
+    if data is None:
+        return async_views.not_found("Invalid page.")
+    return async_views.json_response(data)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SnippetsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "tutorial.apps.snippets"
+
+    def ready(self):
+        from . import signals  # noqa: F401
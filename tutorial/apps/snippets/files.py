@@ -0,0 +1,113 @@
+"""
+File storage for large highlights.
+
+Highlights of at least `HIGHLIGHT_FILES["MIN_SIZE"]` characters are kept
+out of the database, in files under `HIGHLIGHT_FILES["ROOT"]` named after
+the SHA-256 of their content and sharded into two levels of directories
+(`ab/cd/abcd...`). Two kinds are stored: the untitled rendering of each
+large `HighlightBlob`, and the titled document of each snippet using one,
+which the highlight views hand to the server as is (`sendfile`, or
+`X-Accel-Redirect` with `HIGHLIGHT_FILES["ACCEL_REDIRECT"]`).
+
+Files are written to a temporary file in their directory, then renamed, so
+readers never see a partial file. They are never modified, and they are
+not reference counted: `manage.py highlight_files gc` deletes the files no
+row refers to, once they are older than a grace period covering writes
+whose transaction has not committed yet. Reusing an existing file
+refreshes its modification time for the same reason.
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+
+TEMP_PREFIX = ".tmp-"
+
+
+def root():
+    return Path(settings.HIGHLIGHT_FILES["ROOT"])
+
+
+def is_large(html):
+    return len(html) >= settings.HIGHLIGHT_FILES["MIN_SIZE"]
+
+
+def relative_path(digest):
+    return Path(digest[:2], digest[2:4], digest)
+
+
+def path(digest):
+    return root() / relative_path(digest)
+
+
+def save(html):
+    """
+    Store `html`, returning its digest.
+    """
+    content = html.encode()
+    digest = hashlib.sha256(content).hexdigest()
+    target = path(digest)
+    try:
+        os.utime(target)
+        return digest
+    except FileNotFoundError:
+        pass
+    target.parent.mkdir(parents=True, exist_ok=True)
+    handle, temp = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=target.parent)
+    try:
+        with os.fdopen(handle, "wb") as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        os.chmod(temp, 0o644)
+        os.replace(temp, target)
+    except BaseException:
+        Path(temp).unlink(missing_ok=True)
+        raise
+    return digest
+
+
+def open_file(digest):
+    return open(path(digest), "rb")
+
+
+def read(digest):
+    with open_file(digest) as file:
+        return file.read().decode()
+
+
+def verify(digest):
+    """
+    Whether the file for `digest` exists and has the expected content.
+    """
+    sha256 = hashlib.sha256()
+    try:
+        with open_file(digest) as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                sha256.update(chunk)
+    except FileNotFoundError:
+        return False
+    return sha256.hexdigest() == digest
+
+
+def walk():
+    """
+    Yield `(digest, path)` for each stored file, with digest None for
+    leftover temporary files.
+    """
+    if not root().is_dir():
+        return
+    for first in sorted(root().iterdir()):
+        if not first.is_dir():
+            continue
+        for second in sorted(first.iterdir()):
+            if not second.is_dir():
+                continue
+            for file in sorted(second.iterdir()):
+                if file.name.startswith(TEMP_PREFIX):
+                    yield None, file
+                elif file.parent.relative_to(root()) == Path(
+                        file.name[:2], file.name[2:4]):
+                    yield file.name, file
@@ -0,0 +1,123 @@
+"""
+Pools of ready-to-use Pygments lexers and HTML formatters.
+
+Looking a lexer up by name walks the lexer registry, and building an
+`HtmlFormatter` recomputes the style's whole CSS table, which for small
+snippets costs more than the highlighting itself. Instead, idle instances
+are kept per language and per (style, linenos), and checked out for the
+exclusive use of one highlight at a time, so per-snippet options (the
+title) can be set on them safely from several threads.
+
+Each pool keeps at most `HIGHLIGHT_POOL["MAX_KEYS"]` keys, evicting the
+least recently used, and `["MAX_IDLE"]` idle instances per key (about the
+number of threads highlighting concurrently).
+"""
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from pygments import highlight
+from pygments.formatters.html import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+
+
+class ObjectPool:
+    """
+    Thread-safe LRU of idle objects per key, built by `factory(*key)` on a
+    miss. Objects are only returned to the pool when the block using them
+    exits without an exception.
+    """
+
+    def __init__(self, factory, max_keys, max_idle):
+        self.factory = factory
+        self.max_keys = max_keys
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    @contextmanager
+    def checkout(self, *key):
+        instance = None
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                instance = idle.pop()
+                self.hits += 1
+            else:
+                self.misses += 1
+        if instance is None:
+            instance = self.factory(*key)
+        yield instance
+        self.checkin(key, instance)
+
+    def checkin(self, key, instance):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle is None:
+                idle = self._idle[key] = []
+            else:
+                self._idle.move_to_end(key)
+            if len(idle) < self.max_idle:
+                idle.append(instance)
+            while len(self._idle) > self.max_keys:
+                self._idle.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._idle.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "keys": len(self._idle),
+                "idle": sum(len(idle) for idle in self._idle.values()),
+            }
+
+
+def _make_formatter(style, linenos):
+    return HtmlFormatter(
+        style=style, linenos="table" if linenos else False, full=True)
+
+
+lexers = ObjectPool(
+    get_lexer_by_name,
+    max_keys=settings.HIGHLIGHT_POOL["MAX_KEYS"],
+    max_idle=settings.HIGHLIGHT_POOL["MAX_IDLE"])
+formatters = ObjectPool(
+    _make_formatter,
+    max_keys=settings.HIGHLIGHT_POOL["MAX_KEYS"],
+    max_idle=settings.HIGHLIGHT_POOL["MAX_IDLE"])
+
+POOLS = {"lexer": lexers, "formatter": formatters}
+
+
+def render(code, language, style, linenos=False, title=""):
+    """
+    Highlight `code` as a full HTML document, like
+    `highlight(code, get_lexer_by_name(language), HtmlFormatter(...))`.
+    """
+    with lexers.checkout(language) as lexer:
+        with formatters.checkout(style, bool(linenos)) as formatter:
+            formatter.title = title
+            return highlight(code, lexer, formatter)
+
+
+def with_title(html, title):
+    """
+    The output of `render()` with `title`, given its output without one.
+    """
+    if not title:
+        return html
+    # The title is inserted as is, in the document header only.
+    head, heading, rest = html.partition("<h2></h2>")
+    head = head.replace("<title></title>", f"<title>{title}</title>", 1)
+    if heading:
+        heading = f"<h2>{title}</h2>"
+    return head + heading + rest
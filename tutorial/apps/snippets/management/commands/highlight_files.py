@@ -0,0 +1,174 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Length
+
+from tutorial.apps.snippets import files, highlighting
+from tutorial.apps.snippets.models import HighlightBlob, Snippet
+
+BATCH_SIZE = 100
+
+
+def batches(queryset):
+    last = None
+    while True:
+        page = queryset.order_by("pk")
+        if last is not None:
+            page = page.filter(pk__gt=last)
+        batch = list(page[:BATCH_SIZE])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1].pk
+
+
+class Command(BaseCommand):
+    help = (
+        "Maintain the files large highlights are stored in: check them "
+        "against the database, delete the ones nothing refers to, or move "
+        "large highlights still stored in the database to files.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["check", "gc", "offload"])
+        parser.add_argument(
+            "--verify", action="store_true",
+            help="check: also compare each file's content with its digest.")
+        parser.add_argument(
+            "--repair", action="store_true",
+            help="check: re-render missing or corrupt files.")
+        parser.add_argument(
+            "--grace-minutes", type=int, default=60,
+            help="gc: keep files modified more recently than this, which "
+                 "a transaction still in progress may refer to.")
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="gc: report what would be deleted without deleting it.")
+
+    def handle(self, *args, **options):
+        results = getattr(self, options["action"])(options)
+        self.stdout.write(json.dumps(results, indent=2))
+        if results.get("problems") and not options["repair"]:
+            raise CommandError(
+                f"{results['problems']} problems found; run with --repair "
+                f"to fix them.")
+
+    def check(self, options):
+        exists = files.verify if options["verify"] else (
+            lambda digest: files.path(digest).is_file())
+        blobs = HighlightBlob.objects.exclude(file_digest="")
+        broken_blobs = {
+            pk: digest
+            for pk, digest in blobs.values_list("pk", "file_digest")
+            if not exists(digest)}
+        snippets = Snippet.objects.exclude(highlight_file="")
+        broken_snippets = {
+            pk: digest
+            for pk, digest in snippets.values_list("pk", "highlight_file")
+            if not exists(digest)}
+        # Snippets whose highlight is stored in a file, without a titled
+        # document of their own, or the other way around.
+        inline = Q(highlight_blob=None) | Q(highlight_blob__file_digest="")
+        unlinked = list(Snippet.objects.filter(
+            (Q(highlight_file="") & ~inline)
+            | (~Q(highlight_file="") & inline)).values_list("pk", flat=True))
+        referenced = self.referenced()
+        orphans = temporary = 0
+        for digest, path in files.walk():
+            if digest is None:
+                temporary += 1
+            elif digest not in referenced:
+                orphans += 1
+
+        results = {
+            "blob_files": blobs.count(),
+            "snippet_files": snippets.count(),
+            "missing_blob_files": len(broken_blobs),
+            "missing_snippet_files": len(broken_snippets),
+            "unlinked_snippets": len(unlinked),
+            # Left to `gc`.
+            "orphans": orphans,
+            "temporary": temporary,
+            "problems": len(broken_blobs) + len(broken_snippets)
+            + len(unlinked),
+        }
+        if options["repair"]:
+            # Corrupt files would be reused as is.
+            for digest in {*broken_blobs.values(), *broken_snippets.values()}:
+                files.path(digest).unlink(missing_ok=True)
+            results["repaired_blob_files"] = self.repair_blobs(broken_blobs)
+            results["repaired_snippet_files"] = self.repair_snippets(
+                Snippet.objects.filter(
+                    pk__in=[*broken_snippets, *unlinked])
+                | Snippet.objects.filter(highlight_blob__in=broken_blobs))
+        return results
+
+    def referenced(self):
+        return {
+            *HighlightBlob.objects.exclude(file_digest="").values_list(
+                "file_digest", flat=True),
+            *Snippet.objects.exclude(highlight_file="").values_list(
+                "highlight_file", flat=True),
+        }
+
+    def repair_blobs(self, pks):
+        count = 0
+        queryset = HighlightBlob.objects.filter(
+            pk__in=pks).select_related("code")
+        for batch in batches(queryset):
+            for blob in batch:
+                html = highlighting.render(
+                    blob.code.code, blob.language, blob.style, blob.linenos)
+                for field, value in HighlightBlob.stored_html(html).items():
+                    setattr(blob, field, value)
+            HighlightBlob.objects.bulk_update(
+                batch, ["html", "file_digest"])
+            count += len(batch)
+        return count
+
+    def repair_snippets(self, queryset):
+        count = 0
+        for batch in batches(queryset.select_related("highlight_blob")):
+            for snippet in batch:
+                snippet.highlight_file = snippet.save_highlight_file()
+            Snippet.objects.bulk_update(batch, ["highlight_file"])
+            count += len(batch)
+        return count
+
+    def gc(self, options):
+        # Read the references before listing the files: files written
+        # since are recent enough to be kept.
+        referenced = self.referenced()
+        cutoff = time.time() - options["grace_minutes"] * 60
+        results = {"kept": 0, "deleted": 0, "deleted_bytes": 0}
+        for digest, path in files.walk():
+            stat = path.stat()
+            if digest in referenced or stat.st_mtime > cutoff:
+                results["kept"] += 1
+                continue
+            if not options["dry_run"]:
+                path.unlink(missing_ok=True)
+            results["deleted"] += 1
+            results["deleted_bytes"] += stat.st_size
+        return results
+
+    def offload(self, options):
+        queryset = HighlightBlob.objects.filter(file_digest="").alias(
+            size=Length("html")).filter(
+                size__gte=settings.HIGHLIGHT_FILES["MIN_SIZE"])
+        results = {"blobs": 0, "snippets": 0}
+        for batch in batches(queryset):
+            for blob in batch:
+                stored = HighlightBlob.stored_html(blob.html)
+                blob.html, blob.file_digest = (
+                    stored["html"], stored["file_digest"])
+            with transaction.atomic():
+                HighlightBlob.objects.bulk_update(
+                    batch, ["html", "file_digest"])
+                results["snippets"] += self.repair_snippets(
+                    Snippet.objects.filter(highlight_blob__in=batch))
+            results["blobs"] += len(batch)
+        return results
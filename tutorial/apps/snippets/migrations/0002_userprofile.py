@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+import django.db.models.deletion
+
+
+def backfill_profiles(apps, schema_editor):
+    Snippet = apps.get_model("snippets", "Snippet")
+    UserProfile = apps.get_model("snippets", "UserProfile")
+    summary = Snippet.objects.values("owner").annotate(
+        count=Count("id"), latest=Max("created")
+    )
+    UserProfile.objects.bulk_create(
+        UserProfile(
+            user_id=row["owner"],
+            snippet_count=row["count"],
+            last_snippet_at=row["latest"],
+        )
+        for row in summary
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("snippets", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserProfile",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="profile",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("snippet_count", models.PositiveIntegerField(default=0)),
+                ("last_snippet_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="snippet",
+            index=models.Index(
+                fields=["owner", "created"], name="snippets_sn_owner_i_f2bd25_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_profiles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("snippets", "0002_userprofile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="snippet",
+            name="highlight_checkpoints",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
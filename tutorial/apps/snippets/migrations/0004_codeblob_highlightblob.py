@@ -0,0 +1,257 @@
+import hashlib
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def content_digest(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def add_title(html, title):
+    # Same as tutorial.apps.snippets.highlighting.with_title().
+    if not title:
+        return html
+    head, heading, rest = html.partition("<h2></h2>")
+    head = head.replace("<title></title>", f"<title>{title}</title>", 1)
+    if heading:
+        heading = f"<h2>{title}</h2>"
+    return head + heading + rest
+
+
+def remove_title(html, title):
+    """
+    `html` as rendered without a title, or None if it cannot be undone.
+    """
+    stripped = html
+    if title:
+        head, heading, rest = html.partition(f"<h2>{title}</h2>")
+        head = head.replace(f"<title>{title}</title>", "<title></title>", 1)
+        stripped = head + ("<h2></h2>" if heading else "") + rest
+    if add_title(stripped, title) != html:
+        return None
+    return stripped
+
+
+def batches(queryset):
+    last = None
+    while True:
+        page = queryset.order_by("pk")
+        if last is not None:
+            page = page.filter(pk__gt=last)
+        batch = list(page[:BATCH_SIZE])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1].pk
+
+
+def move_to_blobs(apps, schema_editor):
+    Snippet = apps.get_model("snippets", "Snippet")
+    CodeBlob = apps.get_model("snippets", "CodeBlob")
+    HighlightBlob = apps.get_model("snippets", "HighlightBlob")
+    for batch in batches(Snippet.objects.all()):
+        codes = {content_digest(snippet.code): snippet.code for snippet in batch}
+        existing = CodeBlob.objects.in_bulk(list(codes), field_name="digest")
+        CodeBlob.objects.bulk_create(
+            CodeBlob(digest=digest, code=code)
+            for digest, code in codes.items()
+            if digest not in existing
+        )
+        code_blobs = CodeBlob.objects.in_bulk(list(codes), field_name="digest")
+
+        # The first highlight of each source in the batch, without its title.
+        # Rows without one, or with one that was edited, get theirs rendered
+        # when it is first requested.
+        highlights = {}
+        for snippet in batch:
+            snippet.code_blob = code_blobs[content_digest(snippet.code)]
+            snippet.key = (
+                snippet.code_blob.pk,
+                snippet.language,
+                snippet.style,
+                snippet.linenos,
+            )
+            html = remove_title(snippet.highlighted, snippet.title)
+            if not html:
+                snippet.key = None
+            elif snippet.key not in highlights:
+                highlights[snippet.key] = (html, snippet.highlight_checkpoints)
+
+        def stored_highlights():
+            return {
+                (blob.code_id, blob.language, blob.style, blob.linenos): blob
+                for blob in HighlightBlob.objects.filter(
+                    code__in=[key[0] for key in highlights]
+                )
+            }
+
+        existing = stored_highlights()
+        HighlightBlob.objects.bulk_create(
+            HighlightBlob(
+                code_id=key[0],
+                language=key[1],
+                style=key[2],
+                linenos=key[3],
+                html=html,
+                checkpoints=checkpoints,
+            )
+            for key, (html, checkpoints) in highlights.items()
+            if key not in existing
+        )
+        highlight_blobs = stored_highlights()
+        for snippet in batch:
+            if snippet.key is not None:
+                snippet.highlight_blob = highlight_blobs[snippet.key]
+        Snippet.objects.bulk_update(batch, ["code_blob", "highlight_blob"])
+
+    for model, field in (
+        (CodeBlob, "code_blob"),
+        (HighlightBlob, "highlight_blob"),
+    ):
+        references = (
+            Snippet.objects.filter(**{field: OuterRef("pk")})
+            .values(field)
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        model.objects.update(refcount=Coalesce(Subquery(references), 0))
+
+
+def restore_columns(apps, schema_editor):
+    Snippet = apps.get_model("snippets", "Snippet")
+    snippets = Snippet.objects.select_related("code_blob", "highlight_blob")
+    for batch in batches(snippets):
+        for snippet in batch:
+            snippet.code = snippet.code_blob.code
+            blob = snippet.highlight_blob
+            snippet.highlighted = (
+                add_title(blob.html, snippet.title) if blob else ""
+            )
+            snippet.highlight_checkpoints = blob.checkpoints if blob else {}
+        Snippet.objects.bulk_update(
+            batch, ["code", "highlighted", "highlight_checkpoints"]
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("snippets", "0003_snippet_highlight_checkpoints"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CodeBlob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("refcount", models.PositiveIntegerField(default=0)),
+                ("digest", models.CharField(max_length=64, unique=True)),
+                ("code", models.TextField()),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="HighlightBlob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("refcount", models.PositiveIntegerField(default=0)),
+                ("language", models.CharField(max_length=100)),
+                ("style", models.CharField(max_length=100)),
+                ("linenos", models.BooleanField()),
+                ("html", models.TextField()),
+                ("checkpoints", models.JSONField(blank=True, default=dict)),
+                (
+                    "code",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="highlights",
+                        to="snippets.codeblob",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="highlightblob",
+            constraint=models.UniqueConstraint(
+                fields=("code", "language", "style", "linenos"),
+                name="unique_highlight_source",
+            ),
+        ),
+        migrations.AddField(
+            model_name="snippet",
+            name="code_blob",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="snippets.codeblob",
+            ),
+        ),
+        migrations.AddField(
+            model_name="snippet",
+            name="highlight_blob",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="snippets.highlightblob",
+            ),
+        ),
+        # Nullable, so that unapplying the migration can add them back
+        # before `restore_columns` fills them in.
+        migrations.AlterField(
+            model_name="snippet",
+            name="code",
+            field=models.TextField(null=True),
+        ),
+        migrations.AlterField(
+            model_name="snippet",
+            name="highlighted",
+            field=models.TextField(null=True),
+        ),
+        migrations.RunPython(move_to_blobs, restore_columns),
+        migrations.AlterField(
+            model_name="snippet",
+            name="code_blob",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="snippets.codeblob",
+            ),
+        ),
+        migrations.RemoveField(
+            model_name="snippet",
+            name="code",
+        ),
+        migrations.RemoveField(
+            model_name="snippet",
+            name="highlighted",
+        ),
+        migrations.RemoveField(
+            model_name="snippet",
+            name="highlight_checkpoints",
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("snippets", "0004_codeblob_highlightblob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="highlightblob",
+            name="file_digest",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AlterField(
+            model_name="highlightblob",
+            name="html",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name="snippet",
+            name="highlight_file",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=64
+            ),
+        ),
+    ]
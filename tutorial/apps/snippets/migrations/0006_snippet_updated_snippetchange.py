@@ -0,0 +1,58 @@
+from django.db import migrations, models
+from django.db.models import F
+
+BATCH_SIZE = 1000
+
+
+def log_existing_snippets(apps, schema_editor):
+    """
+    Record every existing snippet as created, so clients can start syncing
+    from cursor 0.
+    """
+    Snippet = apps.get_model("snippets", "Snippet")
+    SnippetChange = apps.get_model("snippets", "SnippetChange")
+    Snippet.objects.update(updated=F("created"))
+    pks = Snippet.objects.order_by("created", "pk").values_list(
+        "pk", flat=True
+    )
+    batch = []
+    for pk in pks.iterator(chunk_size=BATCH_SIZE):
+        batch.append(SnippetChange(snippet_id=pk, kind="created"))
+        if len(batch) == BATCH_SIZE:
+            SnippetChange.objects.bulk_create(batch)
+            batch = []
+    SnippetChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("snippets", "0005_highlight_files"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="snippet",
+            name="updated",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name="SnippetChange",
+            fields=[
+                ("seq", models.BigAutoField(primary_key=True, serialize=False)),
+                ("snippet_id", models.BigIntegerField()),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("created", "Created"),
+                            ("updated", "Updated"),
+                            ("deleted", "Deleted"),
+                        ],
+                        max_length=7,
+                    ),
+                ),
+                ("at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(log_existing_snippets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,14 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("snippets", "0007_snippetchangelock"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="highlightblob",
+            name="checkpoints",
+        ),
+    ]
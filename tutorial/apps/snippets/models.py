@@ -1,9 +1,18 @@
-from django.db import models
-from pygments import highlight
-from pygments.formatters.html import HtmlFormatter
-from pygments.lexers import get_all_lexers, get_lexer_by_name
+import hashlib
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, Max, Value, When
+from pygments.lexers import get_all_lexers
 from pygments.styles import get_all_styles
 
+from tutorial import timing
+
+from . import files, highlighting
+
 # Create your models here.
 
 LEXERS = [item for item in get_all_lexers() if item[1]]
@@ -11,10 +20,215 @@ LANGUAGE_CHOICES = sorted([(item[1][0], item[0]) for item in LEXERS])
 STYLE_CHOICES = sorted([(item, item) for item in get_all_styles()])
 
 
+def content_digest(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _per_blob(counts):
+    """
+    An expression for `counts[pk]` in queries filtered on `pk__in=counts`.
+    """
+    groups = defaultdict(list)
+    for pk, count in counts.items():
+        groups[count].append(pk)
+    if len(groups) == 1:
+        return Value(next(iter(groups)))
+    return Case(
+        *[When(pk__in=pks, then=Value(count))
+          for count, pks in groups.items()],
+        output_field=models.PositiveIntegerField())
+
+
+class BlobManager(models.Manager):
+    def retain(self, counts):
+        """
+        Add `counts[pk]` references to each blob.
+        """
+        self.filter(pk__in=list(counts)).update(
+            refcount=F("refcount") + _per_blob(counts))
+
+    def release(self, counts):
+        """
+        Drop `counts[pk]` references from each blob, deleting the blobs
+        nothing refers to anymore.
+
+        The blobs are deleted without going through Django's collector, so
+        the rows referring to them must be gone already: snippets (which
+        hold a reference) and the highlights of a code blob (which are
+        released first, see `Snippet.save()`).
+        """
+        # Delete before decrementing the others: a concurrent `retain()`
+        # then either finds the row gone, or has kept it from being
+        # deleted and the update below still counts the release.
+        deleted = self.filter(
+            pk__in=list(counts), refcount__lte=_per_blob(counts)
+        )._raw_delete(self.db)
+        if deleted < len(counts):
+            self.filter(pk__in=list(counts)).update(
+                refcount=F("refcount") - _per_blob(counts))
+
+
+class CodeBlobManager(BlobManager):
+    def acquire(self, texts):
+        """
+        The blobs holding `texts`, by digest, with one more reference for
+        each text. Must run in a transaction.
+        """
+        counts = Counter()
+        by_digest = {}
+        for text in texts:
+            digest = content_digest(text)
+            counts[digest] += 1
+            by_digest[digest] = text
+        while True:
+            # Locked, so a concurrent `release()` cannot delete them before
+            # the new references are counted.
+            blobs = self.select_for_update().in_bulk(
+                list(counts), field_name="digest")
+            new = [
+                CodeBlob(
+                    digest=digest, code=by_digest[digest], refcount=count)
+                for digest, count in counts.items() if digest not in blobs]
+            if not new:
+                break
+            try:
+                with transaction.atomic():
+                    self.bulk_create(new)
+            except IntegrityError:
+                # Some were created concurrently; count them in as well.
+                continue
+            break
+        self.retain(
+            {blob.pk: counts[digest] for digest, blob in blobs.items()})
+        blobs.update((blob.digest, blob) for blob in new)
+        return blobs
+
+
+class HighlightBlobManager(BlobManager):
+    def acquire(self, render, prepared=None, **key):
+        """
+        The highlight blob for `key`, with one more reference. `prepared`
+        is what `Snippet.prepare_highlight()` returned before the
+        transaction: the blob, used unless it was deleted since, or the
+        HTML to create it with. Otherwise the blob is looked up, and
+        created from the HTML `render()` returns if there is none yet. Must
+        run in a transaction.
+        """
+        if isinstance(prepared, HighlightBlob):
+            # The update locks the row, so a concurrent `release()` cannot
+            # delete it before the new reference is counted.
+            if self.filter(pk=prepared.pk).update(
+                    refcount=F("refcount") + 1):
+                return prepared
+            prepared = None
+        while True:
+            if prepared is None:
+                blob = self.select_for_update().filter(**key).first()
+                if blob is not None:
+                    self.retain({blob.pk: 1})
+                    return blob
+                prepared = render()
+            html, prepared = prepared, None
+            try:
+                with transaction.atomic():
+                    return self.create(
+                        refcount=1,
+                        **HighlightBlob.stored_html(html),
+                        **key)
+            except IntegrityError:
+                continue
+
+
+class Blob(models.Model):
+    refcount = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class CodeBlob(Blob):
+    """
+    Snippet code, stored once per distinct text.
+    """
+    digest = models.CharField(max_length=64, unique=True)
+    code = models.TextField()
+
+    objects = CodeBlobManager()
+
+
+class HighlightBlob(Blob):
+    """
+    Highlighted HTML, stored once per distinct (code, language, style,
+    linenos). It is rendered without a title; `Snippet.highlighted` adds
+    the snippet's own. Large ones are stored in a file instead of `html`
+    (see `files`).
+    """
+    code = models.ForeignKey(
+        CodeBlob, related_name="highlights", on_delete=models.CASCADE)
+    language = models.CharField(max_length=100)
+    style = models.CharField(max_length=100)
+    linenos = models.BooleanField()
+    html = models.TextField(blank=True)
+    file_digest = models.CharField(max_length=64, blank=True, default="")
+
+    objects = HighlightBlobManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["code", "language", "style", "linenos"],
+                name="unique_highlight_source"),
+        ]
+
+    @staticmethod
+    def stored_html(html):
+        """
+        Field values storing `html`, in a file if it is large.
+        """
+        if files.is_large(html):
+            return {"html": "", "file_digest": files.save(html)}
+        return {"html": html, "file_digest": ""}
+
+    def get_html(self):
+        if self.file_digest:
+            return files.read(self.file_digest)
+        return self.html
+
+
+class SnippetQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Store the code of the new rows as blobs in one batch. Highlights
+        are left for `Snippet.store_highlight()`.
+        """
+        objs = list(objs)
+        pending = [obj for obj in objs if obj._new_code is not None]
+        with transaction.atomic(using=self.db, savepoint=False):
+            blobs = CodeBlob.objects.acquire(obj.code for obj in pending)
+            for obj in pending:
+                obj.code_blob = blobs[content_digest(obj._new_code)]
+                obj._new_code = None
+            objs = super().bulk_create(objs, *args, **kwargs)
+            # Rows without a primary key (skipped by `ignore_conflicts`,
+            # or on databases not returning it) are not logged.
+            SnippetChange.objects.log(
+                (obj.pk, SnippetChange.CREATED)
+                for obj in objs if obj.pk is not None)
+            return objs
+
+    def delete(self):
+        with transaction.atomic(using=self.db, savepoint=False):
+            with SnippetChange.objects.batch():
+                return super().delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class Snippet(models.Model):
     created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True, db_index=True)
     title = models.CharField(max_length=100, blank=True, default="")
-    code = models.TextField()
     linenos = models.BooleanField(default=False)
     language = models.CharField(
         choices=LANGUAGE_CHOICES, default="python", max_length=100)
@@ -22,20 +236,366 @@ class Snippet(models.Model):
         choices=STYLE_CHOICES, default="friendly", max_length=100)
     owner = models.ForeignKey(
         "auth.User", related_name="snippets", on_delete=models.CASCADE)
-    highlighted = models.TextField()
+    code_blob = models.ForeignKey(
+        CodeBlob, related_name="+", on_delete=models.PROTECT)
+    highlight_blob = models.ForeignKey(
+        HighlightBlob,
+        related_name="+",
+        null=True,
+        blank=True,
+        on_delete=models.PROTECT)
+    # Digest of the titled document, when the highlight is stored in a file.
+    highlight_file = models.CharField(
+        max_length=64, blank=True, default="", editable=False)
+
+    objects = SnippetQuerySet.as_manager()
+
+    # Fields `highlight_blob` is rendered from.
+    HIGHLIGHT_SOURCE_FIELDS = ("code_blob_id", "language", "style", "linenos")
+
+    # Code assigned since the snippet was loaded or saved.
+    _new_code = None
 
     class Meta:
         ordering = ["created"]
+        indexes = [models.Index(fields=["owner", "created"])]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if not instance.get_deferred_fields().intersection(
+                cls.HIGHLIGHT_SOURCE_FIELDS):
+            instance._highlighted_source = instance.highlight_source()
+        if "title" not in instance.get_deferred_fields():
+            instance._highlighted_title = instance.title
+        if "owner_id" not in instance.get_deferred_fields():
+            instance._saved_owner_id = instance.owner_id
+        return instance
+
+    @property
+    def code(self):
+        if self._new_code is not None:
+            return self._new_code
+        if self.code_blob_id is None:
+            return ""
+        return self.code_blob.code
+
+    @code.setter
+    def code(self, value):
+        self._new_code = value
+
+    @property
+    def highlighted(self):
+        if self.highlight_file:
+            return files.read(self.highlight_file)
+        if self.highlight_blob_id is None:
+            return ""
+        return highlighting.with_title(
+            self.highlight_blob.get_html(), self.title)
+
+    def highlight_source(self):
+        return tuple(
+            getattr(self, field) for field in self.HIGHLIGHT_SOURCE_FIELDS)
+
+    def highlight_key(self):
+        return {
+            "code_id": self.code_blob_id,
+            "language": self.language,
+            "style": self.style,
+            "linenos": self.linenos,
+        }
 
     def save(self, *args, **kwargs):
         """
-        Use the `pygments` library to create a highlighted HTML
-        representation of the code snippet.
+        Store the code as a shared blob, and point the snippet at the
+        highlight of its code and display options, using the `pygments`
+        library to render it unless another snippet already did.
+
+        The row, the blobs' reference counts and its owner's
+        `UserProfile` counters (updated from the `post_save` signal) are
+        written in one transaction.
+        """
+        code = self._new_code
+        if code is None and self.code_blob_id is None:
+            code = ""
+        elif (code is not None and self.code_blob_id is not None
+                and content_digest(code) == self.code_blob.digest):
+            code = None
+        stale = (
+            code is not None
+            or self.highlight_blob_id is None
+            or getattr(self, "_highlighted_source", None)
+            != self.highlight_source())
+        prepared = None
+        if stale:
+            with timing.span("highlight"):
+                prepared = self.prepare_highlight(code)
+
+        # Previous blob of each replaced field, released once the row no
+        # longer refers to it. Highlights first: deleting a code blob
+        # deletes them too.
+        released = {}
+        with transaction.atomic(), SnippetChange.objects.batch():
+            if stale:
+                released["highlight_blob"] = (
+                    HighlightBlob, self.highlight_blob_id)
+            if code is not None:
+                released["code_blob"] = (CodeBlob, self.code_blob_id)
+                self.code_blob = CodeBlob.objects.acquire(
+                    [code])[content_digest(code)]
+            if stale:
+                self.highlight_blob = HighlightBlob.objects.acquire(
+                    self.render_highlight, prepared, **self.highlight_key())
+            changed = [*released]
+            if stale or getattr(
+                    self, "_highlighted_title", None) != self.title:
+                self.highlight_file = self.save_highlight_file()
+                changed.append("highlight_file")
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {
+                    *kwargs["update_fields"], *changed}
+            super().save(*args, **kwargs)
+            for model, pk in released.values():
+                if pk is not None:
+                    model.objects.release({pk: 1})
+        self._new_code = None
+        self._highlighted_source = self.highlight_source()
+        self._highlighted_title = self.title
+        self._saved_owner_id = self.owner_id
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(), SnippetChange.objects.batch():
+            return super().delete(*args, **kwargs)
+
+    def prepare_highlight(self, code=None):
+        """
+        The highlight blob of `code` (or the stored code) with the current
+        display options if there already is one, otherwise the HTML to
+        create it with.
+        """
+        if code is None:
+            code = self.code
+        blob = HighlightBlob.objects.filter(
+            code__digest=content_digest(code),
+            language=self.language,
+            style=self.style,
+            linenos=self.linenos).first()
+        if blob is not None:
+            return blob
+        return highlighting.render(
+            code, self.language, self.style, self.linenos)
+
+    def render_highlight(self):
+        """
+        Return the HTML for the highlight blob.
+        """
+        return highlighting.render(
+            self.code, self.language, self.style, self.linenos)
+
+    def save_highlight_file(self):
+        """
+        Store the titled document of a highlight kept in a file, so it can
+        be served as is, and return its digest ("" for other highlights).
+        """
+        blob = self.highlight_blob
+        if blob is None or not blob.file_digest:
+            return ""
+        return files.save(
+            highlighting.with_title(blob.get_html(), self.title))
+
+    def store_highlight(self):
+        """
+        Highlight a row inserted without `save()` (e.g. with
+        `bulk_create`), and keep the result.
+        """
+        prepared = self.prepare_highlight()
+        with transaction.atomic():
+            blob = HighlightBlob.objects.acquire(
+                self.render_highlight, prepared, **self.highlight_key())
+            self.highlight_blob = blob
+            highlight_file = self.save_highlight_file()
+            stored = Snippet.objects.filter(
+                pk=self.pk, highlight_blob=None).update(
+                    highlight_blob=blob, highlight_file=highlight_file)
+            if not stored:
+                # Highlighted concurrently.
+                HighlightBlob.objects.release({blob.pk: 1})
+                current = Snippet.objects.select_related(
+                    "highlight_blob").get(pk=self.pk)
+                self.highlight_blob = current.highlight_blob
+                highlight_file = current.highlight_file
+        self.highlight_file = highlight_file
+        self._highlighted_source = self.highlight_source()
+
+    async def astore_highlight(self):
+        """
+        Same as `store_highlight`, but runs `pygments` in a worker thread
+        so the event loop is never blocked by the lexer.
+        """
+        await sync_to_async(self.store_highlight)()
+
+
+# Entries `SnippetChangeManager.batch()` defers, in the current thread.
+_batched = threading.local()
+
+
+class SnippetChangeManager(models.Manager):
+    def log(self, entries):
+        """
+        Log `(snippet_id, kind)` entries, in the transaction of the writes
+        they record and after them (see `SnippetChange`). Inside `batch()`,
+        they are logged when the block ends.
+        """
+        pending = getattr(_batched, "entries", None)
+        if pending is not None:
+            pending.extend(entries)
+            return
+        entries = list(entries)
+        if not entries:
+            return
+        # Waits for the other transactions logging changes to commit.
+        SnippetChangeLock.objects.select_for_update().get_or_create(pk=1)
+        self.bulk_create(
+            SnippetChange(snippet_id=snippet_id, kind=kind)
+            for snippet_id, kind in entries)
+
+    @contextmanager
+    def batch(self):
+        """
+        Log the entries of the writes in the block once it ends, so a
+        transaction logging several changes still takes the lock after its
+        other writes. Nested blocks join the outer one.
         """
-        lexer = get_lexer_by_name(self.language)
-        linenos = "table" if self.linenos else False
-        options = {"title": self.title} if self.title else {}
-        formatter = HtmlFormatter(
-            style=self.style, linenos=linenos, full=True, **options)
-        self.highlighted = highlight(self.code, lexer, formatter)
-        super().save(*args, **kwargs)
+        if getattr(_batched, "entries", None) is not None:
+            yield
+            return
+        _batched.entries = []
+        try:
+            yield
+            entries = _batched.entries
+        finally:
+            _batched.entries = None
+        self.log(entries)
+
+    def since(self, cursor, limit):
+        """
+        The net changes in the first `limit` entries after `cursor`: ids
+        of the snippets created, updated and deleted, the cursor to pass
+        next time, and whether more entries follow.
+
+        A snippet both created and deleted in that span is left out, and
+        one created then updated is only listed as created.
+        """
+        entries = list(
+            self.filter(seq__gt=cursor).order_by("seq").values_list(
+                "seq", "snippet_id", "kind")[:limit + 1])
+        more = len(entries) > limit
+        entries = entries[:limit]
+        first, last = {}, {}
+        for seq, snippet_id, kind in entries:
+            first.setdefault(snippet_id, kind)
+            last[snippet_id] = kind
+        changes = {
+            SnippetChange.CREATED: [],
+            SnippetChange.UPDATED: [],
+            SnippetChange.DELETED: [],
+        }
+        for snippet_id, kind in last.items():
+            created = first[snippet_id] == SnippetChange.CREATED
+            if kind == SnippetChange.DELETED:
+                if not created:
+                    changes[kind].append(snippet_id)
+            elif created:
+                changes[SnippetChange.CREATED].append(snippet_id)
+            else:
+                changes[SnippetChange.UPDATED].append(snippet_id)
+        return {
+            "cursor": entries[-1][0] if entries else cursor,
+            "more": more,
+            **changes,
+        }
+
+
+class SnippetChange(models.Model):
+    """
+    Append-only log of snippet writes, kept by the signal handlers and
+    `SnippetQuerySet.bulk_create`, and read by the `changes` action.
+
+    `seq` is the cursor, so entries must become visible in `seq` order: a
+    client that read past an entry committed later would never see it.
+    Each entry is written in the transaction of the write it records, as
+    its last statement, after locking `SnippetChangeLock` until the
+    transaction commits. Transactions writing snippets therefore take their
+    `seq` values and commit one at a time, but the rest of their work
+    (blobs, the snippet row, profiles) runs concurrently: only the insert
+    and the commit are serialized. Taking the lock last also means no
+    transaction waits for other locks while holding it, except when
+    deleting a user deletes their snippets, which logs each one as it goes.
+    (SQLite ignores the lock, but only ever runs one write transaction.)
+    Writes bypassing the model (e.g. `QuerySet.update()`) and fixtures are
+    not logged.
+    """
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+    KIND_CHOICES = [
+        (CREATED, "Created"), (UPDATED, "Updated"), (DELETED, "Deleted")]
+
+    seq = models.BigAutoField(primary_key=True)
+    # Not a foreign key: deletions outlive their snippet.
+    snippet_id = models.BigIntegerField()
+    kind = models.CharField(max_length=7, choices=KIND_CHOICES)
+    at = models.DateTimeField(auto_now_add=True)
+
+    objects = SnippetChangeManager()
+
+
+class SnippetChangeLock(models.Model):
+    """
+    Single row serializing the transactions that log snippet changes (see
+    `SnippetChange`).
+    """
+
+
+class UserProfileManager(models.Manager):
+    def rebuild(self, users=None):
+        """
+        Recompute the counters from the snippets table, e.g. after rows
+        were written with `bulk_create` or `QuerySet.update`, which skip
+        the signals keeping them up to date.
+        """
+        snippets = Snippet.objects.all()
+        stale = self.all()
+        if users is not None:
+            snippets = snippets.filter(owner__in=users)
+            stale = stale.filter(user__in=users)
+        summary = snippets.values("owner").annotate(
+            count=Count("id"), latest=Max("created"))
+        with transaction.atomic():
+            stale.update(snippet_count=0, last_snippet_at=None)
+            self.bulk_create(
+                [
+                    UserProfile(
+                        user_id=row["owner"],
+                        snippet_count=row["count"],
+                        last_snippet_at=row["latest"])
+                    for row in summary],
+                update_conflicts=True,
+                unique_fields=["user"],
+                update_fields=["snippet_count", "last_snippet_at"])
+
+
+class UserProfile(models.Model):
+    """
+    Per-user snippet summary, denormalized so listing users does not have
+    to touch every one of their snippets.
+    """
+    user = models.OneToOneField(
+        "auth.User",
+        primary_key=True,
+        related_name="profile",
+        on_delete=models.CASCADE)
+    snippet_count = models.PositiveIntegerField(default=0)
+    last_snippet_at = models.DateTimeField(null=True, blank=True)
+
+    objects = UserProfileManager()
@@ -1,12 +1,21 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
 
+from tutorial import relations
+from tutorial.timing import TimedRepresentationMixin
+
 from . import models
 
 
-class SnippetSerializer(serializers.HyperlinkedModelSerializer):
+class SnippetSerializer(
+        TimedRepresentationMixin,
+        relations.URLTemplateSerializerMixin,
+        serializers.HyperlinkedModelSerializer):
     owner = serializers.ReadOnlyField(source="owner.username")
-    highlight = serializers.HyperlinkedIdentityField(
+    # Stored in a shared `CodeBlob`, read and written through the `code`
+    # property.
+    code = serializers.CharField(style={"base_template": "textarea.html"})
+    highlight = relations.HyperlinkedIdentityField(
         view_name="snippet-highlight", format="html")
 
     class Meta:
@@ -23,10 +32,60 @@ class SnippetSerializer(serializers.HyperlinkedModelSerializer):
             "owner"]
 
 
-class UserSerializer(serializers.HyperlinkedModelSerializer):
-    snippets = serializers.HyperlinkedRelatedField(
-        many=True, view_name="snippet-detail", read_only=True)
+class ChangesQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of the snippet `changes` action.
+    """
+    cursor = serializers.IntegerField(min_value=0, default=0)
+    limit = serializers.IntegerField(
+        min_value=1, max_value=10000, default=1000)
+
+
+def expands_snippets(request):
+    """
+    Whether the client asked for the full list of snippet links with
+    `?expand=snippets`, instead of the summary.
+    """
+    if request is None:
+        return False
+    return "snippets" in request.GET.get("expand", "").split(",")
+
+
+class UserSerializer(
+        TimedRepresentationMixin,
+        relations.URLTemplateSerializerMixin,
+        serializers.HyperlinkedModelSerializer):
+    # A user without snippets may have no profile row yet; DRF reports a
+    # missing related object as None rather than using the field default.
+    snippet_count = serializers.SerializerMethodField()
+    last_snippet_at = serializers.SerializerMethodField()
+    snippets_url = relations.HyperlinkedIdentityField(
+        view_name="user-snippets")
 
     class Meta:
         model = User
-        fields = ["url", "id", "username", "snippets"]
+        fields = [
+            "url",
+            "id",
+            "username",
+            "snippet_count",
+            "last_snippet_at",
+            "snippets_url"]
+
+    def get_snippet_count(self, user):
+        profile = getattr(user, "profile", None)
+        return profile.snippet_count if profile else 0
+
+    def get_last_snippet_at(self, user):
+        profile = getattr(user, "profile", None)
+        if profile is None or profile.last_snippet_at is None:
+            return None
+        return serializers.DateTimeField().to_representation(
+            profile.last_snippet_at)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if expands_snippets(self.context.get("request")):
+            fields["snippets"] = relations.HyperlinkedRelatedField(
+                many=True, view_name="snippet-detail", read_only=True)
+        return fields
@@ -0,0 +1,80 @@
+"""
+Keep `UserProfile` counters and blob reference counts in step with the
+snippets table, and log its changes.
+
+The handlers run inside the transaction writing the snippet: `Snippet.save`
+opens one, and deletions always run in one.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import (
+    CodeBlob, HighlightBlob, Snippet, SnippetChange, UserProfile)
+
+
+@receiver(post_save, sender=Snippet)
+def count_created_snippet(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    profiles = UserProfile.objects.filter(user_id=instance.owner_id)
+    changes = {
+        "snippet_count": F("snippet_count") + 1,
+        "last_snippet_at": Greatest(
+            Coalesce("last_snippet_at", instance.created), instance.created),
+    }
+    if profiles.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            UserProfile.objects.create(
+                user_id=instance.owner_id,
+                snippet_count=1,
+                last_snippet_at=instance.created)
+    except IntegrityError:
+        # Created concurrently by the owner's other first snippet.
+        profiles.update(**changes)
+
+
+@receiver(post_save, sender=Snippet)
+def count_moved_snippet(sender, instance, created, raw=False, **kwargs):
+    # Set by `Snippet.from_db` and `Snippet.save`, unless the owner was
+    # deferred.
+    previous = getattr(instance, "_saved_owner_id", instance.owner_id)
+    if created or raw or previous == instance.owner_id:
+        return
+    UserProfile.objects.rebuild(users=[previous, instance.owner_id])
+
+
+@receiver(post_delete, sender=Snippet)
+def count_deleted_snippet(sender, instance, **kwargs):
+    # Runs after the row is gone, so the subquery finds the next latest.
+    latest = Snippet.objects.filter(
+        owner_id=OuterRef("user_id")).order_by("-created").values("created")
+    UserProfile.objects.filter(user_id=instance.owner_id).update(
+        snippet_count=Greatest(F("snippet_count") - 1, 0),
+        last_snippet_at=Subquery(latest[:1]))
+
+
+@receiver(post_delete, sender=Snippet)
+def release_snippet_blobs(sender, instance, **kwargs):
+    # Highlights first: deleting a code blob deletes them too.
+    if instance.highlight_blob_id is not None:
+        HighlightBlob.objects.release({instance.highlight_blob_id: 1})
+    CodeBlob.objects.release({instance.code_blob_id: 1})
+
+
+@receiver(post_save, sender=Snippet)
+def log_saved_snippet(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    SnippetChange.objects.log([(
+        instance.pk,
+        SnippetChange.CREATED if created else SnippetChange.UPDATED)])
+
+
+@receiver(post_delete, sender=Snippet)
+def log_deleted_snippet(sender, instance, **kwargs):
+    SnippetChange.objects.log([(instance.pk, SnippetChange.DELETED)])
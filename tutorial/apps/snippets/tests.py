@@ -1,3 +1,1042 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import ParseError
+from rest_framework import metadata, permissions
+from rest_framework import renderers as drf_renderers
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework.versioning import NamespaceVersioning
+
+from tutorial import browsable, mixins, relations, renderers, throttling
+
+from . import files, highlighting, serializers, views
+from .models import (
+    CodeBlob, HighlightBlob, Snippet, SnippetChange, UserProfile,
+    content_digest)
+
+
+def create_snippet(owner, code="print(1)\n", **kwargs):
+    snippet = Snippet(owner=owner, code=code, **kwargs)
+    snippet.save()
+    return snippet
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner")
+        for i in range(3):
+            create_snippet(cls.owner, code=f"x = {i}\n", title=f"S{i}")
+
+    def setUp(self):
+        caches["throttle"].clear()
+
+    def test_middleware_is_async_capable(self):
+        # A sync-only middleware would put the async views on a thread.
+        for path in settings.MIDDLEWARE:
+            with self.subTest(path):
+                self.assertTrue(
+                    getattr(import_string(path), "async_capable", False))
+
+    async def test_list_matches_sync_view(self):
+        sync = await self.async_client.get("/snippets-api/snippets/")
+        response = await self.async_client.get(
+            "/snippets-api/async/snippets/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), sync.json())
+
+    async def test_detail_matches_sync_view(self):
+        snippet = await Snippet.objects.afirst()
+        sync = await self.async_client.get(
+            f"/snippets-api/snippets/{snippet.pk}/")
+        response = await self.async_client.get(
+            f"/snippets-api/async/snippets/{snippet.pk}/")
+        self.assertEqual(response.json(), sync.json())
+
+    async def test_content_negotiation_matches_sync_view(self):
+        for query, accept, status in (
+                ("", "text/csv", 406),
+                ("?format=json", "text/html", 406),
+                ("?format=json", "*/*", 200)):
+            with self.subTest(query=query, accept=accept):
+                headers = {"accept": accept}
+                sync = await self.async_client.get(
+                    f"/snippets-api/snippets/{query}", headers=headers)
+                response = await self.async_client.get(
+                    f"/snippets-api/async/snippets/{query}",
+                    headers=headers)
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(response.json(), sync.json())
+
+    async def test_anonymous_requests_are_throttled(self):
+        with mock.patch.dict(
+                throttling.TokenBucketThrottle.THROTTLE_RATES,
+                {"anon": "2/min"}):
+            statuses = [
+                (await self.async_client.get(
+                    "/snippets-api/async/snippets/")).status_code
+                for _ in range(3)]
+            response = await self.async_client.get(
+                "/snippets-api/async/users/")
+        self.assertEqual(statuses, [200, 200, 429])
+        # The buckets are shared with the synchronous views.
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(int(response["Retry-After"]), 30)
+
+    async def test_deep_pages_are_throttled(self):
+        # 30 tokens: the whole bucket.
+        response = await self.async_client.get(
+            "/snippets-api/async/snippets/?page=300")
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get(
+            "/snippets-api/async/snippets/?page=300")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(
+            (await self.async_client.get(
+                "/snippets-api/async/snippets/")).status_code, 200)
+
+    async def test_detail_not_found(self):
+        response = await self.async_client.get(
+            "/snippets-api/async/snippets/0/")
+        self.assertEqual(response.status_code, 404)
+
+
+class UserProfileTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner")
+        cls.other = User.objects.create_user("other")
+
+    def profile(self, user):
+        profile = UserProfile.objects.filter(user=user).first()
+        if profile is None:
+            return 0, None
+        return profile.snippet_count, profile.last_snippet_at
+
+    def test_create_and_delete(self):
+        first = create_snippet(self.owner)
+        second = create_snippet(self.owner)
+        self.assertEqual(self.profile(self.owner), (2, second.created))
+        second.delete()
+        self.assertEqual(self.profile(self.owner), (1, first.created))
+        first.delete()
+        self.assertEqual(self.profile(self.owner), (0, None))
+
+    def test_owner_change(self):
+        first = create_snippet(self.owner)
+        moved = create_snippet(self.owner)
+        moved = Snippet.objects.get(pk=moved.pk)
+        moved.owner = self.other
+        moved.save()
+        self.assertEqual(self.profile(self.owner), (1, first.created))
+        self.assertEqual(self.profile(self.other), (1, moved.created))
+        moved.title = "Renamed"
+        moved.save()
+        self.assertEqual(self.profile(self.other), (1, moved.created))
+
+    def test_rebuild(self):
+        # bulk_create skips the signals.
+        snippets = Snippet.objects.bulk_create(
+            Snippet(owner=self.owner, code=f"x = {i}\n") for i in range(3))
+        UserProfile.objects.create(user=self.other, snippet_count=5)
+        UserProfile.objects.rebuild()
+        latest = max(snippet.created for snippet in snippets)
+        self.assertEqual(self.profile(self.owner), (3, latest))
+        self.assertEqual(self.profile(self.other), (0, None))
+
+    def test_snippets_action(self):
+        for i in range(12):
+            create_snippet(self.owner, code=f"x = {i}\n")
+        create_snippet(self.other)
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                f"/snippets-api/users/{self.owner.pk}/snippets/")
+        data = response.json()
+        self.assertEqual(data["count"], 12)
+        self.assertEqual(len(data["results"]), 10)
+        self.assertEqual(
+            {item["owner"] for item in data["results"]}, {"owner"})
+
+    def test_expand_snippets(self):
+        snippets = [create_snippet(self.owner) for _ in range(2)]
+        response = self.client.get("/snippets-api/users/")
+        summary = {user["username"]: user for user in response.json()[
+            "results"]}
+        self.assertEqual(summary["owner"]["snippet_count"], 2)
+        self.assertEqual(summary["other"]["snippet_count"], 0)
+        self.assertNotIn("snippets", summary["owner"])
+
+        for i in range(3):
+            create_snippet(User.objects.create_user(f"more{i}"))
+        # The same number of queries whatever the number of users.
+        with self.assertNumQueries(3):
+            response = self.client.get("/snippets-api/users/?expand=snippets")
+        expanded = {user["username"]: user for user in response.json()[
+            "results"]}
+        self.assertEqual(
+            expanded["owner"]["snippets"],
+            [f"http://testserver/snippets-api/snippets/{snippet.pk}/"
+             for snippet in snippets])
+        self.assertEqual(expanded["other"]["snippets"], [])
+
+
+class BlobRefcountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner")
+
+    def refcounts(self, model):
+        return dict(model.objects.values_list("pk", "refcount"))
+
+    def test_shared_on_create(self):
+        first = create_snippet(self.owner, code="x = 1\n")
+        second = create_snippet(self.owner, code="x = 1\n", title="Other")
+        self.assertEqual(first.code_blob_id, second.code_blob_id)
+        self.assertEqual(first.highlight_blob_id, second.highlight_blob_id)
+        self.assertEqual(self.refcounts(CodeBlob), {first.code_blob_id: 2})
+        self.assertEqual(
+            self.refcounts(HighlightBlob), {first.highlight_blob_id: 2})
+
+    def test_update(self):
+        first = create_snippet(self.owner, code="x = 1\n")
+        second = create_snippet(self.owner, code="x = 1\n")
+        shared_code = first.code_blob_id
+        shared_highlight = first.highlight_blob_id
+
+        second.title = "Renamed"
+        second.save()
+        self.assertEqual(self.refcounts(CodeBlob), {shared_code: 2})
+        self.assertEqual(
+            self.refcounts(HighlightBlob), {shared_highlight: 2})
+
+        second.style = "monokai"
+        second.save()
+        self.assertEqual(self.refcounts(CodeBlob), {shared_code: 2})
+        self.assertEqual(self.refcounts(HighlightBlob), {
+            shared_highlight: 1, second.highlight_blob_id: 1})
+
+        second.code = "x = 2\n"
+        second.save()
+        self.assertEqual(self.refcounts(CodeBlob), {
+            shared_code: 1, second.code_blob_id: 1})
+        # The monokai highlight of the old code is gone.
+        self.assertEqual(self.refcounts(HighlightBlob), {
+            shared_highlight: 1, second.highlight_blob_id: 1})
+
+        first.code = "x = 2\n"
+        first.save()
+        self.assertEqual(
+            self.refcounts(CodeBlob), {second.code_blob_id: 2})
+        self.assertNotIn(shared_highlight, self.refcounts(HighlightBlob))
+
+    def test_delete(self):
+        first = create_snippet(self.owner, code="x = 1\n")
+        second = create_snippet(self.owner, code="x = 1\n")
+        first.delete()
+        self.assertEqual(
+            self.refcounts(CodeBlob), {second.code_blob_id: 1})
+        self.assertEqual(
+            self.refcounts(HighlightBlob), {second.highlight_blob_id: 1})
+        second.delete()
+        self.assertFalse(CodeBlob.objects.exists())
+        self.assertFalse(HighlightBlob.objects.exists())
+
+    def test_queries(self):
+        caches["throttle"].clear()
+        self.client.force_login(self.owner)
+        # Creates the change log lock and the owner's profile.
+        shared = create_snippet(self.owner, code="x = 1")
+        # Caches the user (see `CachedModelBackend`).
+        self.client.get("/snippets-api/snippets/")
+
+        # Session, highlight lookup, then in a transaction: change log
+        # lock, code blob lookup and insert, highlight insert, snippet,
+        # profile and change log.
+        with self.assertNumQueries(15):
+            response = self.client.post(
+                "/snippets-api/snippets/", {"code": "x = 2"},
+                content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        pk = response.json()["id"]
+        # Both blobs exist: each is retained with a single update.
+        with self.assertNumQueries(11):
+            self.client.post(
+                "/snippets-api/snippets/", {"code": "x = 1"},
+                content_type="application/json")
+        self.assertEqual(self.refcounts(CodeBlob)[shared.code_blob_id], 2)
+
+        # The previous blobs are deleted with a statement each.
+        with self.assertNumQueries(17):
+            response = self.client.patch(
+                f"/snippets-api/snippets/{pk}/", {"code": "x = 3"},
+                content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            set(CodeBlob.objects.values_list("code", flat=True)),
+            {"x = 1", "x = 3"})
+        self.assertEqual(HighlightBlob.objects.count(), 2)
+        with self.assertNumQueries(8):
+            self.client.patch(
+                f"/snippets-api/snippets/{pk}/", {"title": "Renamed"},
+                content_type="application/json")
+
+    def test_release_many(self):
+        blobs = CodeBlob.objects.acquire(["a", "b", "b", "c", "c", "c"])
+        pks = {code: blobs[content_digest(code)].pk for code in "abc"}
+        # One statement deletes, one updates the rest.
+        with self.assertNumQueries(2):
+            CodeBlob.objects.release(
+                {pks["a"]: 1, pks["b"]: 1, pks["c"]: 3})
+        self.assertEqual(self.refcounts(CodeBlob), {pks["b"]: 1})
+
+    def test_bulk_create(self):
+        existing = create_snippet(self.owner, code="x = 1\n")
+        Snippet.objects.bulk_create(
+            Snippet(owner=self.owner, code=code)
+            for code in ("x = 1\n", "x = 2\n", "x = 2\n"))
+        codes = dict(CodeBlob.objects.values_list("code", "refcount"))
+        self.assertEqual(codes, {"x = 1\n": 2, "x = 2\n": 2})
+        # Highlights are left for later.
+        self.assertEqual(
+            self.refcounts(HighlightBlob), {existing.highlight_blob_id: 1})
+
+
+class HighlightFileTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner")
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        self.use_files(min_size=1)
+
+    def use_files(self, min_size=1, accel_redirect=""):
+        overridden = override_settings(HIGHLIGHT_FILES={
+            **settings.HIGHLIGHT_FILES,
+            "ROOT": self.root,
+            "MIN_SIZE": min_size,
+            "ACCEL_REDIRECT": accel_redirect})
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+
+    def stored(self):
+        return {
+            os.path.relpath(path, self.root): digest
+            for digest, path in files.walk()}
+
+    def command(self, *args):
+        stdout = io.StringIO()
+        call_command("highlight_files", *args, stdout=stdout)
+        return json.loads(stdout.getvalue())
+
+    def test_save(self):
+        digest = files.save("<p>é</p>")
+        self.assertEqual(files.read(digest), "<p>é</p>")
+        self.assertEqual(
+            self.stored(),
+            {f"{digest[:2]}/{digest[2:4]}/{digest}": digest})
+        # Saving the same content again refreshes the modification time.
+        os.utime(files.path(digest), (0, 0))
+        self.assertEqual(files.save("<p>é</p>"), digest)
+        self.assertGreater(files.path(digest).stat().st_mtime, 0)
+
+    def test_save_is_atomic(self):
+        with mock.patch.object(
+                files.os, "replace", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                files.save("<p>lost</p>")
+        # Neither the file nor the temporary file is left behind.
+        self.assertEqual(self.stored(), {})
+        self.assertEqual(
+            [name for _, _, names in os.walk(self.root) for name in names],
+            [])
+
+    def test_verify(self):
+        digest = files.save("<p>ok</p>")
+        self.assertTrue(files.verify(digest))
+        files.path(digest).write_bytes(b"<p>corrupt</p>")
+        self.assertFalse(files.verify(digest))
+        files.path(digest).unlink()
+        self.assertFalse(files.verify(digest))
+
+    def test_walk(self):
+        digest = files.save("<p>ok</p>")
+        shard = files.path(digest).parent
+        (shard / f"{files.TEMP_PREFIX}abc").write_bytes(b"")
+        # Neither sharded nor named after a digest.
+        (shard / "misplaced").write_bytes(b"")
+        open(os.path.join(self.root, "README"), "w").close()
+        self.assertEqual(self.stored(), {
+            os.path.relpath(files.path(digest), self.root): digest,
+            os.path.relpath(shard / f"{files.TEMP_PREFIX}abc", self.root):
+            None})
+
+    def test_highlight_file_response(self):
+        snippet = create_snippet(self.owner, title="Large")
+        self.assertTrue(snippet.highlight_file)
+        response = self.client.get(
+            f"/snippets-api/snippets/{snippet.pk}/highlight/")
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/html; charset=utf-8")
+        self.assertEqual(
+            b"".join(response.streaming_content).decode(),
+            snippet.highlighted)
+        self.assertIn("<title>Large</title>", snippet.highlighted)
+
+    def test_highlight_accel_redirect(self):
+        self.use_files(accel_redirect="/protected/highlights/")
+        snippet = create_snippet(self.owner)
+        digest = snippet.highlight_file
+        response = self.client.get(
+            f"/snippets-api/snippets/{snippet.pk}/highlight/")
+        self.assertEqual(
+            response["X-Accel-Redirect"],
+            f"/protected/highlights/{digest[:2]}/{digest[2:4]}/{digest}")
+        self.assertEqual(response.content, b"")
+
+    def test_highlight_in_database(self):
+        self.use_files(min_size=10 ** 9)
+        snippet = create_snippet(self.owner)
+        self.assertEqual(snippet.highlight_file, "")
+        response = self.client.get(
+            f"/snippets-api/snippets/{snippet.pk}/highlight/")
+        self.assertFalse(response.streaming)
+        self.assertNotIn("X-Accel-Redirect", response)
+        self.assertEqual(response.content.decode(), snippet.highlighted)
+        self.assertEqual(self.stored(), {})
+
+    def test_check(self):
+        snippet = create_snippet(self.owner, title="Large")
+        blob = snippet.highlight_blob
+        self.assertEqual(self.command("check")["problems"], 0)
+
+        files.path(blob.file_digest).unlink()
+        files.path(snippet.highlight_file).write_bytes(b"corrupt")
+        # Only `--verify` reads the files.
+        with self.assertRaisesMessage(CommandError, "1 problems"):
+            self.command("check")
+        with self.assertRaisesMessage(CommandError, "2 problems"):
+            self.command("check", "--verify")
+
+        results = self.command("check", "--verify", "--repair")
+        self.assertEqual(results["repaired_blob_files"], 1)
+        self.assertEqual(results["repaired_snippet_files"], 1)
+        self.assertTrue(files.verify(blob.file_digest))
+        self.assertTrue(files.verify(snippet.highlight_file))
+        self.assertEqual(self.command("check", "--verify")["problems"], 0)
+
+    def test_check_unlinked(self):
+        snippet = create_snippet(self.owner, title="Large")
+        Snippet.objects.filter(pk=snippet.pk).update(highlight_file="")
+        with self.assertRaisesMessage(CommandError, "1 problems"):
+            self.command("check")
+        self.command("check", "--repair")
+        snippet.refresh_from_db()
+        self.assertTrue(files.verify(snippet.highlight_file))
+
+    def test_gc(self):
+        snippet = create_snippet(self.owner, title="Large")
+        referenced = {
+            snippet.highlight_file, snippet.highlight_blob.file_digest}
+        old = files.save("<p>old orphan</p>")
+        recent = files.save("<p>recent orphan</p>")
+        temporary = files.path(old).parent / f"{files.TEMP_PREFIX}abc"
+        temporary.write_bytes(b"<p>abandoned")
+        an_hour_ago = time.time() - 3601
+        for path in [*map(files.path, [*referenced, old]), temporary]:
+            os.utime(path, (an_hour_ago, an_hour_ago))
+
+        results = self.command("gc", "--dry-run")
+        self.assertEqual(results["deleted"], 2)
+        self.assertEqual(len(self.stored()), 5)
+
+        results = self.command("gc")
+        self.assertEqual(results["kept"], 3)
+        self.assertEqual(results["deleted"], 2)
+        self.assertEqual(
+            set(self.stored().values()), {*referenced, recent})
+
+    def test_offload(self):
+        self.use_files(min_size=10 ** 9)
+        snippets = [
+            create_snippet(self.owner, code=f"x = {i}\n") for i in range(2)]
+        highlighted = [snippet.highlighted for snippet in snippets]
+        self.use_files(min_size=1)
+        self.assertEqual(
+            self.command("offload"), {"blobs": 2, "snippets": 2})
+        for snippet, html in zip(snippets, highlighted):
+            snippet = Snippet.objects.select_related(
+                "highlight_blob").get(pk=snippet.pk)
+            self.assertEqual(snippet.highlight_blob.html, "")
+            self.assertTrue(files.verify(snippet.highlight_blob.file_digest))
+            self.assertTrue(files.verify(snippet.highlight_file))
+            self.assertEqual(snippet.highlighted, html)
+        self.assertEqual(
+            self.command("offload"), {"blobs": 0, "snippets": 0})
+
+
+class OwnerOnly(permissions.BasePermission):
+    def has_object_permission(self, request, view, obj):
+        return obj.owner == request.user
+
+
+class BatchRetrieveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner")
+        cls.other = User.objects.create_user("other")
+        cls.snippets = [
+            create_snippet(owner, code=f"x = {i}\n")
+            for i, owner in enumerate((cls.owner, cls.other, cls.owner))]
+
+    def setUp(self):
+        caches["throttle"].clear()
+
+    def ids(self, *indexes):
+        return [self.snippets[i].pk for i in indexes]
+
+    def test_get_keeps_order_and_lists_missing(self):
+        unknown = 2**63 - 1
+        ids = [*self.ids(2, 0), unknown, *self.ids(1, 2)]
+        response = self.client.get(
+            "/snippets-api/snippets/batch/",
+            {"ids": ",".join(map(str, ids))})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            [item["id"] for item in data["results"]], self.ids(2, 0, 1))
+        self.assertEqual(data["missing"], [unknown])
+
+    def test_out_of_range_id_in_query(self):
+        response = self.client.get(
+            "/snippets-api/snippets/batch/",
+            {"ids": "99999999999999999999999"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("ids", response.json())
+
+    def test_anonymous_post_is_a_read(self):
+        response = self.client.post(
+            "/snippets-api/snippets/batch/", {"ids": self.ids(1, 0)},
+            content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item["id"] for item in response.json()["results"]],
+            self.ids(1, 0))
+
+    def test_hidden_objects_are_missing(self):
+        self.client.force_login(self.owner)
+        with mock.patch.object(
+                views.SnippetViewSet, "permission_classes", [OwnerOnly]):
+            response = self.client.post(
+                "/snippets-api/snippets/batch/", {"ids": self.ids(0, 1, 2)},
+                content_type="application/json")
+        data = response.json()
+        self.assertEqual(
+            [item["id"] for item in data["results"]], self.ids(0, 2))
+        self.assertEqual(data["missing"], self.ids(1))
+
+    def test_invalid_ids(self):
+        too_many = list(range(mixins.BatchRetrieveMixin.batch_max_ids + 1))
+        for name, data in (
+                ("missing", {}),
+                ("empty", {"ids": []}),
+                ("not numbers", {"ids": ["a"]}),
+                ("zero", {"ids": [0]}),
+                ("too large", {"ids": [99999999999999999999999]}),
+                ("too many", {"ids": too_many})):
+            with self.subTest(name):
+                response = self.client.post(
+                    "/snippets-api/snippets/batch/", data,
+                    content_type="application/json")
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("ids", response.json())
+
+
+class ChangeFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner")
+
+    def changes(self, cursor=0, limit=1000):
+        response = self.client.get(
+            "/snippets-api/snippets/changes/",
+            {"cursor": cursor, "limit": limit})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_changes_since_cursor(self):
+        kept = create_snippet(self.owner)
+        edited = create_snippet(self.owner)
+        deleted = create_snippet(self.owner)
+        first = self.changes()
+        self.assertEqual(
+            first["created"], [kept.pk, edited.pk, deleted.pk])
+        self.assertEqual(self.changes(first["cursor"])["created"], [])
+
+        edited.code = "print(2)\n"
+        edited.save()
+        deleted_pk = deleted.pk
+        deleted.delete()
+        added = create_snippet(self.owner)
+        added.save()
+        self.assertEqual(self.changes(first["cursor"]), {
+            "cursor": first["cursor"] + 4,
+            "more": False,
+            "created": [added.pk],
+            "updated": [edited.pk],
+            "deleted": [deleted_pk],
+        })
+
+    def test_created_then_deleted_is_left_out(self):
+        cursor = self.changes()["cursor"]
+        create_snippet(self.owner).delete()
+        changes = self.changes(cursor)
+        self.assertEqual(
+            (changes["created"], changes["updated"], changes["deleted"]),
+            ([], [], []))
+        self.assertGreater(changes["cursor"], cursor)
+
+    def test_more(self):
+        snippets = [create_snippet(self.owner) for _ in range(3)]
+        page = self.changes(limit=2)
+        self.assertTrue(page["more"])
+        self.assertEqual(page["created"], [s.pk for s in snippets[:2]])
+        page = self.changes(page["cursor"], limit=2)
+        self.assertFalse(page["more"])
+        self.assertEqual(page["created"], [snippets[2].pk])
+
+    def test_bulk_create_is_logged(self):
+        snippets = Snippet.objects.bulk_create(
+            Snippet(owner=self.owner, code=f"x = {i}\n") for i in range(2))
+        self.assertEqual(
+            self.changes()["created"], [s.pk for s in snippets])
+
+    def test_writes_lock_the_log_last(self):
+        snippet = create_snippet(self.owner)
+        others = [create_snippet(self.owner, code=f"x = {i}\n")
+                  for i in range(3)]
+        cursor = self.changes()["cursor"]
+        first_pk = snippet.pk
+        for name, write in [
+                ("save", snippet.save),
+                ("delete", snippet.delete),
+                ("queryset delete", Snippet.objects.filter(
+                    pk__in=[other.pk for other in others]).delete),
+                ("bulk_create", lambda: Snippet.objects.bulk_create(
+                    [Snippet(owner=self.owner, code="x = 4\n")]))]:
+            with self.subTest(name):
+                with CaptureQueriesContext(connection) as queries:
+                    write()
+                statements = [
+                    query["sql"] for query in queries
+                    if not query["sql"].startswith(
+                        ("SAVEPOINT", "RELEASE SAVEPOINT"))]
+                # Then only the entries are written.
+                self.assertIn("snippetchangelock", statements[-2])
+                self.assertTrue(statements[-1].startswith(
+                    'INSERT INTO "snippets_snippetchange"'))
+                self.assertEqual(
+                    sum("snippetchangelock" in sql for sql in statements),
+                    1)
+        self.assertCountEqual(
+            self.changes(cursor)["deleted"],
+            [first_pk, *[other.pk for other in others]])
+
+    def test_failed_batch_is_not_logged(self):
+        count = SnippetChange.objects.count()
+        with self.assertRaises(ValueError):
+            with transaction.atomic(), SnippetChange.objects.batch():
+                create_snippet(self.owner)
+                raise ValueError
+        self.assertEqual(SnippetChange.objects.count(), count)
+        create_snippet(self.owner)
+        self.assertEqual(SnippetChange.objects.count(), count + 1)
+
+    def test_fixtures_are_not_logged(self):
+        # The fixture's owners.
+        for pk in (1, 2):
+            User.objects.get_or_create(
+                pk=pk, defaults={"username": f"user{pk}"})
+        call_command("loaddata", "snippets", verbosity=0)
+        self.assertFalse(SnippetChange.objects.exists())
+
+
+class ThrottleTests(TestCase):
+    factory = APIRequestFactory()
+
+    def setUp(self):
+        caches["throttle"].clear()
+
+    def request(self, method, path="/snippets-api/snippets/", data=None):
+        request = getattr(self.factory, method)(path, data, format="json")
+        return Request(request, parsers=[JSONParser()])
+
+    def test_snippet_write_costs(self):
+        throttle = throttling.SnippetWriteThrottle()
+        view = SimpleNamespace(action="create")
+        for request, cost in (
+                (self.request("get"), 0),
+                (self.request("post", data={"code": "x"}), 1),
+                (self.request("post", data={"code": "x" * 4096}), 2),
+                (self.request("post", data={"code": "x" * 10000}), 3),
+                (self.request("put", data={}), 1)):
+            with self.subTest(method=request.method, cost=cost):
+                self.assertEqual(throttle.get_cost(request, view), cost)
+
+    def test_batch_post_is_free(self):
+        throttle = throttling.SnippetWriteThrottle()
+        request = self.request("post", data={"ids": [1, 2]})
+        view = SimpleNamespace(action="batch")
+        self.assertEqual(throttle.get_cost(request, view), 0)
+
+    def test_deep_page_costs(self):
+        throttle = throttling.DeepPaginationThrottle()
+        view = SimpleNamespace()
+        for page, cost in (("", 0), ("last", 0), ("9", 0), ("25", 2)):
+            with self.subTest(page=page):
+                request = self.request(
+                    "get", f"/snippets-api/snippets/?page={page}")
+                self.assertEqual(throttle.get_cost(request, view), cost)
+
+    def test_bucket_charges_cost_and_refills(self):
+        # 60/min: one token per second.
+        now = 1000.0
+        throttle = throttling.SnippetWriteThrottle()
+        throttle.timer = lambda: now
+        view = SimpleNamespace(action="create")
+        big = self.request("post", data={"code": "x" * 4096 * 29})
+        self.assertEqual(throttle.get_cost(big, view), 30)
+        self.assertTrue(throttle.allow_request(big, view))
+        self.assertTrue(throttle.allow_request(big, view))
+        self.assertFalse(throttle.allow_request(big, view))
+        self.assertEqual(throttle.wait(), 30)
+        now += 10
+        small = self.request("post", data={"code": "x"})
+        self.assertTrue(throttle.allow_request(small, view))
+        self.assertFalse(throttle.allow_request(big, view))
+        self.assertEqual(throttle.wait(), 21)
+
+    def test_cost_is_capped_at_bucket_size(self):
+        throttle = throttling.SnippetWriteThrottle()
+        view = SimpleNamespace(action="create")
+        huge = self.request("post", data={"code": "x" * 4096 * 100})
+        self.assertTrue(throttle.allow_request(huge, view))
+        self.assertFalse(throttle.allow_request(huge, view))
+
+
+@override_settings(ALLOWED_HOSTS=["*"])
+class URLTemplateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner")
+        for i in range(11):
+            create_snippet(cls.owner, code=f"x = {i}\n")
+        # Its id contains the sentinel's digits.
+        cls.snippet = create_snippet(
+            cls.owner, pk=int(f"1{relations.SENTINEL}0"))
+
+    def get(self, url, host):
+        response = self.client.get(
+            url, HTTP_HOST=host, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def assertMatchesReverse(self, url, host="testserver"):
+        templated = self.get(url, host)
+        with mock.patch.object(
+                relations, "get_url_template", return_value=None):
+            self.assertEqual(templated, self.get(url, host))
+        return templated
+
+    def test_matches_reverse(self):
+        for url in (
+                "/snippets-api/snippets/",
+                "/snippets-api/snippets/?page=2",
+                "/snippets-api/snippets/?format=json",
+                "/snippets-api/snippets.json",
+                f"/snippets-api/snippets/{self.snippet.pk}/",
+                f"/snippets-api/snippets/{self.snippet.pk}.json",
+                "/snippets-api/users/?expand=snippets"):
+            for host in ("testserver", "example.com:8080"):
+                with self.subTest(url=url, host=host):
+                    self.assertMatchesReverse(url, host)
+
+    def test_links(self):
+        data = self.assertMatchesReverse(
+            "/snippets-api/snippets/?format=json", "example.com")
+        self.assertEqual(
+            data["next"],
+            "http://example.com/snippets-api/snippets/?format=json&page=2")
+        first = data["results"][0]
+        self.assertEqual(
+            first["url"],
+            f"http://example.com/snippets-api/snippets/{first['id']}/"
+            "?format=json")
+        data = self.assertMatchesReverse(
+            f"/snippets-api/snippets/{self.snippet.pk}.json")
+        self.assertEqual(
+            data["highlight"],
+            f"http://testserver/snippets-api/snippets/{self.snippet.pk}"
+            "/highlight.html")
+
+    def test_sentinel_in_host_falls_back(self):
+        host = f"{relations.SENTINEL}.example.com"
+        data = self.assertMatchesReverse(
+            f"/snippets-api/snippets/{self.snippet.pk}/", host)
+        self.assertEqual(
+            data["url"],
+            f"http://{host}/snippets-api/snippets/{self.snippet.pk}/")
+
+
+class BrowsableCacheTests(TestCase):
+    factory = APIRequestFactory()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("owner")
+        cls.other = User.objects.create_user("other")
+        cls.snippets = [
+            create_snippet(cls.owner, language=language)
+            for language in ("python", "rust")]
+
+    def setUp(self):
+        for cache in browsable.CACHES.values():
+            cache.clear()
+
+    def form(self, renderer_class, snippet):
+        request = Request(self.factory.get("/"))
+        request.version = "snippets"
+        request.versioning_scheme = NamespaceVersioning()
+        serializer = serializers.SnippetSerializer(
+            snippet, context={"request": request})
+        return renderer_class().render(serializer.data, None, {
+            "style": {"template_pack": "rest_framework/horizontal"}})
+
+    def test_form_matches_uncached(self):
+        for snippet in (*self.snippets, self.snippets[0]):
+            with self.subTest(language=snippet.language):
+                self.assertEqual(
+                    self.form(browsable.HTMLFormRenderer, snippet),
+                    self.form(drf_renderers.HTMLFormRenderer, snippet))
+        stats = browsable.form_fields.stats()
+        self.assertGreater(stats["hits"], 0)
+        # One entry per selected value of each select field.
+        self.assertEqual(stats["entries"], 2 + 1)
+
+    def test_lite_form_only_sends_selected_option(self):
+        html = self.form(browsable.LiteHTMLFormRenderer, self.snippets[1])
+        self.assertEqual(
+            html,
+            self.form(browsable.LiteHTMLFormRenderer, self.snippets[1]))
+        # Hundreds of languages, only the selected one is sent.
+        self.assertIn('value="rust"', html)
+        self.assertNotIn('value="python"', html)
+
+    def options(self, user):
+        self.client.logout()
+        if user is not None:
+            self.client.force_login(user)
+        return self.client.options(
+            f"/snippets-api/snippets/{self.snippets[0].pk}/",
+            HTTP_ACCEPT="application/json").json()
+
+    def test_options_match_uncached_for_each_user(self):
+        users = (self.owner, self.other, None, self.owner)
+        cached = [self.options(user) for user in users]
+        self.assertGreater(browsable.serializer_info.stats()["hits"], 0)
+        with mock.patch.object(
+                views.SnippetViewSet, "metadata_class",
+                metadata.SimpleMetadata):
+            plain = [self.options(user) for user in users]
+        self.assertEqual(cached, plain)
+        # Only the owner may update it.
+        self.assertIn("actions", cached[0])
+        self.assertNotIn("actions", cached[1])
+
+    def test_forms_follow_permissions(self):
+        url = f"/snippets-api/snippets/{self.snippets[0].pk}/"
+        self.client.force_login(self.owner)
+        page = self.client.get(url, HTTP_ACCEPT="text/html")
+        self.assertIn(b'name="style"', page.content)
+        self.client.force_login(self.other)
+        page = self.client.get(url, HTTP_ACCEPT="text/html")
+        self.assertNotIn(b'name="style"', page.content)
+
+    def test_lru_cache_evicts_least_recently_used(self):
+        cache = browsable.LRUCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), (1, 3))
+        self.assertEqual(
+            cache.stats(), {"hits": 3, "misses": 1, "entries": 2})
+
+
+class ObjectPoolTests(TestCase):
+    def pool(self, **kwargs):
+        options = {"max_keys": 2, "max_idle": 2, **kwargs}
+        return highlighting.ObjectPool(
+            lambda *key: SimpleNamespace(key=key), **options)
+
+    def test_reuses_idle_objects(self):
+        pool = self.pool()
+        with pool.checkout("python") as first:
+            pass
+        with pool.checkout("python") as second:
+            self.assertIs(second, first)
+        with pool.checkout("python") as third:
+            # The idle one is taken, so another is built.
+            with pool.checkout("python") as fourth:
+                self.assertIsNot(fourth, third)
+        self.assertEqual(pool.stats(), {
+            "hits": 2, "misses": 2, "evictions": 0, "keys": 1, "idle": 2})
+
+    def test_keeps_at_most_max_idle(self):
+        pool = self.pool(max_idle=1)
+        with pool.checkout("python"), pool.checkout("python"):
+            pass
+        self.assertEqual(pool.stats()["idle"], 1)
+
+    def test_evicts_least_recently_used_key(self):
+        pool = self.pool()
+        for key in ("python", "c", "python", "rust"):
+            with pool.checkout(key):
+                pass
+        self.assertEqual(list(pool._idle), [("python",), ("rust",)])
+        self.assertEqual(pool.stats()["evictions"], 1)
+        with pool.checkout("c"):
+            pass
+        self.assertEqual(pool.stats()["misses"], 4)
+
+    def test_not_checked_in_when_rendering_raises(self):
+        lexers, formatters = self.pool(), self.pool()
+        lexers.factory = highlighting.get_lexer_by_name
+        formatters.factory = highlighting._make_formatter
+        with mock.patch.multiple(
+                highlighting, lexers=lexers, formatters=formatters), \
+                mock.patch.object(
+                    highlighting, "highlight", side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                highlighting.render("x = 1\n", "python", "friendly")
+        self.assertEqual(lexers.stats()["idle"], 0)
+        self.assertEqual(formatters.stats()["idle"], 0)
+        with mock.patch.multiple(
+                highlighting, lexers=lexers, formatters=formatters):
+            highlighting.render("x = 1\n", "python", "friendly")
+        self.assertEqual(lexers.stats()["idle"], 1)
+        self.assertEqual(formatters.stats()["idle"], 1)
+
+
+class FastJSONTests(TestCase):
+    def test_bases_are_abstract(self):
+        with self.assertRaises(TypeError):
+            renderers.BaseFastJSONRenderer()
+        with self.assertRaises(TypeError):
+            renderers.BaseFastJSONParser()
+
+    def test_output_matches_drf(self):
+        owner = User.objects.create_user("owner")
+        create_snippet(owner, code="s = 'caf\u00e9 \u2028'\n", title="\u2603")
+        response = self.client.get("/snippets-api/snippets/")
+        data = response.data
+        self.assertEqual(
+            renderers.ORJSONRenderer().render(data),
+            JSONRenderer().render(data))
+
+    def test_integers_beyond_64_bits_fall_back_to_json(self):
+        data = {"big": 2**70, "small": -(2**64), "text": "\u2028"}
+        self.assertEqual(
+            renderers.ORJSONRenderer().render(data),
+            JSONRenderer().render(data))
+
+
+@skipUnless(renderers.msgpack, "msgpack is not installed")
+class MessagePackTests(TestCase):
+    def setUp(self):
+        caches["throttle"].clear()
+        self.owner = User.objects.create_user("owner")
+        self.client.force_login(self.owner)
+
+    def post(self, content):
+        return self.client.post(
+            "/snippets-api/snippets/", content,
+            content_type="application/msgpack")
+
+    def test_round_trip(self):
+        response = self.post(renderers.msgpack.packb({"code": "x = 1"}))
+        self.assertEqual(response.status_code, 201)
+        response = self.client.get(
+            f"/snippets-api/snippets/{response.data['id']}/",
+            HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        data = renderers.msgpack.unpackb(response.content)
+        self.assertEqual(data["code"], "x = 1")
+
+    def test_invalid_input_is_a_parse_error(self):
+        packed = renderers.msgpack.packb({"code": "x"})
+        for name, content in (
+                ("array key", b"\x81\x91\x01\x01"),
+                ("extra data", packed + b"\x01"),
+                ("truncated", packed[:-1]),
+                ("reserved byte", b"\xc1")):
+            with self.subTest(name):
+                self.assertEqual(self.post(content).status_code, 400)
+
+    def test_unhashable_key_without_strict_keys(self):
+        parser = renderers.MessagePackParser()
+        with mock.patch.object(
+                renderers.msgpack, "unpackb",
+                side_effect=TypeError("unhashable type: 'list'")):
+            with self.assertRaises(ParseError):
+                parser.parse(io.BytesIO(b""))
+
+
+@skipUnless(renderers.cbor2, "cbor2 is not installed")
+class CBORTests(TestCase):
+    def setUp(self):
+        caches["throttle"].clear()
+        self.owner = User.objects.create_user("owner")
+        self.client.force_login(self.owner)
+
+    def post(self, content):
+        return self.client.post(
+            "/snippets-api/snippets/", content,
+            content_type="application/cbor")
+
+    def test_round_trip(self):
+        response = self.post(renderers.cbor2.dumps({"code": "x = 1"}))
+        self.assertEqual(response.status_code, 201)
+        response = self.client.get(
+            f"/snippets-api/snippets/{response.data['id']}/",
+            HTTP_ACCEPT="application/cbor")
+        data = renderers.cbor2.loads(response.content)
+        self.assertEqual(data["code"], "x = 1")
+
+    def test_invalid_input_is_a_parse_error(self):
+        encoded = renderers.cbor2.dumps({"code": "x"})
+        for name, content in (
+                ("extra data", encoded + b"\x01"),
+                ("truncated", encoded[:-1]),
+                ("empty", b"")):
+            with self.subTest(name):
+                self.assertEqual(self.post(content).status_code, 400)
@@ -13,4 +13,24 @@ router.register("users", views.UserViewSet)
 app_name = "snippets"
 urlpatterns = [
     path("", include(router.urls)),
+    path(
+        "async/snippets/",
+        views.snippet_list_async,
+        name="snippet-list-async"),
+    path(
+        "async/snippets/<int:pk>/",
+        views.snippet_detail_async,
+        name="snippet-detail-async"),
+    path(
+        "async/snippets/<int:pk>/highlight/",
+        views.snippet_highlight_async,
+        name="snippet-highlight-async"),
+    path(
+        "async/users/",
+        views.user_list_async,
+        name="user-list-async"),
+    path(
+        "async/users/<int:pk>/",
+        views.user_detail_async,
+        name="user-detail-async"),
 ]
@@ -1,43 +1,193 @@
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.http import FileResponse, HttpResponse
 from rest_framework import filters, permissions, renderers, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from . import models
+from tutorial import async_views, mixins, throttling
+
+from . import files, models
 from . import permissions as snippets_permissions
 from . import serializers
 
 # Create your views here.
 
 
-class SnippetViewSet(viewsets.ModelViewSet):
+def _file_response(digest):
+    """
+    Hand a highlight stored in a file to the server: nginx sends it itself
+    with `X-Accel-Redirect` if configured, otherwise the WSGI server uses
+    `sendfile` when it supports `wsgi.file_wrapper`.
+    """
+    prefix = settings.HIGHLIGHT_FILES["ACCEL_REDIRECT"]
+    if prefix:
+        response = HttpResponse()
+        response["X-Accel-Redirect"] = (
+            prefix.rstrip("/") + "/" + files.relative_path(digest).as_posix())
+        return response
+    return FileResponse(
+        files.open_file(digest), content_type="text/html; charset=utf-8")
+
+
+class SnippetViewSet(mixins.BatchRetrieveMixin, viewsets.ModelViewSet):
     """
     This viewset automatically provides `list`, `create`, `retrieve`,
     `update` and `destroy` actions.
 
-    Additionally we also provide an extra `highlight` action.
+    Additionally we also provide extra `highlight`, `batch` and `changes`
+    actions.
     """
-    queryset = models.Snippet.objects.all()
+    queryset = models.Snippet.objects.select_related("owner", "code_blob")
     serializer_class = serializers.SnippetSerializer
     permission_classes = [
         permissions.IsAuthenticatedOrReadOnly,
         snippets_permissions.IsOwnerOrReadOnly]
+    throttle_classes = [
+        *api_settings.DEFAULT_THROTTLE_CLASSES,
+        throttling.SnippetWriteThrottle]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "highlight":
+            queryset = queryset.select_related("highlight_blob")
+        return queryset
 
     @action(detail=True, renderer_classes=[renderers.StaticHTMLRenderer])
     def highlight(self, request, *args, **kwargs):
         snippet = self.get_object()
+        if snippet.highlight_blob_id is None:
+            snippet.store_highlight()
+        if snippet.highlight_file:
+            return _file_response(snippet.highlight_file)
         return Response(snippet.highlighted)
 
+    @action(detail=False)
+    def changes(self, request, *args, **kwargs):
+        """
+        Ids of the snippets created, updated and deleted since `?cursor=`
+        (0 for all of them), and the cursor to pass next time. The
+        snippets themselves can then be fetched with `batch`.
+        """
+        query = serializers.ChangesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return Response(
+            models.SnippetChange.objects.since(**query.validated_data))
+
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
 
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
+class UserViewSet(
+        mixins.BatchRetrieveMixin, viewsets.ReadOnlyModelViewSet):
     """
-    This viewset automatically provides `list` and `retrieve` actions.
+    This viewset automatically provides `list` and `retrieve` actions,
+    and `batch` retrieves many users at once.
     """
-    queryset = User.objects.all()
+    queryset = User.objects.select_related("profile")
     serializer_class = serializers.UserSerializer
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ["username"]
     ordering = ["username"]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if serializers.expands_snippets(self.request):
+            queryset = queryset.prefetch_related("snippets")
+        return queryset
+
+    @action(detail=True)
+    def snippets(self, request, *args, **kwargs):
+        """
+        Paginated list of the user's snippets.
+        """
+        user = self.get_object()
+        queryset = models.Snippet.objects.filter(
+            owner=user).select_related("owner", "code_blob")
+        page = self.paginate_queryset(queryset)
+        serializer = serializers.SnippetSerializer(
+            page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+
+# Async-native read paths: under ASGI they run on the event loop, and
+# only their queries (and the viewsets' authentication and throttle
+# checks) go through a worker thread.
+
+
+@async_views.api_view(
+    permission_classes=SnippetViewSet.permission_classes,
+    throttle_classes=SnippetViewSet.throttle_classes)
+async def snippet_list_async(request, format=None):
+    queryset = models.Snippet.objects.select_related("owner", "code_blob")
+    data = await async_views.paginate(
+        request, queryset, serializers.SnippetSerializer)
+    if data is None:
+        return async_views.not_found("Invalid page.")
+    return async_views.json_response(data)
+
+
+@async_views.api_view(
+    permission_classes=SnippetViewSet.permission_classes,
+    throttle_classes=SnippetViewSet.throttle_classes)
+async def snippet_detail_async(request, pk, format=None):
+    try:
+        snippet = await models.Snippet.objects.select_related(
+            "owner", "code_blob").aget(pk=pk)
+    except models.Snippet.DoesNotExist:
+        return async_views.not_found()
+    serializer = serializers.SnippetSerializer(
+        snippet, context={"request": request})
+    return async_views.json_response(serializer.data)
+
+
+@async_views.api_view(
+    permission_classes=SnippetViewSet.permission_classes,
+    throttle_classes=SnippetViewSet.throttle_classes,
+    renderer_classes=[renderers.StaticHTMLRenderer])
+async def snippet_highlight_async(request, pk, format=None):
+    try:
+        snippet = await models.Snippet.objects.select_related(
+            "highlight_blob").aget(pk=pk)
+    except models.Snippet.DoesNotExist:
+        return HttpResponse(status=404)
+    if snippet.highlight_blob_id is None:
+        # Rows inserted without `save()` (e.g. `bulk_create`) have no
+        # stored highlight yet; render it off the event loop and keep it.
+        await snippet.astore_highlight()
+    if snippet.highlight_file:
+        return _file_response(snippet.highlight_file)
+    return HttpResponse(snippet.highlighted)
+
+
+def _user_queryset(request):
+    queryset = User.objects.select_related("profile")
+    if serializers.expands_snippets(request):
+        queryset = queryset.prefetch_related("snippets")
+    return queryset
+
+
+@async_views.api_view(
+    permission_classes=UserViewSet.permission_classes,
+    throttle_classes=UserViewSet.throttle_classes)
+async def user_list_async(request, format=None):
+    queryset = _user_queryset(request).order_by("username")
+    data = await async_views.paginate(
+        request, queryset, serializers.UserSerializer)
+    if data is None:
+        return async_views.not_found("Invalid page.")
+    return async_views.json_response(data)
+
+
+@async_views.api_view(
+    permission_classes=UserViewSet.permission_classes,
+    throttle_classes=UserViewSet.throttle_classes)
+async def user_detail_async(request, pk, format=None):
+    try:
+        user = await _user_queryset(request).aget(pk=pk)
+    except User.DoesNotExist:
+        return async_views.not_found()
+    serializer = serializers.UserSerializer(
+        user, context={"request": request})
+    return async_views.json_response(serializer.data)
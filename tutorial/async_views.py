@@ -0,0 +1,139 @@
+"""
+Helpers for the async-native (ASGI) read endpoints.
+
+DRF views are synchronous, so under ASGI each of them runs in a worker
+thread. The views built on these helpers are plain Django coroutines that
+use the async ORM directly, while reusing the DRF serializers, versioning
+and JSON renderer so their responses match the synchronous endpoints.
+`api_view` applies the same authentication, permission and throttle
+classes as the synchronous views before they run.
+
+That only pays off if every middleware in `MIDDLEWARE` is async-capable:
+a single sync-only one makes Django adapt the chain below it to sync, and
+these views then run through `async_to_sync` on a thread, slower than
+the synchronous endpoints.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage, Paginator
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework.views import APIView
+
+from .renderers import FastJSONRenderer
+
+
+def api_request(request, *args, **kwargs):
+    """
+    Wrap a Django request so hyperlinked serializer fields can reverse
+    namespaced URLs exactly like they do inside a DRF view.
+    """
+    drf_request = Request(request)
+    scheme = api_settings.DEFAULT_VERSIONING_CLASS()
+    drf_request.versioning_scheme = scheme
+    drf_request.version = scheme.determine_version(
+        drf_request, *args, **kwargs)
+    return drf_request
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    return HttpResponse(
+        FastJSONRenderer().render(data),
+        status=status,
+        content_type="application/json")
+
+
+def not_found(detail="Not found."):
+    return json_response(
+        {"detail": detail}, status=status.HTTP_404_NOT_FOUND)
+
+
+class PolicyView(APIView):
+    """
+    Holds the policies of an `api_view` coroutine. It is never dispatched:
+    only its `initial()` checks run.
+    """
+    renderer_classes = [FastJSONRenderer]
+
+
+def _initial(request, policies, args, kwargs):
+    """
+    Run `APIView.initial()` (content negotiation, versioning,
+    authentication, permissions and throttles) for `request`. Returns the
+    DRF request, and the rendered error response if a check failed.
+    """
+    view = PolicyView(**policies)
+    view.args, view.kwargs = args, kwargs
+    drf_request = view.initialize_request(request, *args, **kwargs)
+    view.request = drf_request
+    view.headers = view.default_response_headers
+    try:
+        view.initial(drf_request, *args, **kwargs)
+    except Exception as exc:
+        response = view.finalize_response(
+            drf_request, view.handle_exception(exc), *args, **kwargs)
+        return drf_request, response.render()
+    return drf_request, None
+
+
+def api_view(**policies):
+    """
+    Decorate an async view so its request goes through the same checks
+    as in a DRF view, with the `APIView` attributes given in `policies`
+    (e.g. `permission_classes`) or else the configured defaults. The
+    authenticators and throttles may block, so they run in a worker
+    thread. The view receives the authenticated DRF request.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            drf_request, response = await sync_to_async(_initial)(
+                request, policies, args, kwargs)
+            if response is not None:
+                return response
+            return await view(drf_request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+async def paginate(request, queryset, serializer_class):
+    """
+    Async counterpart of `PageNumberPagination`: returns the same
+    `count`/`next`/`previous`/`results` payload, or `None` if the page
+    number is invalid. `request` is the DRF request `api_view` passes.
+    """
+    page_size = api_settings.PAGE_SIZE
+    paginator = Paginator(queryset, page_size)
+    paginator.count = await queryset.acount()
+    page_number = request.GET.get("page", 1)
+    if page_number == "last":
+        page_number = paginator.num_pages
+    try:
+        page_number = paginator.validate_number(page_number)
+    except InvalidPage:
+        return None
+
+    offset = (page_number - 1) * page_size
+    objects = [obj async for obj in queryset[offset:offset + page_size]]
+
+    url = request.build_absolute_uri()
+    next_link = previous_link = None
+    if page_number < paginator.num_pages:
+        next_link = replace_query_param(url, "page", page_number + 1)
+    if page_number > 1:
+        previous_link = (
+            remove_query_param(url, "page") if page_number == 2
+            else replace_query_param(url, "page", page_number - 1))
+
+    serializer = serializer_class(
+        objects, many=True, context={"request": request})
+    return {
+        "count": paginator.count,
+        "next": next_link,
+        "previous": previous_link,
+        "results": serializer.data,
+    }
@@ -0,0 +1,129 @@
+"""
+Session and token authentication with cached user lookups.
+
+Before a view runs, an authenticated request reads its `django_session`
+row, then its `auth_user` row (or its `authtoken_token` row joined with
+the user). Both rarely change, so:
+
+- `CachedModelBackend.get_user`, which `AuthenticationMiddleware` calls for
+  session logins, and `CachedTokenAuthentication` keep active users and
+  tokens in per-process caches for
+  `AUTH_CACHE["TTL"]` seconds (at most `["MAX_SIZE"]` of each, least
+  recently used first out).
+- `SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"` serves
+  the session itself from the "sessions" cache.
+
+A user's entry is dropped when it is saved (password changes and
+deactivation included), deleted or logged out, and a token's when it is
+deleted. That only reaches the current process: other workers notice once
+their entry expires, as does this one for changes bypassing `save()` (e.g.
+`QuerySet.update()`), which is what the short TTL is for.
+
+Every request gets its own copy of the cached user, so per-request state
+such as the permission cache is never shared between threads.
+"""
+import copy
+import time
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework import authentication
+from rest_framework.authtoken.models import Token
+
+from tutorial.browsable import LRUCache
+
+
+class TTLCache(LRUCache):
+    """
+    `LRUCache` whose items expire `ttl` seconds after they are set.
+    """
+
+    def __init__(self, max_size, ttl):
+        super().__init__(max_size)
+        self.ttl = ttl
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] <= time.monotonic():
+                self._items.pop(key, None)
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value):
+        super().set(key, (time.monotonic() + self.ttl, value))
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+
+users = TTLCache(settings.AUTH_CACHE["MAX_SIZE"], settings.AUTH_CACHE["TTL"])
+tokens = TTLCache(settings.AUTH_CACHE["MAX_SIZE"], settings.AUTH_CACHE["TTL"])
+
+CACHES = {"user": users, "token": tokens}
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        user = users.get(user_id)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            users.set(user.pk, user)
+        return copy.copy(user)
+
+
+class CachedTokenAuthentication(authentication.TokenAuthentication):
+    """
+    DRF's token authentication, with the token and its user served from
+    the cache. `request.auth` is a copy of the token as it was read.
+    """
+
+    def authenticate_credentials(self, key):
+        token = tokens.get(key)
+        user = None if token is None else users.get(token.user_id)
+        if user is None:
+            user, token = super().authenticate_credentials(key)
+            cached = copy.copy(token)
+            # The user is cached, and invalidated, separately.
+            cached._state.fields_cache = {}
+            tokens.set(key, cached)
+            users.set(user.pk, copy.copy(user))
+            return user, token
+        user = copy.copy(user)
+        token = copy.copy(token)
+        token.user = user
+        return user, token
+
+
+def forget_user(pk):
+    users.delete(pk)
+    # Again once the change is visible, in case a concurrent request
+    # cached the old row in the meantime.
+    transaction.on_commit(lambda: users.delete(pk))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def forget_changed_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, request, user, **kwargs):
+    if user is not None:
+        forget_user(user.pk)
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    tokens.delete(instance.key)
@@ -0,0 +1,180 @@
+"""
+Browsable API rendering and OPTIONS metadata with cached choice lists.
+
+The snippet forms have two select fields built from every Pygments lexer
+and style, and DRF renders their hundreds of `<option>`s through the
+template engine on every browsable API page, then lists them again as
+`choices` in every OPTIONS response. Both only depend on the serializer
+class, the selected value and the installed Pygments, so:
+
+- `HTMLFormRenderer` keeps rendered select fields per process, keyed by
+  serializer class, field, selected value, style and Pygments version (at
+  most `BROWSABLE_API["FORM_CACHE_SIZE"]` of them, least recently used
+  first out). Fields with errors, and relational fields, whose choices
+  come from the database, are rendered every time.
+- `CachedMetadata` keeps each serializer's field information the same
+  way.
+- In lite mode (`BROWSABLE_API["LITE"]`), select fields with more than
+  `["LITE_MIN_CHOICES"]` choices are sent with their selected option only,
+  and the page fetches the full list from the endpoint's (cached) OPTIONS
+  metadata when the field is first hovered or focused.
+
+Choices set on a serializer field at runtime, rather than in its class,
+are not supported.
+"""
+import threading
+from collections import OrderedDict
+
+import pygments
+from django.conf import settings
+from django.template import loader
+from django.utils.translation import get_language
+from rest_framework import metadata, renderers, serializers
+
+
+class LRUCache:
+    """
+    Thread-safe mapping keeping the `max_size` most recently used items.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._items[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._items),
+            }
+
+
+form_fields = LRUCache(settings.BROWSABLE_API["FORM_CACHE_SIZE"])
+serializer_info = LRUCache(settings.BROWSABLE_API["FORM_CACHE_SIZE"])
+
+CACHES = {"form_field": form_fields, "serializer_info": serializer_info}
+
+
+def _is_static_choice_field(field):
+    return (
+        isinstance(field, serializers.ChoiceField)
+        and not isinstance(field, serializers.MultipleChoiceField))
+
+
+class HTMLFormRenderer(renderers.HTMLFormRenderer):
+    lite = False
+
+    def render_field(self, field, parent_style):
+        if not _is_static_choice_field(field._field) or field.errors:
+            return super().render_field(field, parent_style)
+        style = self.default_style[field].copy()
+        style.update(field.style)
+        style.setdefault(
+            "template_pack",
+            parent_style.get("template_pack", self.template_pack))
+        lite = (
+            self.lite
+            and style.get("base_template") == "select.html"
+            and "template" not in style
+            and style["template_pack"].strip("/")
+            == "rest_framework/horizontal"
+            and len(field._field.choices)
+            > settings.BROWSABLE_API["LITE_MIN_CHOICES"])
+        key = (
+            type(field._field.parent),
+            field.name,
+            repr(field.value),
+            tuple(sorted(style.items())),
+            lite,
+            get_language(),
+            pygments.__version__)
+        html = form_fields.get(key)
+        if html is None:
+            if lite:
+                html = self.render_lite_select(field, style)
+            else:
+                html = super().render_field(field, parent_style)
+            form_fields.set(key, html)
+        return html
+
+    def render_lite_select(self, field, style):
+        field = field.as_form_field()
+        value = "" if field.value is None else str(field.value)
+        display = field._field.choices.get(
+            field._field.choice_strings_to_values.get(value, value), value)
+        template = loader.get_template("browsable/select_lite.html")
+        return template.render({
+            "field": field,
+            "style": {**style, "renderer": self},
+            "value": value,
+            "display": display,
+        })
+
+
+class LiteHTMLFormRenderer(HTMLFormRenderer):
+    lite = True
+
+
+class BrowsableAPIRenderer(renderers.BrowsableAPIRenderer):
+    """
+    `BrowsableAPIRenderer` with cached select fields, and lite mode when
+    enabled in settings.
+    """
+
+    @property
+    def template(self):
+        if settings.BROWSABLE_API["LITE"]:
+            return "browsable/api.html"
+        return "rest_framework/api.html"
+
+    @property
+    def form_renderer_class(self):
+        if settings.BROWSABLE_API["LITE"]:
+            return LiteHTMLFormRenderer
+        return HTMLFormRenderer
+
+
+class CachedMetadata(metadata.SimpleMetadata):
+    """
+    `SimpleMetadata` computing each serializer's field information once.
+    """
+
+    def get_serializer_info(self, serializer):
+        if hasattr(serializer, "child"):
+            serializer = serializer.child
+        key = (
+            type(serializer),
+            tuple(serializer.fields),
+            get_language(),
+            pygments.__version__)
+        info = serializer_info.get(key)
+        if info is None:
+            info = super().get_serializer_info(serializer)
+            serializer_info.set(key, info)
+        return info.copy()
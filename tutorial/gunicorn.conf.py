@@ -0,0 +1,56 @@
+"""
+Gunicorn configuration for production.
+
+    gunicorn -c tutorial/gunicorn.conf.py tutorial.wsgi
+    gunicorn -c tutorial/gunicorn.conf.py \
+        -k uvicorn.workers.UvicornWorker tutorial.asgi:application
+
+The application is loaded and warmed up (see tutorial/warmup.py) once in
+the master, then forked, so workers start with compiled lexers and URL
+resolvers and share that memory copy-on-write. Every setting can be
+overridden with a GUNICORN_* environment variable.
+"""
+import multiprocessing
+import os
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+
+preload_app = True
+
+# Highlighting is CPU-bound and holds the GIL, so scale with processes; a
+# few threads per worker overlap database and client I/O.
+workers = _env_int("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1)
+threads = _env_int("GUNICORN_THREADS", 4)
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+
+# Longer than the default 2 s so a reverse proxy can reuse connections;
+# keep it below the proxy's own upstream keep-alive timeout.
+keepalive = _env_int("GUNICORN_KEEPALIVE", 5)
+timeout = _env_int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+
+# Recycle workers now and then to bound memory growth; the jitter keeps
+# them from all restarting at once.
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 2000)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", 200)
+
+accesslog = os.environ.get("GUNICORN_ACCESSLOG", "-")
+
+
+def when_ready(server):
+    # Runs in the master before any worker is forked. Without preloading
+    # each worker loads (and warms) the application itself instead.
+    if server.cfg.preload_app:
+        from tutorial import warmup
+        warmup.prepare()
+
+
+def post_worker_init(worker):
+    if not worker.cfg.preload_app:
+        from tutorial import warmup
+        warmup.prepare()
@@ -0,0 +1,38 @@
+"""
+Password hashers whose cost parameters come from settings.
+
+The algorithm names are unchanged, so existing hashes keep verifying and
+`must_update` transparently upgrades them when the parameters change.
+"""
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class ParametrizedHasherMixin:
+    """
+    Override class-level cost attributes with the values found under the
+    hasher's algorithm in `settings.PASSWORD_HASHER_PARAMS`.
+    """
+
+    def __init__(self):
+        params = settings.PASSWORD_HASHER_PARAMS.get(self.algorithm, {})
+        for name, value in params.items():
+            if not hasattr(self, name):
+                raise ValueError(
+                    f"Unknown {self.algorithm} hasher parameter: {name}")
+            setattr(self, name, value)
+
+
+class Argon2PasswordHasher(
+        ParametrizedHasherMixin, hashers.Argon2PasswordHasher):
+    pass
+
+
+class ScryptPasswordHasher(
+        ParametrizedHasherMixin, hashers.ScryptPasswordHasher):
+    pass
+
+
+class PBKDF2PasswordHasher(
+        ParametrizedHasherMixin, hashers.PBKDF2PasswordHasher):
+    pass
@@ -0,0 +1,105 @@
+"""
+Bounded process pool for password hashing.
+
+Key stretching is deliberately CPU heavy. Running it in a separate pool of
+processes keeps request threads (and the GIL) free for other requests, and
+the bounded number of slots turns signup bursts into fast 429 responses
+instead of an ever-growing backlog.
+
+A worker that dies (e.g. killed for running out of memory) breaks the
+whole pool; the broken pool is then replaced by a fresh one and the hash
+retried once, and inline if that pool breaks as well.
+"""
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import exceptions
+
+logger = logging.getLogger("tutorial.hashing")
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+
+
+class HashingPoolSaturated(exceptions.Throttled):
+    default_detail = "Too many registrations in progress."
+    default_code = "hashing_pool_saturated"
+
+
+def _init_worker():
+    django.setup()
+
+
+def _get_executor():
+    global _executor, _slots
+    with _lock:
+        workers = settings.PASSWORD_HASHING["WORKERS"]
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker)
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(
+                workers + settings.PASSWORD_HASHING["QUEUE"])
+        return _executor, _slots
+
+
+def _discard(executor):
+    """
+    Drop the broken `executor`, unless another thread already replaced
+    it. The slots are kept, so requests still running on it stay counted.
+    """
+    global _executor
+    with _lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown():
+    """
+    Stop the worker processes; the pool is recreated on the next use.
+    """
+    global _executor, _slots
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown()
+        _executor = _slots = None
+
+
+def make_password(password):
+    """
+    Hash `password` with the preferred hasher in a worker process.
+
+    Waits at most `PASSWORD_HASHING["TIMEOUT"]` seconds for a free slot
+    and raises `HashingPoolSaturated` (HTTP 429) otherwise. Hashing runs
+    inline when `PASSWORD_HASHING["WORKERS"]` is 0, and when the pool
+    breaks twice in a row.
+    """
+    if not settings.PASSWORD_HASHING["WORKERS"]:
+        return hashers.make_password(password)
+
+    executor, slots = _get_executor()
+    if not slots.acquire(timeout=settings.PASSWORD_HASHING["TIMEOUT"]):
+        raise HashingPoolSaturated(
+            wait=settings.PASSWORD_HASHING["RETRY_AFTER"])
+    try:
+        try:
+            return executor.submit(hashers.make_password, password).result()
+        except BrokenProcessPool:
+            logger.warning("Password hashing pool broke; replacing it.")
+            _discard(executor)
+        executor, _ = _get_executor()
+        try:
+            return executor.submit(hashers.make_password, password).result()
+        except BrokenProcessPool:
+            logger.error("Password hashing pool broke again; hashing inline.")
+            _discard(executor)
+        return hashers.make_password(password)
+    finally:
+        slots.release()
@@ -0,0 +1,97 @@
+"""
+Viewset mixins shared by the API apps.
+
+`BatchRetrieveMixin` adds a `batch` action retrieving many objects by
+primary key, for clients that would otherwise request dozens of detail
+URLs (each paying for authentication, routing and its own query):
+
+    GET  .../snippets/batch/?ids=3,1,2
+    POST .../snippets/batch/  {"ids": [3, 1, 2]}
+
+Each page of ids is resolved with one `IN` query on the viewset's
+queryset, and results come back in the order the ids were given. Ids that
+do not exist, or whose object the permissions hide, are listed under
+`missing` rather than failing the whole batch. POST is accepted for id
+lists too long for a URL, and is checked as the read it is.
+"""
+from rest_framework import exceptions, pagination, permissions, serializers
+from rest_framework.decorators import action
+
+
+class BatchPagination(pagination.PageNumberPagination):
+    page_size = 100
+
+
+class ReadRequest:
+    """
+    `request` as permission classes should see it for a read, whatever its
+    method.
+    """
+    method = "GET"
+
+    def __init__(self, request):
+        self._request = request
+
+    def __getattr__(self, name):
+        return getattr(self._request, name)
+
+
+class BatchRetrieveMixin:
+    batch_max_ids = 1000
+    batch_pagination_class = BatchPagination
+
+    def check_permissions(self, request):
+        if self.action == "batch":
+            request = ReadRequest(request)
+        super().check_permissions(request)
+
+    def get_batch_ids(self, request):
+        data = request.data
+        if request.method in permissions.SAFE_METHODS:
+            data = request.query_params
+        if hasattr(data, "getlist"):
+            # Query strings and form data: comma separated, repeated, or
+            # both.
+            ids = [
+                value.strip()
+                for value in ",".join(data.getlist("ids")).split(",")
+                if value.strip()]
+        else:
+            ids = data.get("ids") if isinstance(data, dict) else None
+        field = serializers.ListField(
+            # Bounded, so out of range ids fail validation rather than in
+            # the database driver.
+            child=serializers.IntegerField(min_value=1, max_value=2**63 - 1),
+            allow_empty=False,
+            max_length=self.batch_max_ids)
+        try:
+            ids = field.run_validation(
+                serializers.empty if ids is None else ids)
+        except exceptions.ValidationError as exc:
+            raise exceptions.ValidationError({"ids": exc.detail})
+        # Duplicates are returned once, at their first position.
+        return list(dict.fromkeys(ids))
+
+    @action(detail=False, methods=["get", "post"])
+    def batch(self, request, *args, **kwargs):
+        """
+        The objects with the given ids (`?ids=1,2,3`, or `{"ids": [...]}`
+        in a POST body), in that order.
+        """
+        read_request = ReadRequest(request)
+        ids = self.get_batch_ids(request)
+        paginator = self.batch_pagination_class()
+        page = paginator.paginate_queryset(ids, request, view=self)
+        objects = self.get_queryset().in_bulk(page)
+        permission_objects = self.get_permissions()
+        found = [
+            objects[pk] for pk in page
+            if pk in objects and all(
+                permission.has_object_permission(
+                    read_request, self, objects[pk])
+                for permission in permission_objects)]
+        serializer = self.get_serializer(found, many=True)
+        response = paginator.get_paginated_response(serializer.data)
+        found_ids = {obj.pk for obj in found}
+        response.data["missing"] = [pk for pk in page if pk not in found_ids]
+        return response
@@ -0,0 +1,72 @@
+"""
+Cheaper password validation for the registration endpoint.
+
+`validate_password` runs the configured validators in order and stops at
+the first failure, so `AUTH_PASSWORD_VALIDATORS` lists them cheapest
+first. `CommonPasswordValidator` keeps the common-password list as a
+sorted array of 64-bit digests, built once per process and shared by
+every validator instance.
+"""
+import bisect
+import functools
+import gzip
+import hashlib
+from array import array
+
+from django.contrib.auth import password_validation
+
+
+def _digest(password):
+    return int.from_bytes(
+        hashlib.blake2b(password.encode(), digest_size=8).digest(), "big")
+
+
+class CompactPasswordList:
+    """
+    Membership test over a sorted `array` of 64-bit digests: roughly 8
+    bytes per entry instead of a Python string object in a set.
+    """
+
+    def __init__(self, passwords):
+        self._digests = array("Q", sorted({_digest(p) for p in passwords}))
+
+    def __len__(self):
+        return len(self._digests)
+
+    def __contains__(self, password):
+        digest = _digest(password)
+        index = bisect.bisect_left(self._digests, digest)
+        return index < len(self._digests) and self._digests[index] == digest
+
+
+@functools.lru_cache(maxsize=None)
+def load_password_list(path):
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return CompactPasswordList(line.strip() for line in f)
+    except OSError:
+        with open(path) as f:
+            return CompactPasswordList(line.strip() for line in f)
+
+
+class CommonPasswordValidator(password_validation.CommonPasswordValidator):
+    """
+    Same rules as Django's validator, backed by the shared compact list.
+    """
+
+    def __init__(self, password_list_path=None):
+        if password_list_path is None:
+            password_list_path = self.DEFAULT_PASSWORD_LIST_PATH
+        self.passwords = load_password_list(str(password_list_path))
+
+
+def validate_password(password, user=None, password_validators=None):
+    """
+    Validate that the password meets all validator requirements, raising
+    the first failure instead of running every validator.
+    """
+    if password_validators is None:
+        password_validators = (
+            password_validation.get_default_password_validators())
+    for validator in password_validators:
+        validator.validate(password, user)
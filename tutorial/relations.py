@@ -0,0 +1,90 @@
+"""
+Hyperlinked fields that reverse each URL pattern once per request.
+
+DRF's hyperlinked fields call `reverse()` for every row, which goes through
+the versioning scheme, Django's resolver and `build_absolute_uri`. Apart
+from the lookup value, the result only depends on the view name, format
+and request, so the fields here reverse a sentinel value once per request
+and build row URLs by substituting the lookup value into that template.
+
+Only non-negative integer lookup values are substituted: they format the
+same way in any pattern that accepts them and need no quoting, so the
+result is identical to `reverse()`. Anything else (slugs, unsaved objects,
+no request in the context) takes DRF's regular path.
+"""
+from django.urls import NoReverseMatch
+from rest_framework import relations
+
+# Large enough not to show up by accident in a host name or URL prefix; if
+# it does, the template is discarded and `reverse()` is used instead.
+SENTINEL = 8209761453
+
+
+def get_url_template(request, reverse, view_name, lookup_url_kwarg, format):
+    """
+    `(prefix, suffix)` around the lookup value in the URLs `reverse` builds
+    for `view_name`, or None if they cannot be templated. Cached on the
+    request.
+    """
+    try:
+        templates = request._url_templates
+    except AttributeError:
+        templates = request._url_templates = {}
+    key = (view_name, lookup_url_kwarg, format)
+    try:
+        return templates[key]
+    except KeyError:
+        pass
+
+    template = None
+    try:
+        url = reverse(
+            view_name,
+            kwargs={lookup_url_kwarg: SENTINEL},
+            request=request,
+            format=format)
+    except NoReverseMatch:
+        pass
+    else:
+        parts = url.split(str(SENTINEL))
+        if len(parts) == 2:
+            template = tuple(parts)
+    templates[key] = template
+    return template
+
+
+class URLTemplateMixin:
+    def get_url(self, obj, view_name, request, format):
+        if request is None or (hasattr(obj, "pk") and obj.pk in (None, "")):
+            return super().get_url(obj, view_name, request, format)
+
+        lookup_value = getattr(obj, self.lookup_field)
+        if type(lookup_value) is not int or lookup_value < 0:
+            return super().get_url(obj, view_name, request, format)
+
+        template = get_url_template(
+            request, self.reverse, view_name, self.lookup_url_kwarg, format)
+        if template is None:
+            return super().get_url(obj, view_name, request, format)
+        prefix, suffix = template
+        return f"{prefix}{lookup_value}{suffix}"
+
+
+class HyperlinkedRelatedField(
+        URLTemplateMixin, relations.HyperlinkedRelatedField):
+    pass
+
+
+class HyperlinkedIdentityField(
+        URLTemplateMixin, relations.HyperlinkedIdentityField):
+    pass
+
+
+class URLTemplateSerializerMixin:
+    """
+    `HyperlinkedModelSerializer` mixin using the templated fields for the
+    generated `url` and relation fields. Explicitly declared fields must use
+    the classes from this module themselves.
+    """
+    serializer_url_field = HyperlinkedIdentityField
+    serializer_related_field = HyperlinkedRelatedField
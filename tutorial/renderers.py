@@ -0,0 +1,253 @@
+"""
+Renderers and parsers: JSON backed by orjson or msgspec, and the
+MessagePack and CBOR binary formats.
+
+DRF's `JSONRenderer` encodes with the stdlib `json` module and a Python
+`default` hook, which dominates CPU time on large list pages once the
+queries are done. `FastJSONRenderer` and `FastJSONParser` use orjson when
+it is installed, then msgspec, and otherwise behave exactly like DRF's
+classes. Select them in `REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"]` and
+`["DEFAULT_PARSER_CLASSES"]`, or pick a backend explicitly with the
+`ORJSON*` and `Msgspec*` classes.
+
+Output is byte-for-byte what DRF renders for the data our serializers
+produce: compact, UTF-8, with U+2028/U+2029 escaped. Types the libraries
+don't handle natively (lazy strings, Decimals, querysets...) go through
+DRF's `JSONEncoder.default`; orjson also hands it datetimes so they keep
+DRF's format, while msgspec's own datetime format already matches it (its
+Decimals are strings, as with `COERCE_DECIMAL_TO_STRING`). Whenever the
+output could differ (an `indent` is requested, `UNICODE_JSON`,
+`COMPACT_JSON` or `STRICT_JSON` is off), rendering falls back to DRF, as
+it does when orjson refuses an integer wider than 64 bits. Two
+differences remain: NaN and infinite floats render as `null` instead of
+raising, and orjson writes large floats like `1e16` where `json` writes
+`1e+16` (the same number).
+
+The binary formats are for internal machine clients, negotiated through
+`Accept`/`Content-Type` or the `format` suffix (`.msgpack`, `.cbor`). They
+carry the same values as the JSON responses, except that bytes stay bytes.
+Settings only enable them when msgpack or cbor2 is installed.
+"""
+import abc
+import io
+import json
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import parsers, renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+_LINE_SEPARATORS = (
+    ("\u2028".encode(), b"\\u2028"), ("\u2029".encode(), b"\\u2029"))
+
+
+def _escape_line_separators(content):
+    # Mirror DRF, which escapes them so the output is valid JavaScript.
+    for raw, escaped in _LINE_SEPARATORS:
+        if raw in content:
+            content = content.replace(raw, escaped)
+    return content
+
+
+def _require(module, name):
+    if module is None:
+        raise ImproperlyConfigured(f"{name} is not installed.")
+
+
+class BaseFastJSONRenderer(renderers.JSONRenderer, abc.ABC):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if (indent is not None or self.ensure_ascii or not self.compact
+                or not self.strict):
+            return super().render(data, accepted_media_type, renderer_context)
+        return _escape_line_separators(self.dumps(data))
+
+    @abc.abstractmethod
+    def dumps(self, data):
+        """
+        `data` as compact UTF-8 JSON.
+        """
+
+    def dumps_with_json(self, data):
+        """
+        `dumps` through the stdlib, exactly as DRF renders it in the fast
+        path's configuration.
+        """
+        return json.dumps(
+            data, cls=self.encoder_class, ensure_ascii=False,
+            allow_nan=False, separators=(",", ":")).encode()
+
+
+class ORJSONRenderer(BaseFastJSONRenderer):
+    options = (
+        orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if orjson is not None else 0)
+
+    def __init__(self):
+        _require(orjson, "orjson")
+        self.default = self.encoder_class().default
+
+    def dumps(self, data):
+        try:
+            return orjson.dumps(
+                data, default=self.default, option=self.options)
+        except orjson.JSONEncodeError:
+            # Integers beyond 64 bits; `default` is not asked about them.
+            return self.dumps_with_json(data)
+
+
+class MsgspecJSONRenderer(BaseFastJSONRenderer):
+    def __init__(self):
+        _require(msgspec, "msgspec")
+        self.encoder = msgspec.json.Encoder(
+            enc_hook=self.encoder_class().default)
+
+    def dumps(self, data):
+        return self.encoder.encode(data)
+
+
+class BaseFastJSONParser(parsers.JSONParser, abc.ABC):
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        if not self.strict:
+            # Only the stdlib accepts NaN and Infinity.
+            return super().parse(stream, media_type, parser_context)
+        content = stream.read()
+        try:
+            if encoding.lower().replace("-", "") != "utf8":
+                content = content.decode(encoding)
+            return self.loads(content)
+        except ValueError as exc:
+            raise ParseError("JSON parse error - %s" % str(exc))
+
+    @abc.abstractmethod
+    def loads(self, content):
+        """
+        Decode `content` (bytes or str), raising `ValueError` if invalid.
+        """
+
+
+class ORJSONParser(BaseFastJSONParser):
+    renderer_class = ORJSONRenderer
+
+    def __init__(self):
+        _require(orjson, "orjson")
+
+    def loads(self, content):
+        return orjson.loads(content)
+
+
+class MsgspecJSONParser(BaseFastJSONParser):
+    renderer_class = MsgspecJSONRenderer
+
+    def __init__(self):
+        _require(msgspec, "msgspec")
+        self.decoder = msgspec.json.Decoder()
+
+    def loads(self, content):
+        try:
+            return self.decoder.decode(content)
+        except msgspec.DecodeError as exc:
+            raise ValueError(str(exc)) from exc
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def __init__(self):
+        _require(msgpack, "msgpack")
+        self.default = encoders.JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=self.default, use_bin_type=True)
+
+
+class MessagePackParser(parsers.BaseParser):
+    media_type = "application/msgpack"
+    renderer_class = MessagePackRenderer
+
+    def __init__(self):
+        _require(msgpack, "msgpack")
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, TypeError, msgpack.ExtraData) as exc:
+            # TypeError: a map key that cannot be hashed.
+            raise ParseError("MessagePack parse error - %s" % str(exc))
+
+
+class CBORRenderer(renderers.BaseRenderer):
+    media_type = "application/cbor"
+    format = "cbor"
+    charset = None
+    render_style = "binary"
+
+    def __init__(self):
+        _require(cbor2, "cbor2")
+        self.default = encoders.JSONEncoder().default
+
+    def encode_other(self, encoder, value):
+        encoder.encode(self.default(value))
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return cbor2.dumps(data, default=self.encode_other)
+
+
+class CBORParser(parsers.BaseParser):
+    media_type = "application/cbor"
+    renderer_class = CBORRenderer
+
+    def __init__(self):
+        _require(cbor2, "cbor2")
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        content = io.BytesIO(stream.read())
+        try:
+            data = cbor2.CBORDecoder(content).decode()
+        except (ValueError, TypeError, cbor2.CBORDecodeError) as exc:
+            raise ParseError("CBOR parse error - %s" % str(exc))
+        if content.read(1):
+            # Like msgpack's `ExtraData`, rather than ignoring the rest.
+            raise ParseError("CBOR parse error - extra data")
+        return data
+
+
+if orjson is not None:
+    FastJSONRenderer, FastJSONParser = ORJSONRenderer, ORJSONParser
+elif msgspec is not None:
+    FastJSONRenderer, FastJSONParser = MsgspecJSONRenderer, MsgspecJSONParser
+else:
+    FastJSONRenderer = renderers.JSONRenderer
+    FastJSONParser = parsers.JSONParser
@@ -1,7 +1,14 @@
 from django.contrib.auth.models import User
-from django.contrib.auth.password_validation import validate_password
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from rest_framework import serializers
-from rest_framework.validators import UniqueValidator
+
+from . import hashing
+from .password_validation import validate_password
+
+UNIQUE_USERNAME_MESSAGE = User._meta.get_field(
+    "username").error_messages["unique"]
+UNIQUE_EMAIL_MESSAGE = "This field must be unique."
 
 
 class UserCreateSerializer(serializers.ModelSerializer):
@@ -10,18 +17,54 @@ class UserCreateSerializer(serializers.ModelSerializer):
         write_only=True,
         style={"input_type": "password"},
         validators=[validate_password])
-    email = serializers.EmailField(
-        required=True,
-        validators=[UniqueValidator(queryset=User.objects.all())])
+    email = serializers.EmailField(required=True)
 
     class Meta:
         model = User
         fields = ("username", "email", "password")
+        # Uniqueness is checked for both fields at once in `validate`,
+        # instead of one `UniqueValidator` query per field.
+        extra_kwargs = {
+            "username": {"validators": [User.username_validator]},
+        }
+
+    def validate(self, attrs):
+        errors = self.uniqueness_errors(attrs["username"], attrs["email"])
+        if errors:
+            raise serializers.ValidationError(errors, code="unique")
+        return attrs
+
+    def uniqueness_errors(self, username, email):
+        """
+        Errors for whichever of `username` and `email` are taken, found
+        with a single query.
+        """
+        taken = User.objects.filter(
+            Q(username=username) | Q(email=email)
+        ).values_list("username", "email")[:2]
+        errors = {}
+        for taken_username, taken_email in taken:
+            if taken_username == username:
+                errors["username"] = [UNIQUE_USERNAME_MESSAGE]
+            if taken_email == email:
+                errors["email"] = [UNIQUE_EMAIL_MESSAGE]
+        return errors
 
     def create(self, validated_data):
-        user = User.objects.create(
-            username=validated_data["username"],
-            email=validated_data["email"])
-        user.set_password(validated_data["password"])
-        user.save()
-        return user
+        # Hash before building the user so it is written with one INSERT.
+        password = hashing.make_password(validated_data["password"])
+        try:
+            with transaction.atomic():
+                return User.objects.create(
+                    username=validated_data["username"],
+                    email=validated_data["email"],
+                    password=password)
+        except IntegrityError:
+            # A concurrent registration may have won the race after
+            # `validate`. Error messages differ between databases, so
+            # look again for the clashing field instead of parsing them.
+            errors = self.uniqueness_errors(
+                validated_data["username"], validated_data["email"])
+            if errors:
+                raise serializers.ValidationError(errors, code="unique")
+            raise
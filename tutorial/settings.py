@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 
 import environ
@@ -50,11 +51,16 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "rest_framework",
+    "rest_framework.authtoken",
     "tutorial.apps.quickstart",
     "tutorial.apps.snippets",
+    "tutorial.apps.perf",
 ]
 
 MIDDLEWARE = [
+    "tutorial.apps.perf.middleware.PerformanceMiddleware",
+    "tutorial.apps.perf.profiling.ProfilingMiddleware",
+    "tutorial.apps.perf.querywatch.QueryInspectionMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -69,7 +75,7 @@ ROOT_URLCONF = "tutorial.urls"
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
-        "DIRS": [],
+        "DIRS": [BASE_DIR / "tutorial" / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
             "context_processors": [
@@ -90,27 +96,68 @@ WSGI_APPLICATION = "tutorial.wsgi.application"
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        **env.db(
+            "DATABASE_URL", default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}"),
+        # Keep connections open between requests, so each worker thread
+        # connects once. Off under DEBUG, since runserver starts a thread
+        # per request and would leave a connection behind for each one.
+        "CONN_MAX_AGE": env.int("DB_CONN_MAX_AGE", default=0 if DEBUG else 60),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# Throttle buckets must be shared between processes to be accurate, so
+# point THROTTLE_CACHE_URL at e.g. redis:// when running several workers.
+CACHES = {
+    "default": env.cache_url("CACHE_URL", default="locmemcache://"),
+    "throttle": env.cache_url(
+        "THROTTLE_CACHE_URL", default="locmemcache://throttle"),
+    "sessions": env.cache_url(
+        "SESSION_CACHE_URL", default="locmemcache://sessions"),
+}
+
+
+# Authentication and sessions (tutorial.authentication)
+
+AUTHENTICATION_BACKENDS = ["tutorial.authentication.CachedModelBackend"]
+
+# Active users, and the users of API tokens, kept per process for TTL
+# seconds (0 disables the cache).
+AUTH_CACHE = {
+    "TTL": env.float("AUTH_CACHE_TTL", default=10),
+    "MAX_SIZE": env.int("AUTH_CACHE_MAX_SIZE", default=1024),
+}
+
+# Set to "django.contrib.sessions.backends.cached_db" to read sessions from
+# the "sessions" cache. With several workers, point SESSION_CACHE_URL at a
+# cache they all share (e.g. redis://) first: a logout in one would leave
+# the session in the others' local memory.
+SESSION_ENGINE = env(
+    "SESSION_ENGINE", default="django.contrib.sessions.backends.db")
+SESSION_CACHE_ALIAS = "sessions"
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
+# Ordered cheapest first: tutorial.password_validation.validate_password
+# stops at the first failing validator.
 AUTH_PASSWORD_VALIDATORS = [
     {
-        "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
+        "NAME": "django.contrib.auth.password_validation.MinimumLengthValidator",
     },
     {
-        "NAME": "django.contrib.auth.password_validation.MinimumLengthValidator",
+        "NAME": "django.contrib.auth.password_validation.NumericPasswordValidator",
     },
     {
-        "NAME": "django.contrib.auth.password_validation.CommonPasswordValidator",
+        "NAME": "tutorial.password_validation.CommonPasswordValidator",
     },
     {
-        "NAME": "django.contrib.auth.password_validation.NumericPasswordValidator",
+        "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
     },
 ]
 
@@ -118,6 +165,80 @@ if DEBUG:
     AUTH_PASSWORD_VALIDATORS = []
 
 
+# Password hashing
+# https://docs.djangoproject.com/en/4.2/topics/auth/passwords/
+
+# The preferred hasher is used for new passwords; the others are kept so
+# existing hashes still verify (and get upgraded on the next login).
+PASSWORD_HASHER_PROFILES = {
+    "argon2": "tutorial.hashers.Argon2PasswordHasher",
+    "scrypt": "tutorial.hashers.ScryptPasswordHasher",
+    "pbkdf2": "tutorial.hashers.PBKDF2PasswordHasher",
+}
+
+PASSWORD_HASHER_PROFILE = env("PASSWORD_HASHER_PROFILE", default="pbkdf2")
+
+PASSWORD_HASHERS = [
+    PASSWORD_HASHER_PROFILES[PASSWORD_HASHER_PROFILE],
+    *(
+        hasher for profile, hasher in PASSWORD_HASHER_PROFILES.items()
+        if profile != PASSWORD_HASHER_PROFILE),
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+]
+
+# Cost parameters per algorithm; omitted values keep Django's defaults.
+PASSWORD_HASHER_PARAMS = {
+    "argon2": {
+        "time_cost": env.int("ARGON2_TIME_COST", default=2),
+        "memory_cost": env.int("ARGON2_MEMORY_COST", default=102400),
+        "parallelism": env.int("ARGON2_PARALLELISM", default=8),
+    },
+    "scrypt": {
+        "work_factor": env.int("SCRYPT_WORK_FACTOR", default=2**14),
+        "block_size": env.int("SCRYPT_BLOCK_SIZE", default=8),
+        "parallelism": env.int("SCRYPT_PARALLELISM", default=1),
+    },
+}
+
+# Registration hashes passwords in a bounded process pool (see
+# tutorial/hashing.py). WORKERS=0 hashes inline on the request thread.
+PASSWORD_HASHING = {
+    "WORKERS": env.int("PASSWORD_HASHING_WORKERS", default=2),
+    "QUEUE": env.int("PASSWORD_HASHING_QUEUE", default=8),
+    "TIMEOUT": env.float("PASSWORD_HASHING_TIMEOUT", default=0.5),
+    "RETRY_AFTER": 1,
+}
+
+
+# Server start-up (tutorial.warmup)
+
+# Lexers compiled before the first request: "*" for every language (a few
+# seconds, paid once in the gunicorn master when the app is preloaded), or
+# a list of Pygments aliases.
+WARMUP_LANGUAGES = env.list("WARMUP_LANGUAGES", default=["*"])
+
+
+# Idle Pygments lexers and formatters kept for reuse (see
+# tutorial/apps/snippets/highlighting.py): up to MAX_KEYS languages and
+# (style, linenos) pairs each, MAX_IDLE instances per key.
+HIGHLIGHT_POOL = {
+    "MAX_KEYS": env.int("HIGHLIGHT_POOL_MAX_KEYS", default=64),
+    "MAX_IDLE": env.int("HIGHLIGHT_POOL_MAX_IDLE", default=4),
+}
+
+# Highlights of at least MIN_SIZE characters are stored in files under
+# ROOT rather than in the database, and served with `sendfile` (see
+# tutorial/apps/snippets/files.py). Behind nginx, set ACCEL_REDIRECT to the
+# internal location ROOT is aliased to (e.g. "/protected/highlights/") to
+# have it send them with `X-Accel-Redirect` instead.
+HIGHLIGHT_FILES = {
+    "ROOT": Path(
+        env("HIGHLIGHT_FILES_ROOT", default=str(BASE_DIR / "highlights"))),
+    "MIN_SIZE": env.int("HIGHLIGHT_FILES_MIN_SIZE", default=64 * 1024),
+    "ACCEL_REDIRECT": env("HIGHLIGHT_FILES_ACCEL_REDIRECT", default=""),
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -146,5 +267,88 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 REST_FRAMEWORK = {
     "DEFAULT_VERSIONING_CLASS": "rest_framework.versioning.NamespaceVersioning",
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
-    "PAGE_SIZE": 10
+    "PAGE_SIZE": 10,
+    # orjson (or msgspec) when installed, DRF's stdlib classes otherwise.
+    "DEFAULT_RENDERER_CLASSES": [
+        "tutorial.renderers.FastJSONRenderer",
+        "tutorial.browsable.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "tutorial.renderers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
+    "DEFAULT_METADATA_CLASS": "tutorial.browsable.CachedMetadata",
+    "DEFAULT_AUTHENTICATION_CLASSES": [
+        "rest_framework.authentication.SessionAuthentication",
+        "tutorial.authentication.CachedTokenAuthentication",
+        "rest_framework.authentication.BasicAuthentication",
+    ],
+    "DEFAULT_THROTTLE_CLASSES": [
+        "tutorial.throttling.AnonThrottle",
+        "tutorial.throttling.UserThrottle",
+        "tutorial.throttling.ScopedThrottle",
+        "tutorial.throttling.DeepPaginationThrottle",
+    ],
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": "120/min",
+        "user": "1200/min",
+        "register": "10/hour",
+        "token-auth": "20/hour",
+        "token-auth-username": "10/hour",
+        "snippet-write": "60/min",
+        "deep-page": "30/min",
+    },
+}
+
+# Binary formats for internal machine clients. Their libraries are pinned
+# in requirements.txt; installs without them just leave the formats out.
+for module, format_name in (("msgpack", "MessagePack"), ("cbor2", "CBOR")):
+    if find_spec(module) is not None:
+        REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"].append(
+            f"tutorial.renderers.{format_name}Renderer")
+        REST_FRAMEWORK["DEFAULT_PARSER_CLASSES"].append(
+            f"tutorial.renderers.{format_name}Parser")
+
+
+# Browsable API (tutorial.browsable)
+
+BROWSABLE_API = {
+    # Rendered select fields, and serializer metadata, kept per process.
+    "FORM_CACHE_SIZE": env.int("BROWSABLE_API_FORM_CACHE_SIZE", default=256),
+    # Send long select fields with their selected option only, and load
+    # the other choices when the field is first used.
+    "LITE": env.bool("BROWSABLE_API_LITE", default=False),
+    "LITE_MIN_CHOICES": 50,
+}
+
+
+# Performance instrumentation (tutorial.apps.perf)
+
+PERF = {
+    # Send per-request timings back to clients in a Server-Timing header.
+    # They reveal internals, so leave this off where clients are public.
+    "SERVER_TIMING": env.bool("PERF_SERVER_TIMING", default=False),
+    # Bearer token Prometheus scrapes /metrics/ with; staff users may
+    # always read it. Scrapers and clients are told apart by credentials,
+    # not addresses, which a reverse proxy would make all look local.
+    "METRICS_TOKEN": env("PERF_METRICS_TOKEN", default=""),
+    # What to do when a query shape repeats more than the threshold within
+    # one request: "off", "log", "warn" or "raise" (use "raise" in CI).
+    "QUERY_ENFORCEMENT": env("PERF_QUERY_ENFORCEMENT", default="log"),
+    "REPEATED_QUERY_THRESHOLD": env.int(
+        "PERF_REPEATED_QUERY_THRESHOLD", default=5),
+    # Queries slower than this are logged with their query plan.
+    "SLOW_QUERY_MS": env.float("PERF_SLOW_QUERY_MS", default=100),
+}
+
+# cProfile a SAMPLE_RATE share of requests (0 to 1), and requests sending
+# TOKEN in an X-Profile header, into ROOT; staff list and download the
+# newest MAX_FILES at /profiles/ (see tutorial/apps/perf/profiling.py).
+# With neither set, the middleware is left out of the stack.
+PROFILING = {
+    "SAMPLE_RATE": env.float("PROFILING_SAMPLE_RATE", default=0),
+    "TOKEN": env("PROFILING_TOKEN", default=""),
+    "ROOT": Path(env("PROFILING_ROOT", default=str(BASE_DIR / "profiles"))),
+    "MAX_FILES": env.int("PROFILING_MAX_FILES", default=200),
 }
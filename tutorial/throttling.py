@@ -0,0 +1,135 @@
+"""
+Token bucket throttles.
+
+DRF's `SimpleRateThrottle` keeps a list with one timestamp per request in
+the window, so every check copies and rewrites up to `num_requests`
+entries. A token bucket stores a single `(tokens, timestamp)` pair per
+key, which keeps checks constant time and lets a request cost more than
+one token.
+
+State lives in the "throttle" cache: local memory by default, or any
+shared cache (e.g. Redis) via `THROTTLE_CACHE_URL` so every process sees
+the same buckets. Like DRF's throttles, the read and write are not atomic,
+so concurrent requests may slightly overshoot the limit.
+"""
+import hashlib
+
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+from rest_framework import permissions, throttling
+
+
+class TokenBucketThrottle(throttling.SimpleRateThrottle):
+    """
+    A bucket holding up to `num_requests` tokens, refilled continuously
+    over `duration`. Each request takes `get_cost()` tokens.
+    """
+    cache = ConnectionProxy(caches, "throttle")
+    # Distinct from DRF's keys, which hold timestamp lists instead.
+    cache_format = "throttle_bucket_%(scope)s_%(ident)s"
+
+    def get_cost(self, request, view):
+        return 1
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {"scope": self.scope, "ident": ident}
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        cost = min(self.get_cost(request, view), self.num_requests)
+        if cost <= 0:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        refill_rate = self.num_requests / self.duration
+        tokens, updated = self.cache.get(
+            self.key, (self.num_requests, self.now))
+        tokens = min(
+            self.num_requests, tokens + (self.now - updated) * refill_rate)
+        if tokens < cost:
+            self.wait_time = (cost - tokens) / refill_rate
+            return self.throttle_failure()
+
+        self.cache.set(self.key, (tokens - cost, self.now), self.duration)
+        return True
+
+    def wait(self):
+        return self.wait_time
+
+
+class AnonThrottle(throttling.AnonRateThrottle, TokenBucketThrottle):
+    pass
+
+
+class UserThrottle(throttling.UserRateThrottle, TokenBucketThrottle):
+    pass
+
+
+class ScopedThrottle(throttling.ScopedRateThrottle, TokenBucketThrottle):
+    pass
+
+
+class SnippetWriteThrottle(TokenBucketThrottle):
+    """
+    Charge snippet writes by code size, since highlighting cost grows with
+    it: one token plus one per `bytes_per_token` characters of code.
+    """
+    scope = "snippet-write"
+    bytes_per_token = 4096
+
+    def get_cache_key(self, request, view):
+        return self.get_ident_key(request)
+
+    def get_cost(self, request, view):
+        # Batch retrieves may be POSTed, but are reads.
+        if (request.method in permissions.SAFE_METHODS
+                or getattr(view, "action", None) == "batch"):
+            return 0
+        data = request.data
+        code = data.get("code", "") if hasattr(data, "get") else ""
+        return 1 + len(str(code)) // self.bytes_per_token
+
+
+class DeepPaginationThrottle(TokenBucketThrottle):
+    """
+    Offset pagination gets slower the deeper the page, so pages beyond
+    `free_pages` cost one token per further `free_pages` pages.
+    """
+    scope = "deep-page"
+    free_pages = 10
+
+    def get_cache_key(self, request, view):
+        return self.get_ident_key(request)
+
+    def get_cost(self, request, view):
+        page = request.query_params.get("page", "")
+        if not page.isdigit():
+            return 0
+        return int(page) // self.free_pages
+
+
+class UsernameThrottle(TokenBucketThrottle):
+    """
+    Limit login attempts per submitted username, whichever clients they
+    come from, on top of the per-client limits.
+    """
+    scope = "token-auth-username"
+
+    def get_cache_key(self, request, view):
+        data = request.data
+        username = data.get("username") if hasattr(data, "get") else None
+        if not username:
+            return None
+        # Usernames may contain characters some cache backends reject.
+        ident = hashlib.sha256(str(username).encode()).hexdigest()
+        return self.cache_format % {"scope": self.scope, "ident": ident}
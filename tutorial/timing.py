@@ -0,0 +1,80 @@
+"""
+Per-request timing collection.
+
+Code without access to the request (model methods, serializers) records
+time with `span()`, which adds to the `RequestTimings` made current
+through a context variable. Nothing here knows who reads them: the perf
+app's `PerformanceMiddleware` activates one per request when it is
+installed, and otherwise `span()` does nothing.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar("perf_request_timings", default=None)
+
+
+class RequestTimings:
+    """
+    Accumulated seconds per component, plus the SQL query count.
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self.queries = 0
+        self._open = set()
+
+    def add(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def record_query(self, execute, sql, params, many, context):
+        """
+        `connection.execute_wrapper` hook timing every SQL query.
+        """
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.add("db", time.perf_counter() - start)
+
+
+def current():
+    return _current.get()
+
+
+def activate(timings):
+    return _current.set(timings)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+@contextmanager
+def span(name):
+    """
+    Add the time spent in the block to the current request's `name`
+    component. Nested spans with the same name are only counted once.
+    """
+    timings = _current.get()
+    if timings is None or name in timings._open:
+        yield
+        return
+    timings._open.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings._open.discard(name)
+        timings.add(name, time.perf_counter() - start)
+
+
+class TimedRepresentationMixin:
+    """
+    Serializer mixin recording `to_representation` time as "serialize".
+    """
+
+    def to_representation(self, instance):
+        with span("serialize"):
+            return super().to_representation(instance)
@@ -33,5 +33,10 @@ urlpatterns = [
     path(
         "api-auth/",
         include("rest_framework.urls", namespace="rest_framework")),
+    path(
+        "api-token-auth/",
+        views.ObtainAuthToken.as_view(),
+        name="api-token-auth"),
     path("admin/", admin.site.urls),
+    path("", include("tutorial.apps.perf.urls", namespace="perf")),
 ]
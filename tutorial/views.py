@@ -1,10 +1,12 @@
 from django.contrib.auth.models import User
 from rest_framework import generics
+from rest_framework.authtoken import views as authtoken_views
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
 
-from . import serializers
+from . import serializers, throttling
 
 
 @api_view(["GET"])
@@ -22,3 +24,15 @@ def proj_root(request, format=None):
 class Register(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = serializers.UserCreateSerializer
+    throttle_scope = "register"
+
+
+class ObtainAuthToken(authtoken_views.ObtainAuthToken):
+    """
+    Exchange a username and password for the user's API token.
+    """
+    # DRF's view is not throttled. Guesses at one account from many
+    # addresses are limited by username too.
+    throttle_classes = [
+        *api_settings.DEFAULT_THROTTLE_CLASSES, throttling.UsernameThrottle]
+    throttle_scope = "token-auth"
@@ -0,0 +1,75 @@
+"""
+Start-up work for production servers, so the first request each worker
+serves is not slower than the rest.
+
+A fresh process pays on its first requests for what Django and Pygments
+do lazily: compiling a lexer's regular expressions when it is first
+instantiated, importing style modules, populating the URL resolvers'
+reverse dictionaries and compiling their patterns, and building the
+password validators.
+
+`prepare()` covers all of it and never touches the database, so it can
+run in the gunicorn master before forking (`preload_app`), leaving the
+compiled state shared copy-on-write by every worker.
+
+Database connections are not opened ahead of time: Django keeps one per
+thread, and gthread workers serve requests on pool threads that do not
+exist yet when the worker starts. Each thread connects on its first
+request instead, and keeps the connection for `CONN_MAX_AGE` seconds.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.auth.password_validation import (
+    get_default_password_validators)
+from django.db import connections
+from django.urls import URLResolver, get_resolver
+from pygments.formatters.html import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+from pygments.util import ClassNotFound
+
+from tutorial.apps.snippets.models import LANGUAGE_CHOICES, STYLE_CHOICES
+
+logger = logging.getLogger("tutorial.warmup")
+
+
+def warm_lexers(languages):
+    if "*" in languages:
+        languages = [language for language, _name in LANGUAGE_CHOICES]
+    for language in languages:
+        try:
+            get_lexer_by_name(language)
+        except ClassNotFound:
+            logger.warning("Unknown lexer %r in WARMUP_LANGUAGES.", language)
+
+
+def warm_styles():
+    # Imports the style module and builds its CSS rules.
+    for style, _name in STYLE_CHOICES:
+        HtmlFormatter(style=style)
+
+
+def warm_url_resolvers(resolver=None):
+    """
+    Populate every (namespaced) resolver and compile all URL patterns.
+    """
+    if resolver is None:
+        resolver = get_resolver()
+    resolver.reverse_dict
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            warm_url_resolvers(pattern)
+
+
+def prepare():
+    start = time.perf_counter()
+    warm_url_resolvers()
+    warm_lexers(settings.WARMUP_LANGUAGES)
+    warm_styles()
+    get_default_password_validators()
+    # Nothing above should connect, but a connection inherited across a
+    # fork would be shared by every worker.
+    connections.close_all()
+    logger.info("Warm-up done in %.2f s.", time.perf_counter() - start)